@@ -0,0 +1,91 @@
+import math
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import LightSource
+from common import *
+
+# Background of the station map without network access: map tiles from a
+# local cache (see tiles.LocalTiles), or a hillshade of a local elevation
+# model when the cache does not cover the map.
+
+
+def tile_path(x, y, zoom, folder=TILEDIR):
+    """
+    Path of a cached map tile, in the usual z/x/y layout.
+    """
+    return os.path.join(folder, str(zoom), str(x), '{}.png'.format(y))
+
+
+def tile_range(extent, zoom):
+    """
+    Returns x and y of the web mercator tiles covering extent
+    [west, east, south, north] at zoom level zoom.
+    """
+    def tile(lon, lat):
+        n = 2**zoom
+        x = int((lon + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+        return min(x, n - 1), min(y, n - 1)
+    west, east, south, north = extent
+    x0, y0 = tile(west, north)
+    x1, y1 = tile(east, south)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def missing_tiles(extent, zoom, folder=TILEDIR):
+    """
+    Returns the tiles covering extent that are not in the cache.
+    """
+    return [(x, y) for x, y in tile_range(extent, zoom)
+            if not os.path.exists(tile_path(x, y, zoom, folder))]
+
+
+def read_dem(filepath=DEM):
+    """
+    Load elevation model stored as npz with 'elevation' (rows from north to
+    south) and 'extent' ([west, east, south, north] in degrees). Returns
+    elevation and extent, or None if the file does not exist.
+    """
+    if not os.path.exists(filepath):
+        return None
+    with np.load(filepath) as dem:
+        return dem['elevation'].astype(float), list(dem['extent'])
+
+
+def hillshade(elevation, extent, max_size=1000, vert_exag=2):
+    """
+    RGB image of elevation colored by height and shaded from the
+    northwest. Large models are subsampled to at most max_size pixels on
+    each side, so the render time does not depend on the model resolution.
+    """
+    step = max(1, -(-max(elevation.shape) // max_size))
+    elevation = elevation[::step, ::step]
+    west, east, south, north = extent
+    # Cell size in meters
+    lat = math.radians((south + north) / 2)
+    dx = (east - west) / elevation.shape[1] * 111320 * math.cos(lat)
+    dy = (north - south) / elevation.shape[0] * 110540
+    light = LightSource(azdeg=315, altdeg=45)
+    low, high = np.nanmin(elevation), np.nanmax(elevation)
+    filled = np.where(np.isnan(elevation), low, elevation)
+    # Start above the blue (water) part of the colormap
+    return light.shade(filled, cmap=plt.cm.terrain, blend_mode='soft',
+                       vmin=low - 0.35*(high - low), vmax=high,
+                       vert_exag=vert_exag, dx=dx, dy=dy)
+
+
+def plot_relief(ax, filepath=DEM, **kwargs):
+    """
+    Draw hillshade of the elevation model on ax, if there is one. kwargs are
+    passed on to imshow, e.g. transform for cartopy axes.
+
+    Returns True if a hillshade was drawn.
+    """
+    dem = read_dem(filepath)
+    if dem is None:
+        return False
+    elevation, extent = dem
+    ax.imshow(hillshade(elevation, extent), extent=extent, origin='upper',
+              interpolation='bilinear', **kwargs)
+    return True
@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import shapefile
+import utm
+from common import *
+from manifest import file_hash
+
+# Outline of the Narayani basin in longitude and latitude, projected from
+# the UTM coordinates of the watershed shapefile. Projected outlines are
+# cached in OUTDIR, keyed by the hash of the shapefile.
+
+
+def read_points(filepath=SHAPEFILE):
+    """
+    Returns x and y (UTM) of all points in the shapefile, and the index of
+    the first point of each part of the shapes.
+    """
+    x, y, starts = [], [], []
+    offset = 0
+    with shapefile.Reader(filepath) as reader:
+        shapes = reader.shapes()
+    for shape in shapes:
+        points = np.asarray(shape.points, dtype=float).reshape(-1, 2)
+        starts += [offset + part for part in shape.parts]
+        x.append(points[:, 0])
+        y.append(points[:, 1])
+        offset += len(points)
+    if not x:
+        return np.array([]), np.array([]), np.array([], dtype=int)
+    return np.concatenate(x), np.concatenate(y), np.array(starts, dtype=int)
+
+
+def project(x, y):
+    """
+    Latitude and longitude of UTM coordinates (zone 45R) of the shapefile,
+    for all points in one call.
+    """
+    # Eastward shift of data
+    return utm.to_latlon(np.asarray(x) + 3650, np.asarray(y), 45, 'R')
+
+
+def simplify(x, y, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification of a line. Returns boolean array
+    of the points to keep, all points are within tolerance of the
+    simplified line.
+    """
+    keep = np.zeros(len(x), dtype=bool)
+    if len(x) == 0:
+        return keep
+    keep[[0, -1]] = True
+    stack = [(0, len(x) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        px = x[start + 1:end] - x[start]
+        py = y[start + 1:end] - y[start]
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        # Distance to the segment, or to the first point of a closed ring
+        length = dx*dx + dy*dy
+        t = np.clip((px*dx + py*dy) / length, 0, 1) if length > 0 else 0
+        distance = np.hypot(px - t*dx, py - t*dy)
+        i = np.argmax(distance)
+        if distance[i] > tolerance:
+            keep[start + 1 + i] = True
+            stack += [(start, start + 1 + i), (start + 1 + i, end)]
+    return keep
+
+
+def cache_path(key, tolerance=None):
+    if tolerance is None:
+        return OUTDIR + 'basin_{}.npz'.format(key)
+    return OUTDIR + 'basin_{}_{}.npz'.format(key, tolerance)
+
+
+def outline(filepath=SHAPEFILE, tolerance=None):
+    """
+    Returns longitude and latitude of the basin outline, with NaN between
+    the parts of the shapes so it can be drawn with one plot call.
+
+    tolerance - optional simplification tolerance in degrees, see simplify
+    """
+    path = cache_path(file_hash(filepath), tolerance)
+    if os.path.exists(path):
+        cached = np.load(path)
+        return cached['lon'], cached['lat']
+
+    x, y, starts = read_points(filepath)
+    lat, lon = project(x, y)
+    lons, lats = [], []
+    for start, end in zip(starts, np.r_[starts[1:], len(x)]):
+        part = slice(start, end)
+        keep = np.ones(end - start, dtype=bool)
+        if tolerance is not None:
+            keep = simplify(lon[part], lat[part], tolerance)
+        lons += [lon[part][keep], [np.nan]]
+        lats += [lat[part][keep], [np.nan]]
+    lon = np.concatenate(lons[:-1]) if lons else np.array([])
+    lat = np.concatenate(lats[:-1]) if lats else np.array([])
+    if os.path.isdir(OUTDIR):
+        np.savez(path, lon=lon, lat=lat)
+    return lon, lat
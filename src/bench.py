@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import synthetic
+
+# Benchmarks of conversion, loading, aggregation and plotting on synthetic
+# archives. Each size is written to a temporary folder with the same layout
+# as the project (project_data/, conv_data/, figures/), and the stages are
+# run from a subfolder so the relative paths in common.py point there.
+
+default_sizes = ['5x3x10', '20x10x30', '50x20x50']
+
+
+def parse_size(size):
+    """
+    Parse 'MxHxY' to (met stations, hyd stations, years).
+    """
+    met, hyd, years = [int(x) for x in size.split('x')]
+    return met, hyd, years
+
+
+def measure(func, memory):
+    """
+    Run func and return run time in seconds and, if memory is True, peak
+    memory allocated in MB (from a second traced run).
+    """
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def stages():
+    """
+    Returns list of (name, function) for the benchmarked stages. Modules
+    are imported here, after changing to the work folder.
+    """
+    import basemap
+    import basin
+    import gridding
+    import convert
+    import plot
+    import query
+    import stations
+    stations.registry.cache_clear()
+    stations.names.cache_clear()
+    query.cache.clear()
+    data = {}
+
+    def load():
+        data['p'], data['t'], data['q'] = plot.load_data()
+
+    def monthly():
+        data['tmin'], data['tmax'] = plot.monthly_temperature(data['t'])
+        data['pm'] = plot.monthly_precipitation(data['p'])
+
+    def monthly_cube():
+        pc, tc, qc = plot.load_cubes()
+        plot.monthly_temperature(tc)
+        plot.monthly_precipitation(pc)
+
+    def lapserate():
+        plot.lapserate(data['tmin'])
+        plot.lapserate(data['tmax'])
+        plot.lapserate(data['pm'], drop=['Dhunche','Lete'])
+
+    def station_map():
+        # Offline map background, no cartopy or network needed
+        fig, ax = plot.plt.subplots()
+        basemap.plot_relief(ax)
+        ax.plot(*basin.outline())
+        fig.savefig(plot.FIGDIR + 'stations_offline.png')
+        plot.plt.close(fig)
+
+    def compact_data():
+        # Like load_data, with float32 values from the compact form
+        query.cache.clear()
+        plot.load_data(compact=True)
+
+    def basin_means():
+        grid = gridding.rasterize()
+        gridding.basin_means(data['p'], grid)
+        gridding.basin_means(data['t'], grid)
+
+    def coverage():
+        plot.plot_coverage(data['p'], 'coverage_precipitation.png')
+        plot.plt.close('all')
+
+    return [('convert', lambda: convert.run()),
+            ('basin_outline', lambda: basin.outline()),
+            ('load_data', load),
+            ('monthly', monthly),
+            ('monthly_cube', monthly_cube),
+            ('lapserate', lapserate),
+            ('compact', compact_data),
+            ('basin_means', basin_means),
+            ('plot_coverage', coverage),
+            ('station_map', station_map)]
+
+
+def run_size(size, memory=True):
+    """
+    Run all stages for one archive size. Returns dict mapping stage name
+    to dict with seconds and peak_mb.
+    """
+    met, hyd, years = parse_size(size)
+    cwd = os.getcwd()
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        synthetic.make_archive(os.path.join(root, 'project_data'), met, hyd,
+                               range(2029 - years, 2029))
+        for folder in ('conv_data', 'figures', 'work'):
+            os.makedirs(os.path.join(root, folder))
+        os.chdir(os.path.join(root, 'work'))
+        try:
+            for name, func in stages():
+                seconds, peak = measure(func, memory)
+                results[name] = {'seconds': seconds, 'peak_mb': peak}
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns list of (size, stage, measure, baseline, new) where the new
+    result is more than tolerance times the baseline.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, values in stages.items():
+            for key, value in values.items():
+                old = baseline.get(size, {}).get(stage, {}).get(key)
+                if old and value and value > tolerance*old:
+                    regressions.append((size, stage, key, old, value))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark on synthetic data.')
+    parser.add_argument('sizes', nargs='*', default=default_sizes,
+                        help='archive sizes as METxHYDxYEARS, default: {}'.format(' '.join(default_sizes)))
+    parser.add_argument('--no-memory', action='store_true', help='skip memory profiling')
+    parser.add_argument('--save', help='save results as baseline to this json file')
+    parser.add_argument('--compare', help='compare with baseline json file')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='allowed ratio to baseline before reporting a regression')
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results[size] = run_size(size, not args.no_memory)
+        for stage, values in results[size].items():
+            peak = values['peak_mb']
+            print('{:<12}{:<15}{:>9.3f} s{:>10}'.format(
+                size, stage, values['seconds'], '' if peak is None else '{:.1f} MB'.format(peak)))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        for size, stage, key, old, new in regressions:
+            print('Regression {} {} {}: {:.3f} -> {:.3f}'.format(size, stage, key, old, new))
+        if regressions:
+            raise SystemExit(1)
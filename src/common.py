@@ -9,7 +9,33 @@ PRECDIR = INDIR + 'prec/'
 DISDIR = INDIR + 'discharge/'
 TEMPDIR = INDIR + 'temp/'
 
+# Outline of the basin
+SHAPEFILE = INDIR + 'Narayani_catchment/watershed.shp'
+
+# Elevation model, npz file with elevation and extent (see basemap.read_dem)
+DEM = INDIR + 'dem.npz'
+
+# Cache of map tiles for the station map (z/x/y.png), and where missing
+# tiles are downloaded from. Stamen terrain is now served by Stadia Maps.
+TILEDIR = INDIR + 'tiles/'
+TILE_URL = 'https://tiles.stadiamaps.com/tiles/stamen_terrain_background/{z}/{x}/{y}.png'
+# API key of Stadia Maps (https://client.stadiamaps.com), needed to download
+# tiles from other hosts than localhost
+TILE_KEY = ''
+
 # Location of converted files
 precipitation = OUTDIR + 'prec.csv'
 temperature = OUTDIR + 'temp.csv'
 discharge = OUTDIR + 'discharge.csv'
+
+# Output formats of converted data, 'csv' and/or 'binary' (feather if
+# pyarrow is installed, otherwise pickle)
+FORMATS = ['csv', 'binary']
+
+# Size limit of the in-memory cache used by query.load
+CACHE_BYTES = 512 * 2**20
+
+# Size limit of the buffer of raw files read by ingest.py, and number of
+# threads reading them
+INGEST_BYTES = 64 * 2**20
+READ_THREADS = 16
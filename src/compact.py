@@ -0,0 +1,108 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from common import *
+import stations
+
+# Compact in-memory form of the converted data: float32 values, days as
+# int32 offsets from epoch, and one row per station in a table of ids,
+# names and heights instead of string labels. Takes about half the memory
+# of the float64 frames, and converts to and from pandas without copying
+# the values.
+
+# values - float32 array (days x columns)
+# days - int32 days since epoch of the rows
+# ids - int32 station id of the columns
+# suffixes - suffix of the column labels ('max' or 'min' for temperature,
+# '' otherwise)
+# stations - table of the stations, index id, columns Name (categorical)
+# and Altitude (float32)
+Compact = namedtuple('Compact', ['variable', 'values', 'days', 'ids', 'suffixes', 'stations'])
+
+epoch = np.datetime64('1970-01-01', 'D')
+
+kinds = {'prec': 'met', 'temp': 'met', 'discharge': 'hyd'}
+
+
+def station_table(kind, ids):
+    """
+    Table of stations ids of kind ('met' or 'hyd') with name and altitude.
+    Stations missing in the registry get their id as name and NaN altitude.
+    """
+    registry = stations.registry()
+    rows = [registry.get((kind, id)) for id in ids]
+    names = [str(id) if s is None else s.name for id, s in zip(ids, rows)]
+    altitude = [np.nan if s is None else s.altitude for s in rows]
+    return pd.DataFrame({'Name': pd.Categorical(names),
+                         'Altitude': np.array(altitude, dtype=np.float32)},
+                        index=pd.Index(np.asarray(ids, dtype=np.int32), name='id'))
+
+
+def from_frame(df, variable):
+    """
+    Compact form of converted data of variable (prec, temp or discharge)
+    with station ids as column labels, e.g. from store.read_frame.
+    Values are rounded to float32.
+    """
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError('Expected a DatetimeIndex, got {}'.format(type(df.index).__name__))
+    dates = df.index.values.astype('datetime64[D]')
+    if (dates != df.index.values).any():
+        raise ValueError('Index of {} is not daily'.format(variable))
+    labels = [str(column).partition('_') for column in df.columns]
+    ids = np.array([int(float(id)) for id, _, _ in labels], dtype=np.int32)
+    suffixes = tuple(suffix for _, _, suffix in labels)
+    unique = list(dict.fromkeys(ids.tolist()))
+    return Compact(variable,
+                   df.to_numpy(dtype=np.float32),
+                   (dates - epoch).astype(np.int32),
+                   ids, suffixes,
+                   station_table(kinds[variable], unique))
+
+
+def index(compact):
+    """
+    DatetimeIndex of the rows.
+    """
+    return pd.DatetimeIndex((epoch + compact.days.astype('timedelta64[D]')).astype('datetime64[ns]'), name='date')
+
+
+def labels(compact, names=False):
+    """
+    Column labels, station ids as in the converted files or station names
+    (names=True) as in plot.load_data.
+    """
+    if names:
+        keys = compact.stations['Name'].astype(str).loc[compact.ids].values
+    else:
+        keys = compact.ids.astype(str)
+    return [key + '_' + suffix if suffix else key
+            for key, suffix in zip(keys, compact.suffixes)]
+
+
+def to_frame(compact, names=False, dtype=None):
+    """
+    Dataframe of compact. The values are not copied unless dtype is given,
+    e.g. dtype=float for float64 values.
+
+    names - station names as column labels instead of ids
+    """
+    values = compact.values if dtype is None else compact.values.astype(dtype)
+    return pd.DataFrame(values, index=index(compact), columns=labels(compact, names),
+                        copy=False)
+
+
+def heights(compact, names=False):
+    """
+    Altitude of the station of each column.
+    """
+    return pd.Series(compact.stations['Altitude'].loc[compact.ids].values,
+                     index=labels(compact, names), name='height')
+
+
+def nbytes(compact):
+    """
+    Memory used by the values, days and the column and station tables.
+    """
+    return (compact.values.nbytes + compact.days.nbytes + compact.ids.nbytes
+            + int(compact.stations.memory_usage(index=True, deep=True).sum()))
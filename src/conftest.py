@@ -0,0 +1,77 @@
+from functools import lru_cache
+import pytest
+import basin
+import convert
+import figures
+import flow
+import hyd as hyd
+import ingest
+import met as met
+import query
+import stations
+import synthetic
+
+# Shared test setup. The settings of common.py are copied into each module
+# by "from common import *", so they are patched module by module.
+
+
+def clear():
+    stations.registry.cache_clear()
+    stations.names.cache_clear()
+    query.cache.clear()
+    ingest.cache.clear()
+
+
+@pytest.fixture
+def outdir(tmp_path, monkeypatch):
+    """
+    Point the outputs and the caches on disk at tmp_path, and clear the
+    caches in memory before and after the test. Returns tmp_path.
+    """
+    root = str(tmp_path) + '/'
+    for module in (basin, convert, figures, flow, stations):
+        monkeypatch.setattr(module, 'OUTDIR', root)
+    monkeypatch.setattr(figures, 'FIGDIR', root)
+    monkeypatch.setattr(figures, 'hashfile', root + 'figures.json')
+    monkeypatch.setattr(flow, 'cachedir', root + 'flow/')
+    monkeypatch.setattr(stations, 'cachefile', root + 'stations.json')
+    monkeypatch.setattr(query, 'files', {variable: root + variable + '.csv'
+                                         for variable in ('prec', 'temp', 'discharge')})
+    clear()
+    yield tmp_path
+    clear()
+
+
+@pytest.fixture
+def archive(outdir, monkeypatch):
+    """
+    Function writing a synthetic archive to tmp_path, see
+    synthetic.make_archive, with the loaders and the station registry
+    pointed at it. Returns tmp_path.
+    """
+    root = str(outdir) + '/'
+    for module in (hyd, ingest, stations):
+        monkeypatch.setattr(module, 'DISDIR', root + 'discharge/')
+    monkeypatch.setattr(ingest, 'PRECDIR', root + 'prec/')
+    monkeypatch.setattr(ingest, 'TEMPDIR', root + 'temp/')
+    monkeypatch.setattr(met, 'INDIR', root)
+    monkeypatch.setattr(stations, 'station_loc', root + 'station_loc.txt')
+
+    def make(met_stations=0, hyd_stations=3, years=range(1978, 1983)):
+        synthetic.make_archive(str(outdir), met_stations, hyd_stations, years)
+        clear()
+        return outdir
+    return make
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """
+    Function replacing the station registry by the given stations.
+    """
+    def replace(*items):
+        found = {(s.kind, s.id): s for s in items}
+        monkeypatch.setattr(stations, 'registry', lru_cache()(lambda: found))
+        stations.names.cache_clear()
+    yield replace
+    stations.names.cache_clear()
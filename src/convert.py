@@ -1,13 +1,149 @@
+import argparse
+import cProfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 import hyd as hyd
 import met as met
+import cube
+import ingest
+import instrument
+from manifest import Manifest
 from common import *
 
-# Convert station information
-met.convert_stations(OUTDIR + 'met_stations.csv')
-hyd.convert_stations(OUTDIR + 'hyd_stations.csv')
 
-# Convert station data
-met.convert_data(OUTDIR + 'prec.csv','prec')
-met.convert_data(OUTDIR + 'temp.csv','temp')
-hyd.convert_data(OUTDIR + 'discharge.csv')
+def run(workers=1, incremental=False, formats=FORMATS, stream=False, records=None):
+    """
+    Convert station information and station data.
+
+    workers - number of processes used to load the data files. With one
+    worker everything runs serially in this process.
+    incremental - only parse new or changed files, and reuse the results
+    of the last run for the rest. Data from deleted files is dropped.
+    formats - output formats of the converted data, see store.write_frame
+    stream - convert one station at a time and write to column stores
+    instead, see store.ColumnStore
+
+    records - list to collect statistics of each parsed file in, see
+    instrument.py. None to not collect them.
+
+    After the data, the monthly aggregates are stored, see cube.build. In
+    incremental runs only the years of changed files are aggregated again.
+
+    Returns a list of (stage, seconds) tuples.
+    """
+    timings = []
+    executor = None
+    mapper = map
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        mapper = partial(executor.map, chunksize=4)
+    # Files are read ahead by threads in this process, once
+    mapper = ingest.wrap(mapper)
+    if records is not None:
+        mapper = instrument.wrap(mapper, records)
+    if incremental:
+        manifest = Manifest()
+        mapper = manifest.wrap(mapper)
+
+    stages = [
+        # Convert station information
+        ('met stations', lambda: met.convert_stations(OUTDIR + 'met_stations.csv')),
+        ('hyd stations', lambda: hyd.convert_stations(OUTDIR + 'hyd_stations.csv')),
+    ]
+    # Convert station data, the results are kept for the aggregates
+    data = {}
+    if stream:
+        stages += [
+            ('prec', lambda: met.stream_data(OUTDIR + 'prec.csv', 'prec', mapper)),
+            ('temp', lambda: met.stream_data(OUTDIR + 'temp.csv', 'temp', mapper)),
+            ('discharge', lambda: hyd.stream_data(OUTDIR + 'discharge.csv', mapper)),
+        ]
+    else:
+        stages += [
+            ('prec', lambda: met.convert_data(OUTDIR + 'prec.csv', 'prec', mapper, formats)),
+            ('temp', lambda: met.convert_data(OUTDIR + 'temp.csv', 'temp', mapper, formats)),
+            ('discharge', lambda: hyd.convert_data(OUTDIR + 'discharge.csv', mapper, formats)),
+        ]
+    loaders = {'prec': met.loaders['prec'].__name__,
+               'temp': met.loaders['temp'].__name__,
+               'discharge': hyd.load_df_manual.__name__}
+    try:
+        for name, stage in stages:
+            start = time.perf_counter()
+            data[name] = stage()
+            timings.append((name, time.perf_counter() - start))
+        if incremental:
+            for path in manifest.prune():
+                print('Removed deleted file: {}'.format(path))
+            manifest.save()
+            print('Parsed {} files, reused {} files'.format(manifest.parsed, manifest.reused))
+        for variable in ['prec', 'temp', 'discharge']:
+            start = time.perf_counter()
+            years = None
+            if incremental:
+                years = manifest.touched.get(loaders[variable], set())
+            if stream:
+                store = data[variable]
+                frames = (store.read([column]) for column in store.columns())
+                cube.build(variable, frames, store.columns(), years)
+            else:
+                df = data[variable]
+                cube.build(variable, [df], df.columns, years)
+            timings.append((variable + ' cube', time.perf_counter() - start))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return timings
+
+
+def print_timings(timings):
+    total = 0
+    for name, seconds in timings:
+        print('{:<15}{:>10.2f} s'.format(name, seconds))
+        total += seconds
+    print('{:<15}{:>10.2f} s'.format('total', total))
+
+
+def print_summary(records):
+    for loader, total in sorted(instrument.summary(records).items()):
+        counts = ', '.join('{} {}'.format(key, value) for key, value in sorted(total.items())
+                           if key not in ('files', 'seconds', 'bytes', 'rows'))
+        print('{}: {} files, {:.1f} MB, {} rows, {:.2f} s parsing'.format(
+            loader, total['files'], total['bytes'] / 2**20, total['rows'], total['seconds']))
+        if counts:
+            print('    replaced: {}'.format(counts))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert DHM station data to csv.')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of processes used to load data files')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='only parse new or changed data files')
+    parser.add_argument('-f', '--formats', nargs='+', default=FORMATS,
+                        choices=['csv', 'binary', 'store', 'mmap'],
+                        help='output formats of converted data')
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help='convert one station at a time to column stores')
+    parser.add_argument('-r', '--report',
+                        help='write parse time, size, rows and replaced entries of each '
+                        'file to this .csv or .json file')
+    parser.add_argument('-p', '--profile',
+                        help='write cProfile stats of the run to this file '
+                        '(only this process, not the workers)')
+    args = parser.parse_args()
+
+    records = [] if args.report else None
+    profile = cProfile.Profile() if args.profile else None
+    if profile is not None:
+        profile.enable()
+    timings = run(args.workers, args.incremental, args.formats, args.stream, records)
+    if profile is not None:
+        profile.disable()
+        profile.dump_stats(args.profile)
+    print_timings(timings)
+    if records is not None:
+        instrument.write_report(records, args.report)
+        print_summary(records)
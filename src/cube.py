@@ -0,0 +1,220 @@
+import os
+import numpy as np
+import pandas as pd
+from common import *
+import station_coverage
+import query
+from store import binary_path, mtime, read_binary, write_binary
+
+# Monthly aggregates of the converted daily data, made at conversion time
+# so that monthly and yearly figures do not have to go through the daily
+# tables. A cube is a dataframe with index (year, month, station) and the
+# columns in stats, stored next to the converted data (prec.csv ->
+# prec_cube.feather). Rows are ordered by station, then year and month.
+
+# days - number of days in the month, count - number of days with data,
+# possum and poscount - sum and count of the positive values
+stats = ['sum', 'count', 'min', 'max', 'days', 'possum', 'poscount']
+levels = ['year', 'month', 'station']
+
+
+def cube_path(variable):
+    """
+    Path of the cube of variable without extension.
+    """
+    return os.path.splitext(query.files[variable])[0] + '_cube'
+
+
+def is_cube(df):
+    return isinstance(df.index, pd.MultiIndex) and list(df.index.names) == levels
+
+
+def aggregate(df):
+    """
+    Returns the cube of a daily dataframe with stations as columns.
+    """
+    if len(df.index) == 0:
+        return pd.DataFrame(columns=stats, dtype=float,
+                            index=pd.MultiIndex.from_tuples([], names=levels))
+    periods = [df.index.year.astype('int64').rename('year'),
+               df.index.month.astype('int64').rename('month')]
+    grouped = df.groupby(periods)
+    positive = df.where(df > 0).groupby(periods)
+    frames = {'sum': grouped.sum(),
+              'count': grouped.count(),
+              'min': grouped.min(),
+              'max': grouped.max(),
+              'possum': positive.sum(),
+              'poscount': positive.count()}
+    parts = []
+    for column in df.columns:
+        part = pd.DataFrame({name: frame[column] for name, frame in frames.items()})
+        part['station'] = str(column)
+        parts.append(part)
+    cube = pd.concat(parts).set_index('station', append=True)
+    cube['days'] = days(cube.index)
+    return cube[stats].astype(float)
+
+
+def days(index):
+    """
+    Number of days in the month of each row of index.
+    """
+    return pd.to_datetime({'year': index.get_level_values('year'),
+                           'month': index.get_level_values('month'),
+                           'day': 1}).dt.days_in_month.values
+
+
+def complete(cube, columns):
+    """
+    Add empty rows, so that all stations in columns have a row for every
+    month in the cube, as in a cube of the full table. A ColumnStore
+    column has no rows for years without files.
+    """
+    periods = cube.index.droplevel('station').unique()
+    index = pd.MultiIndex.from_tuples(
+        [(year, month, str(column)) for column in columns for year, month in periods],
+        names=levels)
+    cube = cube.reindex(index)
+    for stat in ['sum', 'count', 'possum', 'poscount']:
+        cube[stat] = cube[stat].fillna(0)
+    cube['days'] = days(cube.index).astype(float)
+    return cube
+
+
+def order(cube, columns):
+    """
+    Sort cube by station in the order of columns, then year and month.
+    """
+    rank = {str(column): i for i, column in enumerate(columns)}
+    station = cube.index.get_level_values('station').map(rank)
+    index = np.lexsort((cube.index.get_level_values('month'),
+                        cube.index.get_level_values('year'), station))
+    return cube.iloc[index]
+
+
+def build(variable, frames, columns, years=None):
+    """
+    Make the cube of variable and store it.
+
+    frames - iterable of daily dataframes with stations as columns, e.g.
+    the converted table or one column of a ColumnStore at a time
+    columns - all station columns of the converted data, in order
+    years - only recompute these years and keep the rest of the stored
+    cube (incremental conversion). None to recompute everything.
+    """
+    old = None
+    if years is not None:
+        old = read(variable)
+    if old is None:
+        years = None
+    parts = []
+    for df in frames:
+        if years is not None:
+            df = df[df.index.year.isin(years)]
+        parts.append(aggregate(df))
+    if old is not None:
+        stations = old.index.get_level_values('station')
+        keep = stations.isin([str(column) for column in columns])
+        keep &= ~old.index.get_level_values('year').isin(years)
+        parts.insert(0, old[keep])
+    cube = order(complete(pd.concat(parts), columns), columns)
+    write_binary(cube.reset_index(level=['month', 'station']), cube_path(variable))
+    return cube
+
+
+def read(variable):
+    """
+    Load the stored cube of variable with station ids, None if there is
+    none.
+    """
+    df = read_binary(cube_path(variable))
+    if df is None:
+        return None
+    return df.set_index(['month', 'station'], append=True)
+
+
+def load(variable):
+    """
+    Load the cube of variable with station names, like query.load.
+    Returns None if the cube has not been made.
+    """
+    key = ('cube', variable, mtime(binary_path(cube_path(variable))))
+    cube = query.cache.get(key)
+    if cube is None:
+        cube = read(variable)
+        if cube is None:
+            return None
+        cube = with_names(cube, variable)
+        query.cache.put(key, cube)
+    return cube.copy()
+
+
+def with_names(cube, variable):
+    """
+    Replace station ids of a cube with station names.
+    """
+    names = {station: query.column_name(variable, station)
+             for station in cube.index.unique('station')}
+    return cube.rename(index=names, level='station')
+
+
+def yearly(cube):
+    """
+    Aggregate a cube to years, with index (year, station).
+    """
+    grouped = cube.groupby(level=['year', 'station'], sort=False)
+    df = grouped[['sum', 'count', 'days', 'possum', 'poscount']].sum()
+    df['min'] = grouped['min'].min()
+    df['max'] = grouped['max'].max()
+    return df[stats]
+
+
+def table(df, stat):
+    """
+    Wide table of one stat of a monthly or yearly cube, with the first
+    index level as rows and stations as columns (in station order).
+    Derived stats are 'mean', 'posmean' (mean of positive values) and
+    'coverage' (fraction of days with data).
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if stat == 'mean':
+            values = df['sum'] / df['count']
+        elif stat == 'posmean':
+            values = df['possum'] / df['poscount']
+        elif stat == 'coverage':
+            values = df['count'] / df['days']
+        else:
+            values = df[stat]
+    stations = df.index.get_level_values('station')
+    wide = values.unstack('station')[list(pd.unique(stations))]
+    wide.columns.name = None
+    return wide
+
+
+def climatology(df, stat='mean'):
+    """
+    Mean (stat='mean') or mean of positive values (stat='posmean') for each
+    calendar month, over all years. df is a cube or daily data; gives the
+    same result as df.groupby(df.index.month).mean().
+    """
+    if not is_cube(df):
+        if stat == 'posmean':
+            df = df[df > 0]
+        return df.groupby(df.index.month).mean()
+    monthly = df.groupby(level=['month', 'station'], sort=False).sum()
+    return table(monthly, stat).sort_index()
+
+
+def yearly_table(df, stat):
+    """
+    Yearly sums (stat='sum') or coverage (stat='coverage') from a cube or
+    daily data. Years without any data have a sum of zero, like
+    df.groupby(df.index.year).sum().
+    """
+    if not is_cube(df):
+        if stat == 'coverage':
+            return station_coverage.fractions(df)
+        return df.groupby(df.index.year).sum()
+    # Stations without files for a year have no rows in the cube
+    return table(yearly(df), stat).sort_index().fillna(0)
@@ -0,0 +1,119 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.pyplot as plt
+import pandas as pd
+from common import *
+
+# A figure job. Renders FIGDIR/<name>.png by calling
+# func(*frames, *args), where frames are the input frames named in inputs.
+Job = namedtuple('Job', ['name', 'inputs', 'func', 'args'])
+
+hashfile = OUTDIR + 'figures.json'
+
+
+def frame_hash(df):
+    """
+    Returns sha1 hash of the content, index and columns of df.
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    sha1.update(repr(list(df.columns)).encode())
+    return sha1.hexdigest()
+
+
+def project_modules(module):
+    """
+    Returns module and the modules of this project it uses, directly or
+    through other modules of the project, sorted by name.
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    found = {}
+    todo = [module]
+    while todo:
+        module = todo.pop()
+        if module.__name__ in found:
+            continue
+        found[module.__name__] = module
+        for value in vars(module).values():
+            # Imported modules, and functions and classes imported from them
+            used = value if inspect.ismodule(value) else sys.modules.get(
+                getattr(value, '__module__', None) or '')
+            path = getattr(used, '__file__', None)
+            if path is not None and os.path.dirname(os.path.abspath(path)) == folder:
+                todo.append(used)
+    return [found[name] for name in sorted(found)]
+
+
+def code_hash(func):
+    """
+    Returns sha1 hash of the source code of the module of func and of the
+    project modules it uses (e.g. cube.py and regression.py for plot.py).
+    """
+    sha1 = hashlib.sha1()
+    for module in project_modules(inspect.getmodule(func)):
+        sha1.update(inspect.getsource(module).encode())
+    return sha1.hexdigest()
+
+
+def job_hash(job, hashes):
+    """
+    Hash of everything a figure depends on: the function and the code it
+    uses (see code_hash), its arguments and the hashes of the input frames.
+    """
+    key = [job.func.__module__, job.func.__name__, code_hash(job.func), repr(job.args)]
+    key += [hashes[name] for name in job.inputs]
+    return hashlib.sha1('\n'.join(key).encode()).hexdigest()
+
+
+def render(job, frames):
+    """
+    Render one figure. Runs in a worker process.
+    """
+    start = time.perf_counter()
+    plt.switch_backend('Agg')
+    plt.close('all')
+    job.func(*frames, *job.args)
+    plt.close('all')
+    return time.perf_counter() - start
+
+
+def run(jobs, data, workers=None, force=False):
+    """
+    Render the figures of jobs whose input data, function (or its code) or
+    arguments changed since they were last rendered, or whose png is missing.
+
+    data - dict mapping input name to dataframe
+    workers - number of processes, None for one per cpu
+
+    Returns dict mapping name of rendered figures to render time.
+    """
+    rendered = {}
+    if os.path.exists(hashfile):
+        with open(hashfile) as file:
+            rendered = json.load(file)
+    names = set(name for job in jobs for name in job.inputs)
+    hashes = {name: frame_hash(data[name]) for name in names}
+
+    stale = []
+    for job in jobs:
+        h = job_hash(job, hashes)
+        if force or rendered.get(job.name) != h or not os.path.exists(FIGDIR + job.name + '.png'):
+            stale.append((job, h))
+
+    timings = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [(job, h, executor.submit(render, job, [data[name] for name in job.inputs]))
+                   for job, h in stale]
+        for job, h, future in futures:
+            timings[job.name] = future.result()
+            rendered[job.name] = h
+    if os.path.isdir(OUTDIR):
+        with open(hashfile, 'w') as file:
+            json.dump(rendered, file, indent=1, sort_keys=True)
+    return timings
@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from common import *
+import station_coverage
+import query
+import timeseries
+from figures import code_hash, frame_hash
+
+# Flow statistics of all discharge stations at once: flow duration
+# curves, baseflow, low flow indices and return levels of the annual
+# maximum flow. Results are cached in OUTDIR/flow/, keyed by the hash of
+# the discharge data, the parameters and the code computing them.
+
+cachedir = OUTDIR + 'flow/'
+
+# Exceedance probabilities (percent of days) of the flow duration curves
+exceedance = np.arange(0, 101)
+
+# Return periods (years) of the return levels
+return_periods = [2, 5, 10, 25, 50, 100]
+
+
+def daily(df):
+    """
+    df sorted by date and reindexed to all days of the years it covers, so
+    days without a row count as missing in the baseflow filter and the
+    coverage of each year.
+    """
+    df = df.sort_index()
+    if len(df.index) == 0:
+        return df
+    days = pd.date_range('{}-01-01'.format(df.index[0].year),
+                         '{}-12-31'.format(df.index[-1].year), freq='D', name=df.index.name)
+    return df.reindex(days)
+
+
+def duration_curves(df, probabilities=exceedance):
+    """
+    Flow exceeded on probabilities percent of the days with data, for each
+    station (columns).
+    """
+    with np.errstate(invalid='ignore'):
+        values = np.nanpercentile(df.to_numpy(dtype=float), 100 - np.asarray(probabilities),
+                                  axis=0)
+    return pd.DataFrame(values, index=pd.Index(probabilities, name='Exceedance'),
+                        columns=df.columns)
+
+
+def baseflow(df, alpha=0.925, passes=3):
+    """
+    Baseflow by the Lyne-Hollick recursive digital filter, with passes
+    alternating forward and backward. The quickflow is kept between zero
+    and the flow, and the filter starts again after missing days. The
+    recursion runs over days, for all stations at once. df must have one
+    row for each day, see daily.
+    """
+    base = df.to_numpy(dtype=float)
+    for i in range(passes):
+        if i % 2:
+            base = base[::-1]
+        quick = np.zeros(base.shape[1:])
+        result = np.full(base.shape, np.nan)
+        result[0] = base[0]
+        for day in range(1, len(base)):
+            quick = alpha*quick + (1 + alpha)/2*(base[day] - base[day - 1])
+            # Start again after missing days
+            quick = np.where(np.isnan(quick), 0, quick)
+            quick = np.clip(quick, 0, np.where(np.isnan(base[day]), 0, base[day]))
+            result[day] = base[day] - quick
+        base = result[::-1] if i % 2 else result
+    return pd.DataFrame(base, index=df.index, columns=df.columns)
+
+
+def annual_maxima(df, min_coverage=0.8):
+    """
+    Largest daily flow of each year (rows) and station, NaN for years with
+    data on less than min_coverage of the days.
+    """
+    maxima = df.groupby(df.index.year).max()
+    maxima.index.name = 'Year'
+    return maxima.where(station_coverage.fractions(df) >= min_coverage)
+
+
+def return_levels(maxima, periods=return_periods):
+    """
+    Flow of return periods (years) for each station, from a Gumbel
+    distribution fitted to the annual maxima by the method of moments.
+    """
+    scale = maxima.std()*np.sqrt(6)/np.pi
+    location = maxima.mean() - np.euler_gamma*scale
+    reduced = -np.log(-np.log(1 - 1/np.asarray(periods, dtype=float)))
+    levels = location.values + scale.values*reduced[:, np.newaxis]
+    return pd.DataFrame(levels, index=pd.Index(periods, name='Return period'),
+                        columns=maxima.columns)
+
+
+def indices(df, base=None, min_coverage=0.8):
+    """
+    Low flow indices and baseflow index of each station: Q95 and Q50
+    (flow exceeded on 95 and 50 percent of days), mean of the yearly
+    minimum 7-day mean flow, and the share of baseflow in the total flow.
+    """
+    if base is None:
+        base = baseflow(df)
+    curves = duration_curves(df, [50, 95])
+    weekly = timeseries.rolling(df, 7, 'mean')
+    minima = weekly.groupby(df.index.year).min()
+    minima = minima.where(station_coverage.fractions(df).values >= min_coverage)
+    valid = df.notna() & base.notna()
+    result = pd.DataFrame({'Q50': curves.loc[50], 'Q95': curves.loc[95],
+                           '7-day minimum': minima.mean(),
+                           'Baseflow index': base[valid].sum() / df[valid].sum()})
+    result.index.name = 'Station'
+    return result
+
+
+def compute(df, alpha=0.925, passes=3, min_coverage=0.8):
+    """
+    All flow statistics of df. Returns dict of frames: duration curves,
+    baseflow (daily), indices, annual maxima and return levels.
+    """
+    df = daily(df)
+    base = baseflow(df, alpha, passes)
+    maxima = annual_maxima(df, min_coverage)
+    return {'duration': duration_curves(df),
+            'baseflow': base,
+            'indices': indices(df, base, min_coverage),
+            'maxima': maxima,
+            'return_levels': return_levels(maxima)}
+
+
+def cache_path(df, **params):
+    key = frame_hash(df) + code_hash(compute) + repr(sorted(params.items()))
+    key = hashlib.sha1(key.encode()).hexdigest()
+    return cachedir + key + '.pkl'
+
+
+def statistics(df, alpha=0.925, passes=3, min_coverage=0.8):
+    """
+    Like compute, but results are cached on disk by the hash of df, the
+    parameters and the code, so unchanged data is not computed again.
+    """
+    df = daily(df)
+    path = cache_path(df, alpha=alpha, passes=passes, min_coverage=min_coverage)
+    if os.path.exists(path):
+        return pd.read_pickle(path)
+    result = compute(df, alpha, passes, min_coverage)
+    if os.path.isdir(OUTDIR):
+        os.makedirs(cachedir, exist_ok=True)
+        pd.to_pickle(result, path)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Flow statistics of all discharge stations.')
+    parser.add_argument('-a', '--alpha', type=float, default=0.925,
+                        help='parameter of the baseflow filter')
+    args = parser.parse_args()
+
+    result = statistics(query.load('discharge'), alpha=args.alpha)
+    for name in ['duration', 'indices', 'maxima', 'return_levels']:
+        result[name].to_csv(OUTDIR + 'flow_{}.csv'.format(name))
+    print(result['indices'].round(2).to_string())
+    print(result['return_levels'].round(1).to_string())
@@ -0,0 +1,269 @@
+import argparse
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from common import *
+import cube
+import query
+import regression
+import stations
+from store import write_frame
+
+# Filling of missing values in the converted daily data. Short gaps are
+# interpolated, linearly or on the anomalies from the monthly climatology
+# (seasonal). Longer gaps are filled by linear regression on the best
+# correlated neighbour stations, or from neighbours at other heights
+# shifted by the monthly lapse rate when no neighbour is correlated
+# enough. All stations are handled at once with array operations.
+
+# Quality flag of each value
+flags = {'observed': 0, 'interpolated': 1, 'regression': 2, 'lapserate': 3, 'missing': 4}
+
+# Filled data and the quality flags, frames with the same index and columns
+Filled = namedtuple('Filled', ['data', 'flags'])
+
+
+def groups(columns):
+    """
+    Group of each column: the suffix of temperature columns (max or min),
+    '' for the rest. Stations only fill stations of the same group.
+    """
+    return np.array([str(column).partition('_')[2] for column in columns])
+
+
+def station_heights(columns, kind='met'):
+    """
+    Altitude of the station of each column (station names, with _max or
+    _min suffix for temperature), NaN for unknown stations. Names are
+    looked up among the stations of kind ('met' or 'hyd').
+    """
+    names = {s.name: s for s in stations.registry().values() if s.kind == kind}
+    heights = []
+    for column in columns:
+        station = names.get(str(column).partition('_')[0])
+        heights.append(np.nan if station is None else station.altitude)
+    return np.array(heights, dtype=float)
+
+
+def lapse_rates(df, heights):
+    """
+    Lapse rate (per km) for each month (rows) and column, from the monthly
+    means of the stations of the column's group, see regression.lapserate.
+    NaN for groups with less than three stations of known height.
+    """
+    rates = np.full((12, len(df.columns)), np.nan)
+    group = groups(df.columns)
+    for name in np.unique(group):
+        columns = (group == name) & ~np.isnan(heights)
+        if columns.sum() < 3:
+            continue
+        monthly = cube.climatology(df.loc[:, columns]).reindex(range(1, 13))
+        monthly.index = monthly.index.map(str)
+        monthly = monthly.transpose()
+        monthly['height'] = heights[columns]
+        rate = regression.lapserate(monthly)['Lapse rate'].values
+        rates[:, group == name] = rate[:, np.newaxis]
+    return rates
+
+
+def bounds(values, valid):
+    """
+    Previous and next valid row for each position of values (days x
+    stations), -1 and len(values) where there is none.
+    """
+    n = len(values)
+    rows = np.arange(n)[:, np.newaxis]
+    previous = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, rows, n)[::-1], axis=0)[::-1]
+    return previous, following
+
+
+def interpolate(values, max_gap):
+    """
+    Linear interpolation in gaps of at most max_gap days between two
+    valid values, for all columns. Returns filled copy and mask of the
+    filled positions.
+    """
+    valid = ~np.isnan(values)
+    previous, following = bounds(values, valid)
+    fill = (~valid & (previous >= 0) & (following < len(values))
+            & (following - previous - 1 <= max_gap))
+    rows, columns = np.nonzero(fill)
+    start, end = previous[fill], following[fill]
+    weight = (rows - start) / (end - start)
+    result = values.copy()
+    result[fill] = (values[start, columns]*(1 - weight)
+                    + values[end, columns]*weight)
+    return result, fill
+
+
+def monthly_means(values, month):
+    """
+    Mean of the valid values of each calendar month (12 x columns).
+    month - month (0-11) of each row
+    """
+    valid = ~np.isnan(values)
+    onehot = (month[:, np.newaxis] == np.arange(12)).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (onehot.T @ np.where(valid, values, 0)) / (onehot.T @ valid)
+
+
+def pair_fits(values):
+    """
+    Linear fits of every column on every other column over the days where
+    both have data, from a few matrix products.
+
+    Returns number of common days, correlation, intercept and slope, each
+    (predictor x target), so that target ~ intercept + slope*predictor.
+    """
+    valid = ~np.isnan(values)
+    # Centered for accuracy, the intercept is shifted back below
+    mean = np.where(valid, values, 0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    x = np.where(valid, values - mean, 0)
+    m = valid.astype(float)
+    n = m.T @ m
+    sx = x.T @ m
+    sxx = (x*x).T @ m
+    sxy = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cxy = sxy - sx*sx.T/n
+        cxx = sxx - sx*sx/n
+        cyy = sxx.T - sx.T*sx.T/n
+        correlation = cxy / np.sqrt(cxx*cyy)
+        slope = cxy / cxx
+        intercept = (sx.T - slope*sx)/n + mean[np.newaxis, :] - slope*mean[:, np.newaxis]
+    return n, correlation, intercept, slope
+
+
+def from_neighbours(values, missing, order, estimate):
+    """
+    Fill missing positions from the predictors in order (ranks x targets),
+    best first. estimate(predictors) returns estimates (days x targets)
+    from the predictor of each target, NaN where there is none.
+    """
+    result = np.full(values.shape, np.nan)
+    for predictors in order:
+        take = missing & np.isnan(result)
+        if not take.any():
+            break
+        guess = estimate(predictors)
+        take &= ~np.isnan(guess)
+        result[take] = guess[take]
+    return result
+
+
+def fill(df, max_gap=5, method='linear', neighbours=3, min_overlap=365, min_corr=0.6,
+         heights=None, rates=None, kind='met'):
+    """
+    Fill missing values of daily data (one column per station, station
+    names as columns like plot.load_data). Rows are added for missing days.
+
+    max_gap - longest gap (days) filled by interpolation
+    method - 'linear' or 'seasonal' interpolation of short gaps
+    neighbours - number of neighbour stations tried for each station
+    min_overlap, min_corr - days with data in common and correlation
+    needed to fill from a neighbour by regression
+    heights - altitude of the stations, by default from the registry
+    rates - lapse rates per km (12 x columns), by default computed from
+    df, see lapse_rates
+    kind - kind of the stations ('met' or 'hyd'), to look up the heights
+
+    Columns of only non-negative values (e.g. precipitation) are not filled
+    with negative values. Returns Filled with data and quality flags.
+    """
+    df = df.sort_index()
+    df = df.reindex(pd.date_range(df.index[0], df.index[-1], freq='D', name=df.index.name))
+    values = df.to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+    month = df.index.month.values - 1
+    heights = station_heights(df.columns, kind) if heights is None else np.asarray(heights, dtype=float)
+    if rates is None:
+        rates = lapse_rates(df, heights)
+    result = np.where(observed, values, np.nan)
+    quality = np.where(observed, flags['observed'], flags['missing']).astype(np.int8)
+
+    # Short gaps
+    if method == 'linear':
+        filled, mask = interpolate(values, max_gap)
+    elif method == 'seasonal':
+        climate = monthly_means(values, month)[month]
+        filled, mask = interpolate(values - climate, max_gap)
+        filled += climate
+    else:
+        raise ValueError('Unknown method: {}'.format(method))
+    result[mask] = filled[mask]
+    quality[mask] = flags['interpolated']
+
+    # Long gaps, by regression on the best correlated neighbours
+    same = groups(df.columns)[:, np.newaxis] == groups(df.columns)[np.newaxis, :]
+    np.fill_diagonal(same, False)
+    targets = np.arange(len(df.columns))
+    n, correlation, intercept, slope = pair_fits(values)
+    score = np.where(same & (n >= min_overlap) & (correlation >= min_corr), correlation, -np.inf)
+    order = np.argsort(-score, axis=0, kind='stable')[:neighbours]
+
+    def fitted(predictors):
+        usable = np.isfinite(score[predictors, targets])
+        guess = intercept[predictors, targets] + slope[predictors, targets]*values[:, predictors]
+        return np.where(usable, guess, np.nan)
+
+    missing = np.isnan(result)
+    guess = from_neighbours(values, missing, order, fitted)
+    mask = missing & ~np.isnan(guess)
+    result[mask] = guess[mask]
+    quality[mask] = flags['regression']
+
+    # Rest from the neighbours closest in height, shifted by the lapse rate
+    difference = np.abs(heights[:, np.newaxis] - heights[np.newaxis, :])
+    difference = np.where(same & ~np.isnan(difference), difference, np.inf)
+    order = np.argsort(difference, axis=0, kind='stable')[:neighbours]
+
+    def shifted(predictors):
+        usable = np.isfinite(difference[predictors, targets])
+        shift = rates[month] * (heights - heights[predictors]) / 1000
+        return np.where(usable, values[:, predictors] + shift, np.nan)
+
+    missing = np.isnan(result)
+    guess = from_neighbours(values, missing, order, shifted)
+    mask = missing & ~np.isnan(guess)
+    result[mask] = guess[mask]
+    quality[mask] = flags['lapserate']
+
+    # No negative values in columns without them
+    positive = (np.where(observed, values, 0) >= 0).all(axis=0)
+    result = np.where(positive & ~observed, np.maximum(result, 0), result)
+
+    return Filled(pd.DataFrame(result, index=df.index, columns=df.columns),
+                  pd.DataFrame(quality, index=df.index, columns=df.columns))
+
+
+def summary(quality):
+    """
+    Fraction of values with each flag, for each column.
+    """
+    names = {value: name for name, value in flags.items()}
+    counts = quality.apply(lambda column: column.value_counts(normalize=True))
+    counts = counts.reindex(sorted(names)).fillna(0)
+    counts.index = [names[value] for value in counts.index]
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill missing values in the converted data.')
+    parser.add_argument('-v', '--variables', nargs='+', default=['prec', 'temp'],
+                        choices=['prec', 'temp', 'discharge'], help='variables to fill')
+    parser.add_argument('-g', '--max-gap', type=int, default=5,
+                        help='longest gap in days filled by interpolation')
+    parser.add_argument('-m', '--method', default='linear', choices=['linear', 'seasonal'],
+                        help='interpolation of short gaps')
+    parser.add_argument('-f', '--formats', nargs='+', default=FORMATS,
+                        choices=['csv', 'binary', 'store', 'mmap'],
+                        help='output formats of the filled data')
+    args = parser.parse_args()
+
+    for variable in args.variables:
+        filled = fill(query.load(variable), args.max_gap, args.method, kind=query.kinds[variable])
+        write_frame(filled.data, OUTDIR + variable + '_filled.csv', args.formats)
+        filled.flags.to_csv(OUTDIR + variable + '_flags.csv')
+        print(variable)
+        print((summary(filled.flags)*100).round(1).to_string())
@@ -0,0 +1,284 @@
+import argparse
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from matplotlib.path import Path
+from scipy import sparse
+from common import *
+import basemap
+import basin
+import gapfill
+import query
+import stations
+
+# Interpolation of station data to a grid over the basin, by inverse
+# distance weighting with a lapse rate correction to the elevation of the
+# cells. The weights depend only on which stations have data on a day, so
+# they are computed once for each pattern of available stations and applied
+# to all days with that pattern in one sparse matrix product.
+
+# Cells of the basin. lon, lat and elevation (NaN where unknown) of the
+# cells inside the basin, mask of those cells in the raster (rows from north
+# to south) and extent [west, east, south, north] of the raster.
+Grid = namedtuple('Grid', ['lon', 'lat', 'elevation', 'mask', 'extent'])
+
+
+def parts(lon, lat):
+    """
+    Split an outline with NaN between the parts (see basin.outline) into
+    arrays of points of each part.
+    """
+    points = np.c_[lon, lat]
+    result = []
+    for part in np.split(points, np.flatnonzero(np.isnan(lon))):
+        part = part[~np.isnan(part[:, 0])]
+        if len(part) > 2:
+            result.append(part)
+    return result
+
+
+def sample_dem(lon, lat, filepath=DEM):
+    """
+    Elevation at the points nearest to lon and lat in the elevation model,
+    NaN outside of it or if there is none.
+    """
+    dem = basemap.read_dem(filepath)
+    if dem is None:
+        return np.full(len(lon), np.nan)
+    elevation, (west, east, south, north) = dem
+    rows, columns = elevation.shape
+    row = np.floor((north - lat) / (north - south) * rows).astype(int)
+    column = np.floor((lon - west) / (east - west) * columns).astype(int)
+    inside = (row >= 0) & (row < rows) & (column >= 0) & (column < columns)
+    result = np.full(len(lon), np.nan)
+    result[inside] = elevation[row[inside], column[inside]]
+    return result
+
+
+def rasterize(resolution=0.05, filepath=SHAPEFILE, dem=DEM):
+    """
+    Grid of the cells of resolution degrees whose centers are inside the
+    basin outline. Parts of the outline inside others are holes.
+    """
+    lon, lat = basin.outline(filepath)
+    west = np.floor(np.nanmin(lon) / resolution) * resolution
+    east = np.ceil(np.nanmax(lon) / resolution) * resolution
+    south = np.floor(np.nanmin(lat) / resolution) * resolution
+    north = np.ceil(np.nanmax(lat) / resolution) * resolution
+    columns = int(round((east - west) / resolution))
+    rows = int(round((north - south) / resolution))
+    x = west + (np.arange(columns) + 0.5) * resolution
+    y = north - (np.arange(rows) + 0.5) * resolution
+    centers = np.c_[np.tile(x, rows), np.repeat(y, columns)]
+    inside = np.zeros(len(centers), dtype=bool)
+    for part in parts(lon, lat):
+        inside ^= Path(part).contains_points(centers)
+    cells = centers[inside]
+    return Grid(cells[:, 0], cells[:, 1], sample_dem(cells[:, 0], cells[:, 1], dem),
+                inside.reshape(rows, columns), [west, east, south, north])
+
+
+def distances(grid, lon, lat):
+    """
+    Distance in km from each cell (rows) to each point (columns).
+    """
+    scale = np.cos(np.radians(np.mean(grid.lat))) * 111.32
+    dx = (grid.lon[:, np.newaxis] - np.asarray(lon)[np.newaxis, :]) * scale
+    dy = (grid.lat[:, np.newaxis] - np.asarray(lat)[np.newaxis, :]) * 110.57
+    return np.hypot(dx, dy)
+
+
+class Interpolator:
+    """
+    Inverse distance weighting from stations to the cells of a grid.
+
+    lon, lat, heights - coordinates and altitude of the stations
+    power - power of the inverse distance
+    neighbours - number of closest stations with data used for each cell
+    """
+
+    def __init__(self, grid, lon, lat, heights, power=2, neighbours=4):
+        self.grid = grid
+        self.heights = np.asarray(heights, dtype=float)
+        self.power = power
+        self.neighbours = neighbours
+        # Cells on top of a station get (almost) only its value
+        self.distance = np.maximum(distances(grid, lon, lat), 1e-6)
+        self.weights = {}
+
+    def weight_matrix(self, available):
+        """
+        Sparse weights (cells x stations) for the stations available,
+        rows sum to one. Cached for each pattern of available stations.
+        """
+        key = np.packbits(available).tobytes()
+        if key not in self.weights:
+            stations = np.flatnonzero(available)
+            cells = len(self.grid.lon)
+            k = min(self.neighbours, len(stations))
+            if k == 0:
+                self.weights[key] = sparse.csr_matrix((cells, len(available)))
+                return self.weights[key]
+            distance = self.distance[:, stations]
+            nearest = np.argpartition(distance, k - 1, axis=1)[:, :k]
+            weight = np.take_along_axis(distance, nearest, axis=1) ** -float(self.power)
+            weight /= weight.sum(axis=1, keepdims=True)
+            rows = np.repeat(np.arange(cells), k)
+            self.weights[key] = sparse.csr_matrix(
+                (weight.ravel(), (rows, stations[nearest].ravel())),
+                shape=(cells, len(available)))
+        return self.weights[key]
+
+    def correction(self, weights):
+        """
+        Elevation of the cells minus the weighted elevation of the stations,
+        zero for cells of unknown elevation.
+        """
+        difference = self.grid.elevation - weights @ self.heights
+        return np.where(np.isnan(difference), 0, difference)
+
+    def fields(self, values, rates=None, month=None):
+        """
+        Values of all cells on each day (days x cells).
+
+        values - station values (days x stations), NaN where missing
+        rates - lapse rate per km of each month (12), None for no correction
+        month - month (1-12) of each day
+        """
+        available = ~np.isnan(values)
+        filled = np.where(available, values, 0)
+        patterns, inverse = np.unique(available, axis=0, return_inverse=True)
+        result = np.full((len(values), len(self.grid.lon)), np.nan)
+        for i, pattern in enumerate(patterns):
+            if not pattern.any():
+                continue
+            days = np.flatnonzero(inverse == i)
+            weights = self.weight_matrix(pattern)
+            result[days] = (weights @ filled[days].T).T
+            if rates is not None:
+                shift = np.asarray(rates)[month[days] - 1] / 1000
+                result[days] += shift[:, np.newaxis] * self.correction(weights)[np.newaxis, :]
+        return result
+
+    def mean_weights(self, patterns):
+        """
+        Mean over the cells of the weights of each station (patterns x
+        stations), and mean correction (see correction) for each pattern of
+        available stations. Patterns are done together in chunks, without
+        forming the weights of each cell and station: the stations are
+        visited from the closest to the farthest from each cell, until each
+        cell has neighbours stations with data.
+        """
+        cells, count = self.distance.shape
+        order = np.argsort(self.distance, axis=1)
+        inverse = np.take_along_axis(self.distance, order, axis=1) ** -float(self.power)
+        known = ~np.isnan(self.grid.elevation)
+        heights = self.heights[order] * known[:, np.newaxis]
+        # Sums the weight of the station at position j of each cell
+        scatter = [sparse.csr_matrix((np.ones(cells), (np.arange(cells), order[:, j])),
+                                     shape=(cells, count)) for j in range(count)]
+        weights = np.zeros(patterns.shape)
+        shift = np.zeros(len(patterns))
+        chunk = max(1, 2**22 // cells)
+        for start in range(0, len(patterns), chunk):
+            pattern = patterns[start:start + chunk]
+            found = np.zeros((len(pattern), cells), dtype=np.int16)
+            parts = []
+            for j in range(count):
+                take = pattern[:, order[:, j]] & (found < self.neighbours)
+                if not take.any():
+                    break
+                parts.append(np.where(take, inverse[:, j], 0))
+                found += take
+            if not parts:
+                # No stations with data in this chunk, masked in means
+                continue
+            with np.errstate(invalid='ignore', divide='ignore'):
+                norm = 1 / np.add.reduce(parts)
+            norm[~np.isfinite(norm)] = 0
+            for j, part in enumerate(parts):
+                part *= norm
+                weights[start:start + chunk] += part @ scatter[j]
+                shift[start:start + chunk] -= part @ heights[:, j]
+            shift[start:start + chunk] += self.grid.elevation[known].sum()
+        return weights / cells, shift / cells
+
+    def means(self, values, rates=None, month=None):
+        """
+        Mean over all cells on each day, see fields. Only the mean weight
+        of each station is needed for each pattern, so the cells of each
+        day are never formed.
+        """
+        available = ~np.isnan(values)
+        filled = np.where(available, values, 0)
+        patterns, inverse = np.unique(available, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        weights, shift = self.mean_weights(patterns)
+        result = np.einsum('ij,ij->i', filled, weights[inverse])
+        if rates is not None:
+            result += np.asarray(rates)[month - 1] / 1000 * shift[inverse]
+        result[~patterns.any(axis=1)[inverse]] = np.nan
+        return result
+
+
+def station_points(columns):
+    """
+    Longitude, latitude and altitude of the stations of columns (station
+    names, with _max or _min suffix for temperature).
+    """
+    names = stations.names()
+    points = [names[str(column).partition('_')[0]] for column in columns]
+    return (np.array([s.longitude for s in points]), np.array([s.latitude for s in points]),
+            np.array([s.altitude for s in points], dtype=float))
+
+
+def basin_means(df, grid=None, lapse=True, power=2, neighbours=4):
+    """
+    Basin mean of daily data with station names as columns, like
+    plot.load_data. Temperature gives one column for _max and one for _min.
+
+    lapse - correct for the elevation of the cells with the monthly lapse
+    rates of the stations (see gapfill.lapse_rates). Needs the elevation
+    model, and the altitude of all stations.
+    """
+    if grid is None:
+        grid = rasterize()
+    df = df.sort_index()
+    month = df.index.month.values
+    group = gapfill.groups(df.columns)
+    result = {}
+    for name in np.unique(group):
+        part = df.loc[:, group == name]
+        lon, lat, heights = station_points(part.columns)
+        rates = None
+        if lapse and not np.isnan(heights).any():
+            rates = gapfill.lapse_rates(part, heights)[:, 0]
+            if np.isnan(rates).any():
+                rates = None
+        interpolator = Interpolator(grid, lon, lat, np.nan_to_num(heights), power, neighbours)
+        values = part.to_numpy(dtype=float)
+        means = interpolator.means(values, rates, month)
+        # No negative means of data without negative values
+        if (values[~np.isnan(values)] >= 0).all():
+            means = np.maximum(means, 0)
+        result['basin_' + name if name else 'basin'] = means
+    return pd.DataFrame(result, index=df.index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Basin mean precipitation and temperature.')
+    parser.add_argument('-r', '--resolution', type=float, default=0.05,
+                        help='size of the grid cells in degrees')
+    parser.add_argument('--no-lapse', action='store_true',
+                        help='no correction for the elevation of the cells')
+    args = parser.parse_args()
+
+    grid = rasterize(args.resolution)
+    print('{} cells in the basin'.format(len(grid.lon)))
+    for variable in ['prec', 'temp']:
+        df = query.load(variable)
+        start = time.perf_counter()
+        means = basin_means(df, grid, not args.no_lapse)
+        print('{}: {} days in {:.2f} s'.format(variable, len(means), time.perf_counter() - start))
+        means.to_csv(OUTDIR + 'basin_{}.csv'.format(variable))
@@ -10,70 +10,76 @@
 #       jupytext_version: 1.2.4
 # ---
 
+import logging
 import pandas as pd
 import os
 import numpy as np
 from common import *
+import ingest
+import instrument
+import stations
+from store import ColumnStore, write_frame
+
+log = logging.getLogger(__name__)
 
 def convert_stations(outfile):
     """
     Convert information about hydrological stations to
     .csv. Also add altitude information.
     """
-    # Elevation found from dhm.gov.np/hydrological-station at
-    # 24.10.19, 15:24
-    station_height = {420:198, 445:485,445:485,447:600,450:180}
-    stations = []
-    for root, dirs, files in os.walk(DISDIR):
-        stations = dirs
-        break
-    df = pd.DataFrame(columns = ['Name','Latitude','Longitude','Altitude'])
-    df.index.name = 'id'
-    for station in stations:
-        path = DISDIR + station + '/Daily Discharge/'
-        # Take one random file for each station
-        filepath = path + os.listdir(path)[0]
-        with open(filepath) as file:
-            lines = (file.readlines()[0:3])
-            id = int(lines[0].split()[-1])
-            name = lines[1].split()[1]
-            latline = lines[1].split()[-3:]
-            lonline = lines[2].split()[-3:]
-            lat = float(latline[0]) + float(latline[1])/60. + float(latline[2])/3600
-            lon = float(lonline[0]) + float(lonline[1])/60. + float(lonline[2])/3600
-            df.loc[id,'Latitude'] = lat
-            df.loc[id,'Longitude'] = lon
-            df.loc[id,'Name'] = name
-    for key, value in station_height.items():
+    df = stations.frame('hyd')
+    df['Altitude'] = df['Altitude'].astype(object)
+    # Include stations with known altitude but without data
+    for key, value in stations.hyd_altitude.items():
         df.loc[key,'Altitude'] = value
     df['Latitude'] = df['Latitude'].astype(float).round(3)
     df['Longitude'] = df['Longitude'].astype(float).round(3)
     df.sort_index().to_csv(outfile)
 
 
+def list_stations():
+    """
+    Returns the station folders in DISDIR.
+    """
+    for root, dirs, files in os.walk(DISDIR):
+        return dirs
+    return []
+
 
-def load_discharge(station):
+def list_files(station):
     """
-    Loads data for one station
+    Returns paths to all discharge files of one station.
     """
     path = DISDIR + station + '/Daily Discharge/'
-    frames = []
-    files = os.listdir(path)
-    for filename in files:
-        filepath = path+filename
-        frames.append(load_df_manual(filepath))
+    return [path + filename for filename in os.listdir(path)]
+
+
+def load_discharge(station, mapper=map):
+    """
+    Loads data for one station
+
+    mapper - map-like function used to load the files, e.g. the map
+    method of a process pool.
+    """
+    frames = list(mapper(load_df_manual, list_files(station)))
     return pd.concat(frames)
 
+
 def get_year(filepath):
-    with open(filepath) as file:
-            year = file.readlines()[4:5][0].split(':')[-1].strip()
-    return int(year)
+    return parse_year(ingest.lines(filepath))
 
 
 def get_station(filepath):
-    with open(filepath) as file:
-        station = file.readline().split(':')[-1].strip()
-    return station
+    return parse_station(ingest.lines(filepath))
+
+
+def parse_year(lines):
+    return int(lines[4].split(':')[-1].strip())
+
+
+def parse_station(lines):
+    return lines[0].split(':')[-1].strip()
+
 
 def load_df_manual(filepath):
     """
@@ -82,67 +88,97 @@ def load_df_manual(filepath):
 
     Filepath - path to discharge file
     """
+    return parse_file(ingest.lines(filepath))
 
-    year = get_year(filepath)
-    station = get_station(filepath)
-    print('Loading data - station: {}, year: {}'.format(station, year))
-    column = station
-    df = pd.DataFrame(columns=[column])
-    df.index.name = 'date'
-    months = ['Jan.', 'Feb.','Mar.','Apr.','May','Jun.','Jul.','Aug.','Sep.','Oct.','Nov.', 'Dec.']
-
-    with open(filepath) as file:
-        lines = file.readlines()[10:41]
-        for line in lines:
-            line = line.split()
-            day = int(line[0])
-            if day == 29:
-                if (year % 4 != 0):
-                    line.insert(2,np.nan)
-            elif day == 30:
-                line.insert(2,np.nan)
-            elif day == 31:
-                for i in (2,4,6,9,11):
-                    line.insert(i,np.nan)
-
-            # Special cases
-            # missing value station 450, according to mean should be 946
-            if (station == '450' and year == 1977 and day == 17):
-                line.insert(6,946)
-            for month,month_num in zip(months, range(1,len(months)+1)):
-                # Construct date
-                date = '{}-{:02}-{}'.format(year, month_num, day)
-                precip = line[month_num]
-
-                # Check if value is missing
-                if precip == 'NA':
-                    precip = np.nan
-                else:
-                    precip = float(precip)
-
-                # Add to new dataframe
-                try:
-                    date_time = pd.to_datetime(date)
-                    df.loc[date_time] = precip
-                except ValueError:
-                    continue
+
+def parse_file(lines):
+    """
+    Dataframe of the daily values from the lines of a discharge file.
+    """
+    year = parse_year(lines)
+    station = parse_station(lines)
+    log.debug('Loading data - station: %s, year: %s', station, year)
+    values = parse_days(lines[10:41], station, year)
+
+    # Day rows are stored day by day, month by month, so the dates
+    # follow the same (day, month) order as the grid.
+    months = np.arange(12) + (np.datetime64('{}-01'.format(year), 'M'))
+    first = months.astype('datetime64[D]')
+    length = ((months + 1).astype('datetime64[D]') - first).astype(int)
+    days = np.arange(31)[:, np.newaxis]
+    valid = days < length
+    dates = (first + days)[valid].astype('datetime64[ns]')
+
+    df = pd.DataFrame({station: values[valid]},
+                      index=pd.DatetimeIndex(dates, name='date'))
     return df
 
 
-def convert_data(outfile):
+def parse_days(lines, station, year):
+    """
+    Parse the 31 day rows of a discharge file to a 31x12 (day, month)
+    array. Positions of days not existing in a month are set to NaN.
     """
-    Convert discharge data for all stations and store as csv file.
+    rows = []
+    for line in lines:
+        line = line.split()
+        day = int(line[0])
+        if day == 29:
+            if (year % 4 != 0):
+                line.insert(2, np.nan)
+        elif day == 30:
+            line.insert(2, np.nan)
+        elif day == 31:
+            for i in (2,4,6,9,11):
+                line.insert(i, np.nan)
+
+        # Special cases
+        # missing value station 450, according to mean should be 946
+        if (station == '450' and year == 1977 and day == 17):
+            line.insert(6, 946)
+            instrument.count('patched')
+        # Check if value is missing
+        rows.append([np.nan if value == 'NA' else value for value in line[1:13]])
+    if instrument.active():
+        instrument.count('NA', sum(line.split().count('NA') for line in lines))
+        # Days 30 and 31 of February and 31 of the short months
+        instrument.count('padding', 6 + (year % 4 != 0))
+    return np.array(rows, dtype=float)
+
+
+def convert_data(outfile, mapper=map, formats=FORMATS):
     """
-    stations = []
+    Convert discharge data for all stations and store in the formats
+    given by FORMATS.
+
+    mapper - map-like function used to load the files. Files from all
+    stations are passed in one call, and the results are put back
+    together in station order, so the output does not depend on mapper.
+    formats - list of output formats, see store.write_frame
+    """
+    files = [list_files(station) for station in list_stations()]
+    loaded = list(mapper(load_df_manual, [f for fs in files for f in fs]))
     frames = []
-    for root, dirs, files in os.walk(DISDIR):
-        stations = dirs
-        break
-    for station in stations:
-        df = load_discharge(station)
-        frames.append(df)
+    start = 0
+    for fs in files:
+        frames.append(pd.concat(loaded[start:start + len(fs)]))
+        start += len(fs)
     df = pd.concat(frames,axis=1)
-    df.to_csv(outfile)
+    write_frame(df, outfile, formats)
+    return df
+
+
+def stream_data(outfile, mapper=map):
+    """
+    Convert discharge data one station at a time and append each station
+    to a ColumnStore next to outfile (discharge.csv -> discharge.store/).
+    Only one station is kept in memory at a time.
+    """
+    store = ColumnStore(os.path.splitext(outfile)[0] + '.store')
+    store.clear()
+    for station in list_stations():
+        store.append(load_discharge(station, mapper))
+    return store
 
 
 if __name__ == '__main__':
@@ -0,0 +1,220 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from queue import Queue
+from common import *
+
+# Reading of the raw DHM files. Files are read once, by a pool of threads
+# so that many reads are waiting on slow (e.g. network) storage at the same
+# time, and kept in a bounded in-memory cache of bytes. The parsers get the
+# lines of a file from lines(), which only reads the file if it is not
+# buffered. Buffered files are keyed by path, size and mtime, so a changed
+# file is read again. The sha1 hash of every file read is kept as well, for
+# the manifest of incremental conversions.
+
+
+class ByteCache:
+    """
+    Least recently used cache of file contents, limited by total size in
+    bytes. Safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.items:
+                self.nbytes -= len(self.items[key])
+            self.items[key] = data
+            self.items.move_to_end(key)
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                key, old = self.items.popitem(last=False)
+                self.nbytes -= len(old)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.nbytes = 0
+
+
+cache = ByteCache(INGEST_BYTES)
+
+# sha1 hash of the files read, keyed like the cache
+digests = {}
+
+# Content of the file being parsed in a worker, see wrap
+current = {}
+
+
+def discover():
+    """
+    Returns dict mapping discharge, prec and temp to the paths of all
+    station-year files in DISDIR, PRECDIR and TEMPDIR.
+    """
+    files = {}
+    for variable, folder, subfolder in (('discharge', DISDIR, 'Daily Discharge/'),
+                                        ('prec', PRECDIR, ''),
+                                        ('temp', TEMPDIR, '')):
+        files[variable] = []
+        for root, dirs, _ in os.walk(folder):
+            for station in dirs:
+                path = folder + station + '/' + subfolder
+                files[variable] += [path + filename for filename in os.listdir(path)]
+            break
+    return files
+
+
+def read(filepath):
+    """
+    Content of filepath as bytes, from the buffer if the file was read
+    before.
+    """
+    data = current.get(filepath)
+    if data is not None:
+        return data
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_size, stat.st_mtime_ns)
+    data = cache.get(key)
+    if data is None:
+        with open(filepath, 'rb') as file:
+            data = file.read()
+        cache.put(key, data)
+        digests[key] = hashlib.sha1(data).hexdigest()
+    return data
+
+
+def digest(filepath):
+    """
+    sha1 hash of the content of filepath. The file is only read if it was
+    not read before.
+    """
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_size, stat.st_mtime_ns)
+    if key not in digests:
+        digests[key] = hashlib.sha1(read(filepath)).hexdigest()
+    return digests[key]
+
+
+def text(filepath):
+    """
+    Content of filepath as text, decoded like open(filepath).read().
+    """
+    return io.TextIOWrapper(io.BytesIO(read(filepath))).read()
+
+
+def lines(filepath):
+    """
+    Lines of filepath, like open(filepath).readlines().
+    """
+    return io.TextIOWrapper(io.BytesIO(read(filepath))).readlines()
+
+
+def read_batches(paths, max_bytes=INGEST_BYTES, threads=READ_THREADS):
+    """
+    Yields lists of (path, bytes) of consecutive paths, read by up to
+    threads threads at a time. A batch is yielded when it holds max_bytes
+    or at the end of paths.
+    """
+    paths = iter(paths)
+    pending = deque()
+    batch, size = [], 0
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        def fill():
+            while len(pending) < threads:
+                path = next(paths, None)
+                if path is None:
+                    return
+                pending.append((path, executor.submit(read, path)))
+        fill()
+        while pending:
+            path, future = pending.popleft()
+            data = future.result()
+            fill()
+            batch.append((path, data))
+            size += len(data)
+            if size >= max_bytes:
+                yield batch
+                batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def read_ahead(paths, max_bytes=INGEST_BYTES, threads=READ_THREADS):
+    """
+    Like read_batches, but the next batch is read in a background thread
+    while the caller works on the current one. At most about three batches
+    are held in memory.
+    """
+    queue = Queue(maxsize=1)
+
+    def produce():
+        try:
+            for batch in read_batches(paths, max_bytes, threads):
+                queue.put(batch)
+            queue.put(None)
+        except Exception as error:
+            queue.put(error)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        batch = queue.get()
+        if batch is None:
+            return
+        if isinstance(batch, Exception):
+            raise batch
+        yield batch
+
+
+def parse(func, filepath, data, *args):
+    """
+    Call func(filepath, *args) with the content of filepath buffered, so
+    lines(filepath) does not read the file again. Runs in the worker
+    processes.
+    """
+    current[filepath] = data
+    try:
+        return func(filepath, *args)
+    finally:
+        del current[filepath]
+
+
+def wrap(mapper=map, max_bytes=INGEST_BYTES, threads=READ_THREADS):
+    """
+    Returns a map-like function that reads the files (the first iterable)
+    in this process ahead of mapper, and passes their content on with the
+    paths, so each file is read once however many functions look at it.
+
+    Files are passed to mapper in batches of about max_bytes, so memory
+    use does not grow with the size of the archive.
+    """
+    def ingested_map(func, files, *args):
+        args = [list(arg) for arg in args]
+        results = []
+        start = 0
+        for batch in read_ahead(files, max_bytes, threads):
+            end = start + len(batch)
+            results += mapper(partial(parse, func),
+                              [path for path, data in batch],
+                              [data for path, data in batch],
+                              *[arg[start:end] for arg in args])
+            start = end
+        return results
+    return ingested_map
@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from functools import partial
+
+# Per-file statistics of the conversion: parse time, bytes read, rows
+# produced and the number of sentinel entries replaced by the loaders
+# (NA, DNA, T, -99.9, padding of short months and rows). Off unless the
+# mapper is wrapped with wrap(), so the loaders only pay for a None check.
+
+# Counter of the file being loaded, None when not instrumented
+current = None
+
+
+def active():
+    return current is not None
+
+
+def count(name, n=1):
+    """
+    Add n to counter name of the file being loaded.
+    """
+    if current is not None and n:
+        current[name] += int(n)
+
+
+def measure(func, filepath, *args):
+    """
+    Call func(filepath, *args) and return the result together with the
+    statistics of the file. Runs in the worker processes.
+    """
+    global current
+    current = Counter()
+    start = time.perf_counter()
+    try:
+        df = func(filepath, *args)
+        seconds = time.perf_counter() - start
+        record = {'file': filepath, 'loader': func.__name__, 'seconds': seconds,
+                  'bytes': os.path.getsize(filepath), 'rows': len(df)}
+        record.update(current)
+    finally:
+        current = None
+    return df, record
+
+
+def wrap(mapper=map, records=None):
+    """
+    Returns a map-like function that collects statistics of each loaded
+    file in records (a list) and passes the loaded frames on.
+    """
+    if records is None:
+        records = []
+
+    def instrumented_map(func, files, *args):
+        results = []
+        for df, record in mapper(partial(measure, func), files, *args):
+            records.append(record)
+            results.append(df)
+        return results
+    instrumented_map.records = records
+    return instrumented_map
+
+
+def write_report(records, filepath):
+    """
+    Write file statistics to .json or .csv file depending on extension.
+    Sentinel counts missing for a file are 0 in the csv file.
+    """
+    if os.path.splitext(filepath)[1] == '.json':
+        with open(filepath, 'w') as file:
+            json.dump(records, file, indent=1)
+        return
+    columns = ['file', 'loader', 'seconds', 'bytes', 'rows']
+    counters = sorted({key for record in records for key in record} - set(columns))
+    with open(filepath, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns + counters, restval=0)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def summary(records):
+    """
+    Returns total time, bytes, rows and sentinel counts of records for
+    each loader.
+    """
+    totals = {}
+    for record in records:
+        total = totals.setdefault(record['loader'], Counter())
+        total['files'] += 1
+        for key, value in record.items():
+            if key not in ('file', 'loader'):
+                total[key] += value
+    return totals
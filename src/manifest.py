@@ -0,0 +1,157 @@
+import hashlib
+import inspect
+import json
+import os
+import pandas as pd
+from common import *
+import ingest
+
+
+class Manifest:
+    """
+    Keeps track of converted input files, so that files which have not
+    changed since the last run are not parsed again.
+
+    For every input file the manifest records path, size, mtime and a
+    sha1 hash of the content, together with the name of a pickle in
+    cachedir holding the parsed dataframe and the years it covers. The
+    hash of the loader's code is stored as well, so files are parsed
+    again when the loader changes.
+    """
+
+    def __init__(self, path=OUTDIR + 'manifest.json', cachedir=OUTDIR + 'cache/'):
+        self.path = path
+        self.cachedir = cachedir
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.entries = json.load(file)
+        self.seen = set()
+        # Years of data in changed or deleted files, for each loader
+        self.touched = {}
+        self.parsed = 0
+        self.reused = 0
+
+    def wrap(self, mapper=map):
+        """
+        Returns a map-like function that only passes new or changed
+        files on to mapper, and loads the rest from the cache.
+
+        The first iterable given to the returned function must be the
+        file paths.
+        """
+        def cached_map(func, files, *args):
+            files = list(files)
+            args = [list(arg) for arg in args]
+            results = [None] * len(files)
+            stale = []
+            code = code_hash(func)
+            for i, filepath in enumerate(files):
+                key = '{}:{}'.format(func.__name__, filepath)
+                self.seen.add(key)
+                if self.is_fresh(key, filepath, code):
+                    results[i] = pd.read_pickle(self.cachedir + self.entries[key]['cache'])
+                    self.reused += 1
+                else:
+                    stale.append(i)
+            loaded = mapper(func, [files[i] for i in stale],
+                            *[[arg[i] for i in stale] for arg in args])
+            for i, df in zip(stale, loaded):
+                key = '{}:{}'.format(func.__name__, files[i])
+                self.touch(key)
+                self.store(key, files[i], df, code)
+                self.touch(key)
+                results[i] = df
+                self.parsed += 1
+            return results
+        return cached_map
+
+    def is_fresh(self, key, filepath, code=None):
+        """
+        Check if the cached result for filepath is up to date and was
+        parsed by a loader with code hash code. Size and mtime are
+        compared first, and the content hash only if they differ. The file
+        is read through ingest, so it is not read again when it is parsed.
+        """
+        entry = self.entries.get(key)
+        if entry is None or not os.path.exists(self.cachedir + entry['cache']):
+            return False
+        if entry.get('code') != code:
+            return False
+        stat = os.stat(filepath)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime == entry['mtime']:
+            return True
+        if ingest.digest(filepath) != entry['hash']:
+            return False
+        entry['mtime'] = stat.st_mtime
+        return True
+
+    def store(self, key, filepath, df, code=None):
+        """
+        Cache df as the parsed content of filepath.
+        """
+        os.makedirs(self.cachedir, exist_ok=True)
+        stat = os.stat(filepath)
+        cache = hashlib.sha1(key.encode()).hexdigest() + '.pkl'
+        df.to_pickle(self.cachedir + cache)
+        self.entries[key] = {'path': filepath,
+                             'size': stat.st_size,
+                             'mtime': stat.st_mtime,
+                             'hash': ingest.digest(filepath),
+                             'cache': cache,
+                             'code': code,
+                             'years': sorted(int(year) for year in set(df.index.year))}
+
+    def touch(self, key):
+        """
+        Add the years of the entry for key to the touched years of its loader.
+        """
+        if key in self.entries:
+            func = key.split(':', 1)[0]
+            self.touched.setdefault(func, set()).update(self.entries[key].get('years', []))
+
+    def prune(self):
+        """
+        Remove entries and cached results of files that were not seen in
+        this run, i.e. deleted input files. Returns the removed paths.
+        """
+        removed = []
+        for key in set(self.entries) - self.seen:
+            self.touch(key)
+            entry = self.entries.pop(key)
+            if os.path.exists(self.cachedir + entry['cache']):
+                os.remove(self.cachedir + entry['cache'])
+            removed.append(entry['path'])
+        return sorted(removed)
+
+    def save(self):
+        with open(self.path, 'w') as file:
+            json.dump(self.entries, file, indent=1, sort_keys=True)
+
+
+def file_hash(filepath):
+    """
+    Returns sha1 hash of the content of filepath.
+    """
+    sha1 = hashlib.sha1()
+    with open(filepath, 'rb') as file:
+        sha1.update(file.read())
+    return sha1.hexdigest()
+
+
+def code_hash(func):
+    """
+    Returns sha1 hash of the source of the module defining func, so a
+    change of the loader or of the helpers it calls is noticed.
+    """
+    while hasattr(func, 'func'):
+        # functools.partial
+        func = func.func
+    module = inspect.getmodule(func)
+    try:
+        source = inspect.getsource(module if module is not None else func)
+    except (OSError, TypeError):
+        source = func.__qualname__
+    return hashlib.sha1(source.encode()).hexdigest()
@@ -3,6 +3,9 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 from common import *
+import ingest
+import instrument
+from store import ColumnStore, write_frame
 
 def convert_stations(outfile):
     """
@@ -31,45 +34,129 @@ def get_year(filepath):
     return year
 
 
-def convert_data(outfile, variable):
+def list_stations(folder):
     """
-    Convert all data of type variable to nice csv files.
+    Returns the station folders in folder.
+    """
+    for root, dirs, files in os.walk(folder):
+        return dirs
+    return []
+
+
+def list_files(station, folder):
+    """
+    Returns paths to all data files of one station.
+    """
+    path = folder + station + '/'
+    return [path + file for file in os.listdir(path)]
+
+
+def convert_data(outfile, variable, mapper=map, formats=FORMATS):
+    """
+    Convert all data of type variable to nice csv and binary files.
 
     Variable: temp or prec
+    mapper: map-like function used to load the files. Files from all
+    stations are passed in one call, and the results are put back
+    together in station order, so the output does not depend on mapper.
+    formats - list of output formats, see store.write_frame
     """
-    stations = []
-    frames = []
     folder = INDIR + variable + '/'
-    for root, dirs, files in os.walk(folder):
-        stations = dirs
-        break
-    for station in stations:
-        df = load_station(station, variable,folder)
-        frames.append(df)
+    stations = list_stations(folder)
+    files = [list_files(station, folder) for station in stations]
+    loaded = list(mapper(loaders[variable],
+                         [f for fs in files for f in fs],
+                         [s for s, fs in zip(stations, files) for f in fs]))
+    frames = []
+    start = 0
+    for fs in files:
+        frames.append(pd.concat(loaded[start:start + len(fs)]))
+        start += len(fs)
     df = pd.concat(frames, axis=1)
-    df.to_csv(outfile)
+    write_frame(df, outfile, formats)
+    return df
+
+
+def stream_data(outfile, variable, mapper=map):
+    """
+    Convert data of type variable one station at a time and append each
+    station to a ColumnStore next to outfile (prec.csv -> prec.store/).
+    Only one station is kept in memory at a time.
+    """
+    folder = INDIR + variable + '/'
+    store = ColumnStore(os.path.splitext(outfile)[0] + '.store')
+    store.clear()
+    for station in list_stations(folder):
+        store.append(load_station(station, variable, folder, mapper))
+    return store
 
 
-def load_station(station, variable, folder):
+def load_station(station, variable, folder, mapper=map):
     """
     Read data of type variable from one station.
     """
-    path = folder + station + '/'
-    frames = []
-    files = os.listdir(path)
-    for file in files:
-        filepath = path + file
-        if variable == 'prec':
-            df = load_precipitation(filepath,station)
-        elif variable == 'temp':
-            df = load_temperature(filepath,station)
-        # df = load_df(filepath, station)
-        frames.append(df)
+    files = list_files(station, folder)
+    frames = list(mapper(loaders[variable], files, [station] * len(files)))
     df = pd.concat(frames)
     return df
 
 
 
+def read_table(filepath, names, sentinels, skiprows=0):
+    """
+    Read a whitespace separated file with day of year in the first column
+    and one column for each name. The last line is a footer and is skipped.
+
+    sentinels - dict mapping text entries (e.g. DNA) to the value they
+    represent. Entries of -99.9 are always treated as missing values.
+
+    Returns day of year and a float array with one column for each name.
+    """
+    lines = ingest.text(filepath).splitlines()[skiprows:]
+    rows = [line.split() for line in lines if line.strip()][:-1]
+    width = len(names) + 1
+    # Rows with missing entries are padded like read_csv does
+    tokens = np.array([row[:width] + ['nan'] * (width - len(row)) for row in rows])
+    padded = 0
+    if instrument.active():
+        padded = sum(max(width - len(row), 0) for row in rows)
+        instrument.count('padding', padded)
+    days = tokens[:, 0].astype(int)
+    tokens = tokens[:, 1:]
+
+    values = np.full(tokens.shape, np.nan)
+    numeric = np.ones(tokens.shape, dtype=bool)
+    for text, value in sentinels.items():
+        mask = tokens == text
+        values[mask] = value
+        numeric &= ~mask
+        if instrument.active():
+            # Padded entries are not counted as nan entries
+            instrument.count(text or 'empty', mask.sum() - (padded if text == 'nan' else 0))
+    values[numeric] = tokens[numeric].astype(float)
+    mask = values == -99.9
+    values[mask] = np.nan
+    if instrument.active():
+        instrument.count('-99.9', mask.sum())
+    return days, values
+
+
+def to_dates(year, days):
+    """
+    Returns DatetimeIndex from day of year numbers.
+    """
+    start = np.datetime64('{:04}-01-01'.format(year), 'D')
+    length = (np.datetime64('{:04}-01-01'.format(year + 1), 'D') - start).astype(int)
+    if days.min() < 1 or days.max() > length:
+        raise ValueError('Day of year out of range in year {}'.format(year))
+    dates = start + (days - 1)
+    return pd.DatetimeIndex(dates.astype('datetime64[ns]'), name='date')
+
+
+# Entries that read_csv treats as missing values
+missing = {text: np.nan for text in ('NA', 'N/A', 'NaN', 'nan', 'null', '')}
+
+
 def load_temperature(filepath, station):
     """
     Load one file containing temperature data
@@ -78,21 +165,11 @@ def load_temperature(filepath, station):
     name1 = '{}_max'.format(station.lstrip('0'))
     name2 = '{}_min'.format(station.lstrip('0'))
     names = [name1,name2]
-    df = pd.read_csv(filepath, skiprows=2, skipfooter=1,engine='python' ,delim_whitespace=True, index_col=0, header=None,names=names)
-    df.index.name = 'date'
-
     # Replace T and DNA with NaN
-    df = df.replace("T",np.nan)
-    df = df.replace("DNA", np.nan)
-    year = get_year(filepath)
-    # Convert to numeric
-    for name in names:
-        df[name] = pd.to_numeric(df[name])
-    # Replace -99.9 with NaN
-    df = df.replace(-99.9, np.nan)
-    year = get_year(filepath)
-    # index = pd.to_datetime(year*1000 + 5, format='%Y%j')
-    df.index = pd.to_datetime(year*1000 + df.index, format='%Y%j')
+    sentinels = dict(missing, T=np.nan, DNA=np.nan)
+    days, values = read_table(filepath, names, sentinels, skiprows=2)
+    index = to_dates(get_year(filepath), days)
+    df = pd.DataFrame(values, index=index, columns=names)
     return df
 
 
@@ -100,27 +177,21 @@ def load_precipitation(filepath, station):
     """
     Load one file containing precipitation data
     """
-    # name = 'precip_{}'.format(station)
     name = station.lstrip('0')
-    df = pd.read_csv(filepath, skipfooter=1,engine='python' ,delim_whitespace=True, index_col=0, header=None,names=[name])
-    df.index.name = 'date'
-    # Replace DNA with NaN
-    df = df.replace("DNA", np.nan)
-    # T -> 0.2
-    df = df.replace("T",0.2)
-    year = get_year(filepath)
-    # Convert to numeric
-    df[name] = pd.to_numeric(df[name])
-    # Replace -99.9 with NaN
-    df = df.replace(-99.9, np.nan)
+    # Replace DNA with NaN and T -> 0.2
+    sentinels = dict(missing, T=0.2, DNA=np.nan)
+    days, values = read_table(filepath, [name], sentinels)
     # # Half of 1969 is missing values, and rest is zero. Missing data?
     # if year == 1969:
     #     df = df.replace(0, np.nan)
-    # index = pd.to_datetime(year*1000 + 5, format='%Y%j')
-    df.index = pd.to_datetime(year*1000 + df.index, format='%Y%j')
+    index = to_dates(get_year(filepath), days)
+    df = pd.DataFrame(values, index=index, columns=[name])
     return df
 
 
+# File loader for each variable
+loaders = {'prec': load_precipitation, 'temp': load_temperature}
+
 
 if __name__ == '__main__':
     # Convert station information
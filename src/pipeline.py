@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from common import *
+import cube
+import figures
+import hyd as hyd
+import ingest
+import met as met
+import plot
+import query
+import stations
+import validate
+from store import binary_format, read_frame
+
+# Run the whole workflow, from the DHM files to the figures, as a graph of
+# stages. Results are passed between stages in memory, stages that do not
+# depend on each other run at the same time, and stages whose sources and
+# inputs did not change since the last run are skipped.
+
+# A stage. func(*results of inputs) returns the result of the stage.
+# sources - files whose size and mtime decide if the stage is stale
+# outputs - files written by the stage, the stage runs if one is missing
+# load - function returning the result from the outputs, used when a
+# skipped stage is the input of a stage that runs. None if there is no
+# result to pass on.
+Stage = namedtuple('Stage', ['name', 'inputs', 'func', 'sources', 'outputs', 'load'])
+
+recordfile = OUTDIR + 'pipeline.json'
+
+
+def signature(paths):
+    """
+    Size and mtime of paths, None for paths that do not exist.
+    """
+    result = []
+    for path in sorted(paths):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            result.append([path, stat.st_size, stat.st_mtime])
+        else:
+            result.append([path, None])
+    return result
+
+
+def order(stages):
+    """
+    Returns stages sorted so that every stage comes after its inputs.
+    Raises ValueError for unknown inputs and cycles.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in by_name:
+                raise ValueError('Unknown input {} of stage {}'.format(name, stage.name))
+    done = []
+    names = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if set(stage.inputs) <= names]
+        if not ready:
+            raise ValueError('Cycle between stages: {}'.format(
+                ', '.join(stage.name for stage in remaining)))
+        for stage in ready:
+            remaining.remove(stage)
+            names.add(stage.name)
+            done.append(stage)
+    return done
+
+
+def stage_keys(stages):
+    """
+    Key of each stage from its sources and the keys of its inputs, so a
+    change upstream changes the key of every stage below it.
+    """
+    keys = {}
+    for stage in order(stages):
+        key = [stage.name, json.dumps(signature(stage.sources))]
+        key += [keys[name] for name in stage.inputs]
+        keys[stage.name] = hashlib.sha1('\n'.join(key).encode()).hexdigest()
+    return keys
+
+
+def run(stages, workers=None, force=False):
+    """
+    Run the stages that are stale, i.e. whose key changed since the last
+    run or whose outputs are missing, with up to workers stages at a time.
+
+    Returns dict mapping stage name to record with key, outputs, status
+    ('ran' or 'skipped') and seconds (of the last run). Records are also
+    written to OUTDIR/pipeline.json.
+    """
+    stages = order(stages)
+    by_name = {stage.name: stage for stage in stages}
+    records = {}
+    if os.path.exists(recordfile):
+        with open(recordfile) as file:
+            records = json.load(file)
+    keys = stage_keys(stages)
+    stale = [stage for stage in stages
+             if force or records.get(stage.name, {}).get('key') != keys[stage.name]
+             or not all(os.path.exists(path) for path in stage.outputs)]
+    names = set(stage.name for stage in stale)
+    for stage in stages:
+        if stage.name not in names:
+            records[stage.name] = dict(records[stage.name], status='skipped')
+
+    results = {}
+
+    def result(name):
+        # Results of skipped stages are loaded from their outputs
+        if name not in results:
+            results[name] = by_name[name].load()
+        return results[name]
+
+    def execute(stage, inputs):
+        start = time.perf_counter()
+        value = stage.func(*inputs)
+        return value, time.perf_counter() - start
+
+    running = {}
+    pending = list(stale)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for stage in list(pending):
+                    if any(name in names and name not in results for name in stage.inputs):
+                        continue
+                    pending.remove(stage)
+                    inputs = [result(name) for name in stage.inputs]
+                    running[executor.submit(execute, stage, inputs)] = stage
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    results[stage.name], seconds = future.result()
+                    records[stage.name] = {'key': keys[stage.name],
+                                           'outputs': stage.outputs,
+                                           'status': 'ran',
+                                           'seconds': seconds}
+    finally:
+        if os.path.isdir(OUTDIR):
+            with open(recordfile, 'w') as file:
+                json.dump(records, file, indent=1, sort_keys=True)
+    return {stage.name: records[stage.name] for stage in stages}
+
+
+def figure_data(p, t, q, cubes):
+    """
+    Input frames of plot.jobs from the converted data and the aggregates,
+    the same frames as plot.py loads with query.load, so the frame hashes
+    of figures.run are the same for both.
+    """
+    data = {}
+    for name, variable, df in (('p', 'prec', p), ('t', 'temp', t), ('q', 'discharge', q)):
+        # Sorted like query.read does
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        data[name] = df.rename(columns=lambda column: query.column_name(variable, column))
+        data[name + 'c'] = cube.with_names(cubes[variable], variable)
+    return data
+
+
+def default_stages(mapper=map, formats=FORMATS, rtol=0.01):
+    """
+    Stages from the DHM files to the figures made by plot.py:
+    station tables, conversion of each variable, validation of the
+    discharge files, monthly aggregates and figures.
+
+    mapper - map-like function used to load the files, see convert.run
+    """
+    outputs = {'prec': precipitation, 'temp': temperature, 'discharge': discharge}
+    files = ingest.discover()
+    code = {'met': [met.__file__], 'hyd': [hyd.__file__]}
+
+    binary = {'feather': '.feather', 'pickle': '.pkl'}[binary_format()]
+
+    def written(variable):
+        base = os.path.splitext(outputs[variable])[0]
+        paths = [base + '.csv'] if 'csv' in formats else []
+        if 'binary' in formats:
+            paths.append(base + binary)
+        return paths
+
+    # Mismatches found while converting the discharge files. If the
+    # conversion is skipped, the validation stage reads the files itself.
+    mismatches = []
+
+    def convert_discharge():
+        mismatches.clear()
+        df = hyd.convert_data(outputs['discharge'], validate.wrap(mapper, mismatches, rtol), formats)
+        convert_discharge.checked = True
+        return df
+    convert_discharge.checked = False
+
+    def check(df):
+        found = mismatches
+        if not convert_discharge.checked:
+            checked = mapper(partial(validate.check_file, rtol=rtol), files['discharge'])
+            found = [mismatch for result in checked for mismatch in result]
+        validate.write_report(found, OUTDIR + 'validation.csv')
+        return found
+
+    def aggregate(p, t, q):
+        cubes = {}
+        for variable, df in (('prec', p), ('temp', t), ('discharge', q)):
+            cubes[variable] = cube.build(variable, [df], df.columns)
+        return cubes
+
+    def plot_figures(p, t, q, cubes):
+        stations.registry.cache_clear()
+        stations.names.cache_clear()
+        return figures.run(plot.jobs, figure_data(p, t, q, cubes))
+
+    return [
+        Stage('met stations', [], lambda: met.convert_stations(OUTDIR + 'met_stations.csv'),
+              [INDIR + 'station_loc.txt'] + code['met'], [OUTDIR + 'met_stations.csv'], None),
+        Stage('hyd stations', [], lambda: hyd.convert_stations(OUTDIR + 'hyd_stations.csv'),
+              files['discharge'] + code['hyd'], [OUTDIR + 'hyd_stations.csv'], None),
+        Stage('prec', [], lambda: met.convert_data(outputs['prec'], 'prec', mapper, formats),
+              files['prec'] + code['met'], written('prec'), lambda: read_frame(outputs['prec'])),
+        Stage('temp', [], lambda: met.convert_data(outputs['temp'], 'temp', mapper, formats),
+              files['temp'] + code['met'], written('temp'), lambda: read_frame(outputs['temp'])),
+        Stage('discharge', [], convert_discharge,
+              files['discharge'] + code['hyd'], written('discharge'),
+              lambda: read_frame(outputs['discharge'])),
+        Stage('validate', ['discharge'], check,
+              [validate.__file__], [OUTDIR + 'validation.csv'], None),
+        Stage('aggregate', ['prec', 'temp', 'discharge'], aggregate,
+              [cube.__file__], [cube.cube_path(variable) + binary for variable in outputs],
+              lambda: {variable: cube.read(variable) for variable in outputs}),
+        Stage('figures', ['prec', 'temp', 'discharge', 'aggregate'], plot_figures,
+              [plot.__file__, INDIR + 'station_loc.txt'],
+              [FIGDIR + job.name + '.png' for job in plot.jobs], None),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert, validate, aggregate and plot in one run, skipping up to date stages.')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of processes loading data files, default one per cpu')
+    parser.add_argument('-f', '--force', action='store_true', help='run all stages')
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        stages = default_stages(ingest.wrap(partial(executor.map, chunksize=4)))
+        records = run(stages, force=args.force)
+    for name, record in records.items():
+        print('{:<15}{:>10}{:>10.2f} s'.format(name, record['status'], record['seconds']))
@@ -1,10 +1,18 @@
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import matplotlib as mpl
 import seaborn as sns
 from common import *
-import statsmodels.formula.api as smf
+import stations
+import query
+import cube
+import station_coverage
+import regression
+import timeseries
+import figures
+from figures import Job
 
 # Plot settings
 # mpl.rc('savefig', dpi=300)
@@ -20,10 +28,10 @@ mpl.rc('axes', labelsize=20)
 def monthly_temperature(df):
     """
     Returns dataframe with monthly averaged temperatures, and with a new column
-    showing the height of stations.
+    showing the height of stations. df is daily data or its cube.
     """
 
-    monthly = df.groupby(df.index.month).mean()
+    monthly = cube.climatology(df)
     monthly.index = monthly.index.map(str)
     monthly = monthly.transpose()
     height = []
@@ -40,10 +48,10 @@ def monthly_temperature(df):
 def monthly_precipitation(df):
     """
     Returns new dataframe containing total monthly precipitation, and a new
-    column showing station height.
+    column showing station height. df is daily data or its cube.
     """
     name_height = map_name_height()
-    monthly = df.groupby(df.index.month).mean()
+    monthly = cube.climatology(df)
 
     monthly.index = monthly.index.map(str)
     monthly = monthly.transpose()
@@ -54,79 +62,79 @@ def monthly_precipitation(df):
     return monthly
 
 
-def load_data():
-    prec = pd.read_csv(precipitation, index_col='date')
-    prec.index = pd.to_datetime(prec.index)
-
-    temp = pd.read_csv(temperature, index_col='date')
-    temp.index = pd.to_datetime(temp.index)
+def load_data(stations=None, start=None, end=None, compact=False):
+    """
+    Load precipitation, temperature and discharge with station names as
+    columns. Optionally only some stations (ids or names), a time range
+    and float32 values in half the memory (compact), see query.load.
+    """
+    p = query.load('prec', stations, start, end, compact)
+    t = query.load('temp', stations, start, end, compact)
+    q = query.load('discharge', stations, start, end, compact)
+    return p, t, q
 
-    dis = pd.read_csv(discharge, index_col='date')
-    dis.index = pd.to_datetime(dis.index)
 
-    p, t, q = number_to_name(prec, temp, dis)
-    return p, t, q
+def load_cubes():
+    """
+    Load the monthly aggregates of precipitation, temperature and discharge
+    made by convert.py, see cube.py. None for data converted without them.
+    """
+    return cube.load('prec'), cube.load('temp'), cube.load('discharge')
 
 
 def map_name_height():
-    name_height = {}
-    with open('../project_data/station_loc.txt') as file:
-        for line in file.readlines()[1:-1]:
-            line = line.split()
-            station = line[2]
-            elevation = line[-1]
-            name_height[station] = float(elevation)
-    return name_height
+    """
+    Returns dict mapping name of meteorological stations to altitude.
+    """
+    return {s.name: s.altitude for s in stations.registry().values()
+            if s.kind == 'met'}
 
 
 def number_to_name(p,t,q):
     """
     Changes station numbers to names in dataframes.
     """
-
     # Precipitation
-    df = pd.read_csv(DATADIR + 'met_stations.csv')
-    number_name = {}
-    for i in df.index:
-        number_name[df.loc[i,'id']] = df.loc[i,'Name']
-
-    new_columns = []
-    for column in p.columns:
-        new_columns.append(number_name[float(column)])
-    p.columns = new_columns
+    p.columns = [stations.get('met', column).name for column in p.columns]
 
     # Temperature
     new_columns = []
     for column in t.columns:
-        station = column.split('_')[0]
-        prefix = column.split('_')[1]
-        newcol = number_name[float(station)] + '_' +prefix
-        new_columns.append(newcol)
+        station, prefix = column.split('_')
+        new_columns.append(stations.get('met', station).name + '_' + prefix)
     t.columns = new_columns
 
     # Discharge
-    df = pd.read_csv(DATADIR + 'hyd_stations.csv')
-    for i in df.index:
-        number_name[df.loc[i,'id']] = df.loc[i,'Name']
-    new_columns = []
-    for column in q.columns:
-        new_columns.append(number_name[float(column)])
-    q.columns = new_columns
+    q.columns = [stations.get('hyd', column).name for column in q.columns]
     return p,t,q
 
 
-def plot_timeseries(df,freq,filename):
-    df.resample(freq).mean().plot(subplots=True)
+def plot_timeseries(df, freq, filename, points=2000, window=None):
+    """
+    Plot each station as a subplot, averaged over periods of freq. Series
+    are downsampled to at most points points, keeping the extremes, see
+    timeseries.minmax.
+
+    window - optional number of periods of a rolling mean
+    """
+    df = timeseries.resample_mean(df, freq)
+    if window:
+        df = timeseries.rolling(df, window, min_periods=1)
+    timeseries.minmax(df, points).plot(subplots=True)
     plt.savefig(FIGDIR + filename)
 
 
-def plot_coverage(df, filename):
+def plot_coverage(df, filename, stations_per_page=60):
     """
-    Visualize missing values in dataframe.
+    Visualize missing values in dataframe (daily data or its cube). With
+    more than stations_per_page stations the heatmap is split in pages,
+    see station_coverage.plot_pages.
     """
-    missing = -df.isna()*100
-    missing = missing.groupby(df.index.year).mean()
+    missing = cube.yearly_table(df, 'coverage')*100
     missing.index.name = 'Year'
+    if len(missing.columns) > stations_per_page:
+        station_coverage.plot_pages(missing, filename, stations_per_page)
+        return
     plt.clf()
     plt.figure(figsize = (15,18))
     ax = sns.heatmap(missing, cmap='Blues')
@@ -139,21 +147,15 @@ def plot_coverage(df, filename):
 
 
 def lapserate(df, drop=None, indep='height'):
+    """
+    Lapse rate for each month with confidence interval half width, see
+    regression.lapserate.
+    """
     dfd = df
     if drop:
         for col in drop:
             dfd = dfd.drop(col)
-    df = pd.DataFrame(columns=['Lapse rate','error'])
-    for i in range(1,13):
-        formula = 'Q("{}") ~ {}'.format(i, indep)
-        fit = smf.ols(formula, dfd).fit()
-        coeff = fit.params[-1]*1000
-        CI = fit.conf_int()
-        upper = CI.iloc[1,1]*1000
-        error = np.abs(upper - coeff)
-        df.loc[i, 'Lapse rate'] = coeff
-        df.loc[i, 'error'] = error
-    return df
+    return regression.lapserate(dfd, indep)
 
 
 def plot_lapserate(df, filename, ylabel, drop=None, indep='height'):
@@ -166,90 +168,123 @@ def plot_lapserate(df, filename, ylabel, drop=None, indep='height'):
     plt.clf()
 
 
-if __name__ == '__main__':
+def plot_lapserate_temperature(t, filename, ylabel, which):
+    """
+    Plot lapse rate of monthly minimum (which='min') or maximum
+    temperature.
+    """
+    tmin, tmax = monthly_temperature(t)
+    plot_lapserate({'min': tmin, 'max': tmax}[which], filename, ylabel)
 
-    p, t, q = load_data()
 
-    # Lapse rates
-    tmin, tmax = monthly_temperature(t)
-    plot_lapserate(tmin, 'lapserate_tmin', 'Deegres C / km')
-    plot_lapserate(tmax, 'lapserate_tmax', 'Deegres C / km')
+def plot_lapserate_precipitation(p, filename, ylabel, drop=None):
+    plot_lapserate(monthly_precipitation(p), filename, ylabel, drop=drop)
 
-    pm = monthly_precipitation(p)
-    plot_lapserate(pm, 'lapserate_precipitation', '(mm/day)/km',drop=['Dhunche','Lete'])
 
-    # Plot monthly variations
-    # Precipitation
-    pm = p[p > 0]
-    monthly = pm.groupby(pm.index.month).mean()
+def plot_monthly_daily(df, filename, ylabel, ylim=None):
+    """
+    Plot mean of positive daily values for each month.
+    """
+    monthly = cube.climatology(df, 'posmean')
     monthly.plot(marker='o')
     plt.grid()
     plt.xlabel('Month')
-    plt.ylabel('Precipitation [mm/d]')
-    plt.ylim([0,50])
-    plt.savefig(FIGDIR + 'daily_precipitation_monthly.png')
+    plt.ylabel(ylabel)
+    if ylim:
+        plt.ylim(ylim)
+    plt.savefig(FIGDIR + filename)
     plt.clf()
-    qm = q[q > 0]
 
-    # Discharge
-    monthly = qm.groupby(qm.index.month).mean()
-    monthly.plot(marker='o')
-    plt.grid()
-    plt.xlabel('Month')
-    plt.ylabel('Discharge [m^3/s]')
-    plt.savefig(FIGDIR + 'daily_discharge_monthly.png')
-    plt.clf()
 
-    # Temperature
+def plot_monthly_temperature(t, filename, which, ylim, yerr=False):
+    """
+    Plot monthly average of minimum (which='min') or maximum temperature.
+    """
     tmin, tmax = monthly_temperature(t)
-    tmin = tmin.transpose()
-    tmin = tmin.drop('height')
-    tmin.plot(marker='o')
-    plt.ylim([-3,30])
+    df = {'min': tmin, 'max': tmax}[which].transpose()
+    df = df.drop('height')
+    df.plot(marker='o', yerr=df.std() if yerr else None)
+    plt.ylim(ylim)
     plt.xlabel('Month')
     plt.ylabel('Temperature [Deegres C]')
     plt.grid()
-
-    plt.savefig(FIGDIR + 'monthly_average_min_temperature.png')
+    plt.savefig(FIGDIR + filename)
     plt.clf()
 
-    tmax = tmax.transpose()
-    tmax = tmax.drop('height')
-    tmax.plot(marker='o', yerr=tmax.std())
-    plt.ylim([0,50])
-    plt.grid()
-    plt.xlabel('Month')
-    plt.ylabel('Temperature [Deegres C]')
-    plt.savefig(FIGDIR + 'monthly_average_max_temperature.png')
 
-    # Visualize where we are missing data
-    plot_coverage(p,'coverage_precipitation.png')
-    plot_coverage(t,'coverage_temperature.png')
-    plot_coverage(q,'coverage_discharge.png')
-
-    # Plot timeseries
-    plot_timeseries(t, 'D', 'temperature.png')
-    plot_timeseries(p, 'D', 'precipitation.png')
-    plot_timeseries(q, 'D', 'discharge.png')
-
-    # Plot yearly precipitation
-    p_yearly = p.groupby(p.index.year).sum()
-    p_yearly = p_yearly[p_yearly > 5]
+def plot_yearly(df, filename, title, threshold):
+    """
+    Bar plot of mean and max yearly sums, for years with sum above threshold.
+    """
+    yearly = cube.yearly_table(df, 'sum')
+    yearly = yearly[yearly > threshold]
     summary = pd.DataFrame()
-    summary['mean'] = p_yearly.mean()
-    summary['max'] = p_yearly.max()
+    summary['mean'] = yearly.mean()
+    summary['max'] = yearly.max()
     ax = summary.plot(kind='bar', rot=0)
     ax.yaxis.grid(linestyle='--')
-    ax.set_title('Yearly precipitation')
-    plt.savefig(FIGDIR + 'yearly_precipitation.png')
+    ax.set_title(title)
+    plt.savefig(FIGDIR + filename)
 
-    # Plot yearly discharge
-    q_yearly = q.groupby(q.index.year).sum()
-    q_yearly = q_yearly[q_yearly > 0]
-    summary = pd.DataFrame()
-    summary['mean'] = q_yearly.mean()
-    summary['max'] = q_yearly.max()
-    ax = summary.plot(kind='bar', rot=0)
-    ax.yaxis.grid(linestyle='--')
-    ax.set_title('Yearly discharge')
-    plt.savefig(FIGDIR + 'yearly_discharge.png')
+
+# All figures made by this script. Inputs are p (precipitation),
+# t (temperature) and q (discharge) from load_data, and their monthly
+# aggregates pc, tc and qc from load_cubes.
+jobs = [
+    # Lapse rates
+    Job('lapserate_tmin', ['tc'], plot_lapserate_temperature,
+        ('lapserate_tmin.png', 'Deegres C / km', 'min')),
+    Job('lapserate_tmax', ['tc'], plot_lapserate_temperature,
+        ('lapserate_tmax.png', 'Deegres C / km', 'max')),
+    Job('lapserate_precipitation', ['pc'], plot_lapserate_precipitation,
+        ('lapserate_precipitation.png', '(mm/day)/km', ['Dhunche','Lete'])),
+
+    # Monthly variations
+    Job('daily_precipitation_monthly', ['pc'], plot_monthly_daily,
+        ('daily_precipitation_monthly.png', 'Precipitation [mm/d]', [0,50])),
+    Job('daily_discharge_monthly', ['qc'], plot_monthly_daily,
+        ('daily_discharge_monthly.png', 'Discharge [m^3/s]')),
+    Job('monthly_average_min_temperature', ['tc'], plot_monthly_temperature,
+        ('monthly_average_min_temperature.png', 'min', [-3,30])),
+    Job('monthly_average_max_temperature', ['tc'], plot_monthly_temperature,
+        ('monthly_average_max_temperature.png', 'max', [0,50], True)),
+
+    # Visualize where we are missing data
+    Job('coverage_precipitation', ['pc'], plot_coverage, ('coverage_precipitation.png',)),
+    Job('coverage_temperature', ['tc'], plot_coverage, ('coverage_temperature.png',)),
+    Job('coverage_discharge', ['qc'], plot_coverage, ('coverage_discharge.png',)),
+
+    # Timeseries
+    Job('temperature', ['t'], plot_timeseries, ('D', 'temperature.png')),
+    Job('precipitation', ['p'], plot_timeseries, ('D', 'precipitation.png')),
+    Job('discharge', ['q'], plot_timeseries, ('D', 'discharge.png')),
+
+    # Yearly sums
+    Job('yearly_precipitation', ['pc'], plot_yearly,
+        ('yearly_precipitation.png', 'Yearly precipitation', 5)),
+    Job('yearly_discharge', ['qc'], plot_yearly,
+        ('yearly_discharge.png', 'Yearly discharge', 0)),
+]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plot converted station data.')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of processes, default one per cpu')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='render all figures, also those that are up to date')
+    args = parser.parse_args()
+
+    # float64 like pipeline.py, so the frame hashes of figures.run match and
+    # figures rendered by one are not rendered again by the other
+    p, t, q = load_data()
+    pc, tc, qc = load_cubes()
+    data = {'p': p, 't': t, 'q': q, 'pc': pc, 'tc': tc, 'qc': qc}
+    # Aggregate from the daily data if there are no cubes
+    for name in ['p', 't', 'q']:
+        if data[name + 'c'] is None:
+            data[name + 'c'] = data[name]
+    timings = figures.run(jobs, data, args.workers, args.force)
+    for name, seconds in timings.items():
+        print('{:<35}{:>8.2f} s'.format(name, seconds))
+    print('Rendered {} of {} figures'.format(len(timings), len(jobs)))
@@ -1,14 +1,16 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
-import shapefile
-import utm
 import os
 import numpy as np
 import cartopy.crs as ccrs
 import cartopy.feature as cf
-import cartopy.io.img_tiles as tile
 import matplotlib as mpl
 from common import *
+import basemap
+import basin
+import stations
+import tiles
 
 # Figure settings
 # mpl.rc('savefig', dpi=300)
@@ -31,65 +33,44 @@ def read_stations(filename):
 
 def read_shapefile():
     # Plot shapefile
-    shpFilePath = '../project_data/Narayani_catchment/watershed.shp '
-    listx=[]
-    listy=[]
-    sf = shapefile.Reader(shpFilePath)
-    for sr in sf.shapeRecords():
-        for xNew,yNew in sr.shape.points:
-            listx.append(xNew)
-            listy.append(yNew)
-    plt.plot(listx,listy)
+    x, y, starts = basin.read_points()
+    plt.plot(x, y)
 
 
 def location_discharge():
-    stations = []
-    for root, dirs, files in os.walk(DISDIR):
-        stations = dirs
-        break
+    return stations.frame('hyd')[['Name','Latitude','Longitude']]
 
-    df = pd.DataFrame(columns = ['Name','Latitude','Longitude'])
-    df.index.name = 'id'
-    for station in stations:
-        path = DISDIR + station + '/Daily Discharge/'
-        # Take one random file for each station
-        filepath = path + os.listdir(path)[0]
-
-        with open(filepath) as file:
-            lines = (file.readlines()[0:3])
-            id = int(lines[0].split()[-1])
-            name = lines[1].split()[1]
-            latline = lines[1].split()[-3:]
-            lonline = lines[2].split()[-3:]
-            lat = float(latline[0]) + float(latline[1])/60. + float(latline[2])/3600
-            lon = float(lonline[0]) + float(lonline[1])/60. + float(lonline[2])/3600
-            df.loc[id,'Latitude'] = lat
-            df.loc[id,'Longitude'] = lon
-            df.loc[id,'Name'] = name
-    return df
+
+def add_background(ax, extent, zoom=8, offline=False):
+    """
+    Terrain background from map tiles, see tiles.LocalTiles. The cached
+    tiles are used if they cover the map, otherwise the missing tiles are
+    downloaded, which needs TILE_KEY. Offline, a hillshade of the elevation
+    model (see basemap.plot_relief) is used instead if there is one.
+    """
+    missing = basemap.missing_tiles(extent, zoom)
+    if not missing or not offline:
+        ax.add_image(tiles.LocalTiles(offline=not missing), zoom)
+    elif not basemap.plot_relief(ax, transform=ccrs.PlateCarree()):
+        print('No map tiles or elevation model, plotting without background')
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plot map of stations in the basin.')
+    parser.add_argument('-o', '--offline', action='store_true',
+                        help='do not download map tiles, use the tile cache or the elevation model')
+    args = parser.parse_args()
     FIGDIR = '../figures/'
 
-    df = read_stations('../project_data/station_loc.txt')
+    df = stations.frame('met')
     df2 = location_discharge()
-    latitude = []
-    longitude = []
-    shpFilePath = '../project_data/Narayani_catchment/watershed.shp '
-    sf = shapefile.Reader(shpFilePath)
-    for sr in sf.shapeRecords():
-        for x,y in sr.shape.points:
-            # print(x,y)
-            # Eastward shift of data
-            lat,lon = utm.to_latlon(x+3650,y,45,'R')
-            latitude.append(lat)
-            longitude.append(lon)
+    # Projected basin outline, cached in OUTDIR
+    longitude, latitude = basin.outline()
+    extent = [82.8,86,27.2,29.5]
     ax = plt.axes(projection=ccrs.PlateCarree())
-    terrain = tile.Stamen('terrain-background')
-    ax.add_image(terrain, 8)
+    add_background(ax, extent, 8, args.offline)
     ax.plot(longitude, latitude,transform=ccrs.PlateCarree())
-    ax.set_extent([82.8,86,27.2,29.5])
+    ax.set_extent(extent)
 
     # Maybe change to one of the qualitative colormaps. Paired?
     colors = ['red','yellow','blue','orange','purple']
@@ -113,7 +94,9 @@ if __name__ == '__main__':
     gl.xformatter = LONGITUDE_FORMATTER
     gl.yformatter = LATITUDE_FORMATTER
 
-    ax.coastlines()
+    # Natural Earth coastlines are downloaded on first use
+    if not args.offline:
+        ax.coastlines()
     plt.legend(loc='upper right')
 
 
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import os
+from common import *
+import stations
+from compact import from_frame, to_frame
+from store import ColumnStore, newest_format, output_times, read_frame, read_only
+
+# Load parts of the converted data by variable, station and time range.
+# Results are kept in an in-memory LRU cache of bounded size, keyed by the
+# mtimes of the converted files so new conversions are picked up.
+
+files = {'prec': precipitation, 'temp': temperature, 'discharge': discharge}
+kinds = {'prec': 'met', 'temp': 'met', 'discharge': 'hyd'}
+
+
+class LRUCache:
+    """
+    Least recently used cache of dataframes, limited by total size in bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, df):
+        size = df.memory_usage(index=True, deep=True).sum()
+        if size > self.max_bytes:
+            return
+        if key in self.items:
+            self.nbytes -= self.items[key].memory_usage(index=True, deep=True).sum()
+        self.items[key] = df
+        self.items.move_to_end(key)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            key, old = self.items.popitem(last=False)
+            self.nbytes -= old.memory_usage(index=True, deep=True).sum()
+
+    def clear(self):
+        self.items.clear()
+        self.nbytes = 0
+
+
+cache = LRUCache(CACHE_BYTES)
+
+
+def station_id(variable, station):
+    """
+    Station id from id or name. Temperature names and ids may have a
+    _max or _min suffix, which is kept.
+    """
+    station = str(station)
+    name, _, suffix = station.partition('_')
+    try:
+        id = str(int(float(name)))
+    except ValueError:
+        id = str(stations.by_name(name).id)
+    return id + '_' + suffix if suffix else id
+
+
+def column_name(variable, column):
+    """
+    Station name for a column label of the converted data.
+    """
+    id, _, suffix = column.partition('_')
+    name = stations.get(kinds[variable], id).name
+    return name + '_' + suffix if suffix else name
+
+
+def version(variable):
+    """
+    Mtimes of the converted files of variable, part of the cache keys.
+    """
+    base = os.path.splitext(files[variable])[0]
+    return tuple(sorted(output_times(base).items()))
+
+
+def read(variable, columns, start, end, compact=False):
+    """
+    Read columns of variable in time range from the column store if it is
+    the newest output, otherwise from the full table.
+
+    compact - float32 values from the compact form, see to_compact. The
+    full table is cached in this form as well.
+
+    With columns None the full table is returned as a view of the cached
+    (or memory-mapped) frame, and must not be modified. A subset of the
+    columns is a copy.
+    """
+    base = os.path.splitext(files[variable])[0]
+    store = ColumnStore(base + '.store', create=False)
+    if newest_format(base) == 'store':
+        if columns is None:
+            columns = store.columns()
+        df = store.read(columns, start, end)
+        return to_compact(df, variable) if compact else df
+    key = ('full', variable, version(variable), compact)
+    df = cache.get(key)
+    if df is None:
+        df = read_frame(files[variable])
+        # A memory-mapped frame is already sorted and is not copied
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        if compact:
+            df = to_compact(df, variable)
+        cache.put(key, df)
+    # Partial dates like end='1999' include the whole period. The time
+    # range is selected first, so only the values in it are copied.
+    df = df.loc[start:end]
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def to_compact(df, variable):
+    """
+    Frame of the compact form of df (see compact.py), float32 values in
+    about half the memory of the float64 frame.
+    """
+    return to_frame(from_frame(df, variable))
+
+
+def load(variable, stations=None, start=None, end=None, compact=False):
+    """
+    Load converted data of one variable (prec, temp or discharge) with
+    station names as columns, like plot.load_data.
+
+    stations - list of station ids or names, None for all stations. For
+    temperature, both the _max and _min columns are loaded unless the
+    suffix is given.
+    start, end - time range (inclusive), None for no limit
+    compact - float32 values from the compact form of the data, see
+    compact.py, in about half the memory. Values are rounded to float32.
+
+    Frames backed by a memory-mapped array (see store.read_mmap) are
+    read-only and share memory with the file, others are copies.
+    """
+    columns = None
+    if stations is not None:
+        ids = [station_id(variable, station) for station in stations]
+        available = read_columns(variable)
+        columns = tuple(column for column in available
+                        if column in ids or column.partition('_')[0] in ids)
+    key = (variable, columns, start, end, version(variable), compact)
+    df = cache.get(key)
+    if df is None:
+        df = read(variable, columns, start, end, compact)
+        df.columns = [column_name(variable, column) for column in df.columns]
+        cache.put(key, df)
+    return df.copy(deep=not read_only(df))
+
+
+def read_columns(variable):
+    """
+    Returns column labels of the converted data of variable.
+    """
+    base = os.path.splitext(files[variable])[0]
+    store = ColumnStore(base + '.store', create=False)
+    if newest_format(base) == 'store':
+        return store.columns()
+    return list(read(variable, None, None, None).columns)
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+months = [str(i) for i in range(1,13)]
+
+
+def linear_fit(x, y, mask=None, alpha=0.05):
+    """
+    Least squares fit of y = a + b*x for many problems at once.
+
+    x, y - arrays broadcastable to the same shape, observations along the
+    last axis and independent problems along the leading axes
+    mask - boolean array of observations to use, broadcast against x and
+    y. Observations where x or y is NaN are always left out (like
+    statsmodels' missing='drop')
+    alpha - significance level of the confidence interval
+
+    Returns slope b and half width of its confidence interval, both with
+    the shape of the leading axes. Gives the same result as fitting each
+    problem with statsmodels OLS.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    if mask is not None:
+        valid = valid & mask
+    w = valid.astype(float)
+    x = np.where(valid, x, 0)
+    y = np.where(valid, y, 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = w.sum(-1)
+        dx = (x - ((w*x).sum(-1)/n)[..., np.newaxis]) * w
+        dy = (y - ((w*y).sum(-1)/n)[..., np.newaxis]) * w
+        sxx = (dx*dx).sum(-1)
+        slope = (dx*dy).sum(-1) / sxx
+        residual = dy - slope[..., np.newaxis]*dx
+        dof = n - 2
+        se = np.sqrt((residual*residual).sum(-1) / dof / sxx)
+        error = se * stats.t.ppf(1 - alpha/2, dof)
+    return slope, error
+
+
+def monthly_arrays(df, indep='height'):
+    """
+    Returns independent variable (stations) and monthly values
+    (12 x stations) from a frame with one row for each station.
+    """
+    return df[indep].values.astype(float), df[months].values.astype(float).T
+
+
+def lapserate(df, indep='height', alpha=0.05):
+    """
+    Lapse rate (per km) for each month with confidence interval half width.
+    """
+    x, y = monthly_arrays(df, indep)
+    slope, error = linear_fit(x, y, alpha=alpha)
+    result = pd.DataFrame({'Lapse rate': slope*1000, 'error': error*1000},
+                          index=range(1,13))
+    return result
+
+
+def lapserate_subsets(df, masks, indep='height', alpha=0.05):
+    """
+    Lapse rates for many subsets of stations in one call.
+
+    masks - boolean array (subsets x stations), True for stations to use
+
+    Returns lapse rates and errors as arrays (subsets x 12).
+    """
+    x, y = monthly_arrays(df, indep)
+    masks = np.asarray(masks, dtype=bool)[:, np.newaxis, :]
+    slope, error = linear_fit(x, y, masks, alpha=alpha)
+    return slope*1000, error*1000
+
+
+def lapserate_loo(df, indep='height', alpha=0.05):
+    """
+    Leave-one-station-out lapse rates. Returns lapse rate and error with
+    one row for each left out station and one column for each month.
+    """
+    masks = ~np.eye(len(df), dtype=bool)
+    slope, error = lapserate_subsets(df, masks, indep, alpha)
+    rate = pd.DataFrame(slope, index=df.index, columns=range(1,13))
+    error = pd.DataFrame(error, index=df.index, columns=range(1,13))
+    return rate, error
+
+
+def lapserate_bootstrap(df, samples=1000, indep='height', alpha=0.05, seed=None):
+    """
+    Lapse rates with bootstrap confidence intervals, from resampling
+    stations with replacement. All samples are fitted in one call.
+    """
+    rng = np.random.RandomState(seed)
+    x, y = monthly_arrays(df, indep)
+    index = rng.randint(0, len(x), size=(samples, len(x)))
+    slope, error = linear_fit(x[index][:, np.newaxis, :],
+                              y[:, index].transpose(1, 0, 2))
+    slope = slope*1000
+    lower, upper = np.nanpercentile(slope, [100*alpha/2, 100*(1 - alpha/2)], axis=0)
+    rate = lapserate(df, indep)['Lapse rate']
+    result = pd.DataFrame({'Lapse rate': rate, 'lower': lower, 'upper': upper},
+                          index=range(1,13))
+    return result
@@ -1,7 +1,6 @@
 #!/bin/bash -x
 pytest
-python convert.py
-python plot.py
+python pipeline.py
 python plot_stations.py
 cd ../latex
 make -B
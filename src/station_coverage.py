@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from common import *
+
+# Fraction of days with data for each station and year (or month),
+# counted from bit-packed masks of valid values. Stations are handled in
+# blocks, so memory use is bounded by the block size and the result.
+
+# Number of set bits in each byte value
+popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+# Stations counted at a time
+block = 64
+
+
+def periods(index, freq='year'):
+    """
+    Returns labels and row boundaries of the years (freq='year') or months
+    (freq='month') of a sorted DatetimeIndex. Rows edges[i]:edges[i+1]
+    belong to labels[i].
+    """
+    if freq == 'year':
+        keys = index.year.values.astype(np.int64)
+    elif freq == 'month':
+        keys = index.year.values.astype(np.int64)*12 + index.month.values - 1
+    else:
+        raise ValueError('Unknown frequency: {}'.format(freq))
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    edges = np.r_[starts, len(keys)]
+    if freq == 'year':
+        labels = pd.Index(keys[starts], name='Year')
+    else:
+        labels = pd.PeriodIndex(index[starts], freq='M', name='Month')
+    return labels, edges
+
+
+def count_bits(packed, positions):
+    """
+    Number of set bits before each position (in bits) along the first
+    axis of packed, for all columns.
+    """
+    prefix = np.zeros((len(packed) + 1, packed.shape[1]), dtype=np.int64)
+    np.cumsum(popcount[packed], axis=0, out=prefix[1:])
+    full, rem = np.divmod(positions, 8)
+    # First rem bits of the byte at full, np.packbits puts the first day
+    # in the highest bit
+    head = ((0xFF00 >> rem) & 0xFF).astype(np.uint8)
+    byte = packed[np.minimum(full, len(packed) - 1)] & head[:, np.newaxis]
+    return prefix[full] + popcount[byte]
+
+
+def counts(df, edges):
+    """
+    Number of non-NaN values in rows edges[i]:edges[i+1] for each column
+    of df. Returns array (periods x columns).
+    """
+    result = np.empty((len(edges) - 1, len(df.columns)), dtype=np.int64)
+    for start in range(0, len(df.columns), block):
+        values = df.iloc[:, start:start + block].to_numpy()
+        packed = np.packbits(~np.isnan(values), axis=0)
+        bits = count_bits(packed, edges)
+        result[:, start:start + block] = bits[1:] - bits[:-1]
+    return result
+
+
+def fractions(df, freq='year'):
+    """
+    Fraction of days with data for each year or month (rows) and station
+    (columns). Gives the same result as
+    df.notna().groupby(df.index.year).mean() for freq='year'.
+    """
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    labels, edges = periods(df.index, freq)
+    if len(df.index) == 0:
+        return pd.DataFrame(index=labels, columns=df.columns, dtype=float)
+    result = counts(df, edges) / np.diff(edges)[:, np.newaxis]
+    return pd.DataFrame(result, index=labels, columns=df.columns)
+
+
+def page_names(filename, pages):
+    """
+    File names of the pages of a figure: filename for the first page, and
+    the page number added for the rest (coverage.png, coverage_2.png, ...).
+    """
+    base, ext = os.path.splitext(filename)
+    return [filename] + ['{}_{}{}'.format(base, page + 1, ext) for page in range(1, pages)]
+
+
+def plot_pages(coverage, filename, stations_per_page=60):
+    """
+    Heatmap of coverage in percent (years x stations), split in pages of
+    stations_per_page stations so that labels stay readable for large
+    networks. The figure size follows the number of years and stations.
+
+    Returns the paths of the pages in FIGDIR.
+    """
+    columns = list(coverage.columns)
+    pages = max(1, -(-len(columns) // stations_per_page))
+    paths = []
+    for page, name in enumerate(page_names(filename, pages)):
+        part = coverage[columns[page*stations_per_page:(page + 1)*stations_per_page]]
+        width = 2 + 0.15*len(part.columns)
+        height = 1 + 0.15*len(part.index)
+        fig, ax = plt.subplots(figsize=(width, height))
+        image = ax.imshow(part.values, cmap='Blues', vmin=0, vmax=100,
+                          aspect='auto', interpolation='nearest')
+        ax.set_xticks(np.arange(len(part.columns)))
+        # Small labels, one row or column per label
+        ax.set_xticklabels(part.columns, rotation=90, fontsize=8)
+        ax.set_yticks(np.arange(len(part.index)))
+        ax.set_yticklabels(part.index, fontsize=8)
+        ax.set_ylabel(part.index.name, fontsize=10)
+        if pages > 1:
+            ax.set_title('Stations {}-{} of {}'.format(
+                page*stations_per_page + 1, page*stations_per_page + len(part.columns), len(columns)),
+                fontsize=10)
+        fig.colorbar(image, ax=ax).ax.tick_params(labelsize=8)
+        fig.savefig(FIGDIR + name, bbox_inches='tight')
+        plt.close(fig)
+        paths.append(FIGDIR + name)
+    return paths
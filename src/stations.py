@@ -0,0 +1,160 @@
+import json
+import os
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from common import *
+import ingest
+
+# Station information from station_loc.txt (met) and the headers of the
+# discharge files (hyd), cached in one registry.
+Station = namedtuple('Station', ['id', 'name', 'latitude', 'longitude', 'altitude', 'kind'])
+
+# Elevation found from dhm.gov.np/hydrological-station at
+# 24.10.19, 15:24
+hyd_altitude = {420:198, 445:485, 447:600, 450:180}
+
+station_loc = INDIR + 'station_loc.txt'
+cachefile = OUTDIR + 'stations.json'
+
+
+def read_met():
+    """
+    Read meteorological stations from station_loc.txt.
+
+    The lines are split on tabs, and lines without all six fields (the
+    empty last line) are skipped. plot.map_name_height used to split on
+    whitespace and drop the last line instead, which gives the same
+    stations unless a name contains a space.
+    """
+    stations = []
+    with open(station_loc) as file:
+        for line in file.readlines()[1:]:
+            line = line.split('\t')
+            if len(line) < 6:
+                continue
+            number, id, name, lat, lon, alt = [x.strip() for x in line[:6]]
+            stations.append(Station(int(id), name, float(lat), float(lon), float(alt), 'met'))
+    return stations
+
+
+def read_discharge_header(filepath):
+    """
+    Returns id, name, latitude and longitude from the header of a
+    discharge file. Coordinates are converted from sexagesimal to decimal
+    degrees.
+    """
+    lines = ingest.lines(filepath)[:3]
+    id = int(lines[0].split()[-1])
+    name = lines[1].split()[1]
+    latline = lines[1].split()[-3:]
+    lonline = lines[2].split()[-3:]
+    lat = float(latline[0]) + float(latline[1])/60. + float(latline[2])/3600
+    lon = float(lonline[0]) + float(lonline[1])/60. + float(lonline[2])/3600
+    return id, name, lat, lon
+
+
+def header_files():
+    """
+    Returns paths of the discharge files the station headers are read
+    from, one for each station folder in DISDIR.
+    """
+    files = []
+    for root, dirs, _ in os.walk(DISDIR):
+        for station in dirs:
+            path = DISDIR + station + '/Daily Discharge/'
+            # Take one random file for each station
+            files.append(path + os.listdir(path)[0])
+        break
+    return files
+
+
+def read_hyd():
+    """
+    Read hydrological stations from the first discharge file of each
+    station folder in DISDIR.
+    """
+    stations = []
+    for filepath in header_files():
+        id, name, lat, lon = read_discharge_header(filepath)
+        alt = float(hyd_altitude.get(id, np.nan))
+        stations.append(Station(id, name, lat, lon, alt, 'hyd'))
+    return stations
+
+
+def source_key():
+    """
+    Modification times of the files the registry is read from:
+    station_loc.txt and the discharge file of each station whose header
+    is read. Adding or removing a station, or a header file being edited
+    or replaced, changes the key.
+    """
+    key = {}
+    paths = [station_loc] if os.path.exists(station_loc) else []
+    if os.path.exists(DISDIR):
+        paths += header_files()
+    for path in paths:
+        key[path] = os.path.getmtime(path)
+    return key
+
+
+@lru_cache(maxsize=None)
+def registry():
+    """
+    Returns dict mapping (kind, id) to Station for all stations.
+
+    The registry is cached in memory and in OUTDIR/stations.json. The file
+    cache is used as long as the mtimes of the source files match, or if the
+    source files are not available.
+    """
+    key = source_key()
+    if os.path.exists(cachefile):
+        with open(cachefile) as file:
+            cache = json.load(file)
+        if cache['key'] == key or not key:
+            return {(s[5], s[0]): Station(*s) for s in cache['stations']}
+
+    stations = []
+    if os.path.exists(station_loc):
+        stations += read_met()
+    if os.path.exists(DISDIR):
+        stations += read_hyd()
+    if os.path.isdir(OUTDIR):
+        with open(cachefile, 'w') as file:
+            json.dump({'key': key, 'stations': stations}, file, indent=1)
+    return {(s.kind, s.id): s for s in stations}
+
+
+@lru_cache(maxsize=None)
+def names():
+    """
+    Returns dict mapping station name to Station.
+    """
+    return {s.name: s for s in registry().values()}
+
+
+def get(kind, id):
+    """
+    Look up station by kind ('met' or 'hyd') and id. The id may be a
+    string or number, e.g. a column label of the converted data.
+    """
+    return registry()[(kind, int(float(id)))]
+
+
+def by_name(name):
+    return names()[name]
+
+
+def frame(kind):
+    """
+    Returns stations of one kind as dataframe with the same columns as the
+    converted station files.
+    """
+    stations = [s for s in registry().values() if s.kind == kind]
+    df = pd.DataFrame({'Name': [s.name for s in stations],
+                       'Latitude': [s.latitude for s in stations],
+                       'Longitude': [s.longitude for s in stations],
+                       'Altitude': [s.altitude for s in stations]},
+                      index=pd.Index([s.id for s in stations], name='id'))
+    return df
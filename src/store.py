@@ -0,0 +1,286 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from common import *
+
+
+def has_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        return False
+    return True
+
+
+def binary_format():
+    """
+    Returns the binary format used for converted data. Feather is used if
+    pyarrow is installed, otherwise pandas' own pickle format. Both keep
+    the column dtypes and the datetime index.
+    """
+    if has_pyarrow():
+        return 'feather'
+    return 'pickle'
+
+
+def write_frame(df, filepath, formats=FORMATS, dtype=None):
+    """
+    Store dataframe with datetime index in the given formats.
+
+    filepath - path of output file, the extension is replaced for each format
+    formats - list of 'csv', 'binary', 'store' (see ColumnStore) and 'mmap'
+    (see write_mmap)
+    dtype - optional float dtype (e.g. float32) of the binary output
+    """
+    base = os.path.splitext(filepath)[0]
+    # read_frame uses the newest output, so the order gives mmap before
+    # binary before the store
+    order = ['csv', 'store', 'binary', 'mmap']
+    for fmt in sorted(formats, key=lambda fmt: order.index(fmt) if fmt in order else -1):
+        if fmt == 'csv':
+            df.to_csv(base + '.csv')
+        elif fmt == 'store':
+            store = ColumnStore(base + '.store')
+            store.clear()
+            store.append(df)
+        elif fmt == 'binary':
+            write_binary(df if dtype is None else df.astype(dtype), base)
+        elif fmt == 'mmap':
+            write_mmap(df, base)
+        else:
+            raise ValueError('Unknown format: {}'.format(fmt))
+
+
+def read_frame(filepath):
+    """
+    Load dataframe stored with write_frame. The newest of the memory-mapped
+    array, the binary file, a ColumnStore written by a streaming conversion
+    and the csv file is used, so outputs left from an earlier conversion
+    with other formats are not loaded.
+    """
+    base = os.path.splitext(filepath)[0]
+    fmt = newest_format(base)
+    if fmt == 'mmap':
+        return read_mmap(base)
+    if fmt == 'binary':
+        return read_binary(base)
+    if fmt == 'store':
+        return ColumnStore(base + '.store', create=False).read()
+    df = pd.read_csv(base + '.csv', index_col='date')
+    df.index = pd.to_datetime(df.index)
+    return df
+
+
+def newest_format(base):
+    """
+    Returns the newest of the 'mmap', 'binary', 'store' and 'csv' outputs
+    for base (path without extension), 'csv' if there are none of them.
+    """
+    times = output_times(base)
+    # On equal mtimes, prefer the output written last by write_frame
+    fmt = max(['mmap', 'binary', 'store', 'csv'], key=lambda fmt: times[fmt])
+    if times[fmt] == 0:
+        return 'csv'
+    return fmt
+
+
+def output_times(base):
+    """
+    Returns dict mapping each output format to the mtime of its output for
+    base (path without extension), 0 for missing outputs.
+    """
+    return {'store': ColumnStore(base + '.store', create=False).mtime(),
+            'binary': mtime(binary_path(base)),
+            'mmap': mtime(mmap_path(base)),
+            'csv': mtime(base + '.csv')}
+
+
+def write_binary(df, base):
+    """
+    Store df in the binary format, base is the path without extension.
+    """
+    if binary_format() == 'feather':
+        df.reset_index().to_feather(base + '.feather')
+    else:
+        df.to_pickle(base + '.pkl')
+
+
+def binary_path(base):
+    """
+    Returns path of existing binary file for base, or None.
+    """
+    if has_pyarrow() and os.path.exists(base + '.feather'):
+        return base + '.feather'
+    if os.path.exists(base + '.pkl'):
+        return base + '.pkl'
+    return None
+
+
+def read_binary(base):
+    """
+    Load df stored with write_binary, returns None if it does not exist.
+    """
+    path = binary_path(base)
+    if path is None:
+        return None
+    if path.endswith('.feather'):
+        df = pd.read_feather(path)
+        return df.set_index(df.columns[0])
+    return pd.read_pickle(path)
+
+
+def write_mmap(df, base):
+    """
+    Store df as a float32 array (days x columns) in base.npy that can be
+    memory-mapped by read_mmap, with the dates in base_dates.npy and the
+    column labels in base_columns.json. Rows are sorted by date.
+    """
+    df = df.sort_index()
+    np.save(base + '_dates.npy', df.index.values.astype('datetime64[ns]'))
+    with open(base + '_columns.json', 'w') as file:
+        json.dump([str(column) for column in df.columns], file)
+    # Written last, its mtime is used by read_frame
+    np.save(base + '.npy', np.ascontiguousarray(df.values, dtype=np.float32))
+
+
+def mmap_path(base):
+    """
+    Returns path of the memory-mapped array for base if it exists, or None.
+    """
+    if os.path.exists(base + '.npy'):
+        return base + '.npy'
+    return None
+
+
+def read_mmap(base):
+    """
+    Load df stored with write_mmap without copying the values. The frame
+    is backed by a read-only memory map, so processes reading the same file
+    share one copy in the page cache. Returns None if it does not exist.
+    """
+    if mmap_path(base) is None:
+        return None
+    values = np.load(base + '.npy', mmap_mode='r')
+    dates = np.load(base + '_dates.npy')
+    with open(base + '_columns.json') as file:
+        columns = json.load(file)
+    return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name='date'),
+                        columns=columns, copy=False)
+
+
+def read_only(df):
+    """
+    Check if all columns of df are backed by read-only memory, like a
+    frame from read_mmap.
+    """
+    return all(not df[column].values.flags.writeable for column in df.columns)
+
+
+def mtime(path):
+    """
+    Modification time of path, 0 if it does not exist.
+    """
+    if path is None or not os.path.exists(path):
+        return 0
+    return os.path.getmtime(path)
+
+
+class ColumnStore:
+    """
+    Wide dataframe stored on disk as one folder per column, so that
+    stations can be added one at a time without keeping the others in
+    memory. Each column is split in chunks of ten years, so a time range
+    of a few columns can be read without reading the rest.
+
+    The columns and their chunks (first year of each) are kept in
+    columns.json.
+    """
+    years = 10
+
+    def __init__(self, path, create=True):
+        self.path = path
+        self.index = os.path.join(path, 'columns.json')
+        if create:
+            os.makedirs(path, exist_ok=True)
+
+    def chunks(self):
+        """
+        Returns dict mapping column to list of chunk start years.
+        """
+        if not os.path.exists(self.index):
+            return {}
+        with open(self.index) as file:
+            return json.load(file)
+
+    def columns(self):
+        return list(self.chunks())
+
+    def mtime(self):
+        """
+        Time of last append, 0 if the store is empty.
+        """
+        return mtime(self.index)
+
+    def append(self, df):
+        """
+        Add the columns of df to the store. Existing columns with the same
+        name are replaced.
+        """
+        chunks = self.chunks()
+        start = df.index.year // self.years * self.years
+        for column in df.columns:
+            self.remove(column, chunks)
+            os.makedirs(os.path.join(self.path, column))
+            chunks[column] = []
+            for year, part in df[[column]].groupby(start):
+                write_binary(part, os.path.join(self.path, column, str(year)))
+                chunks[column].append(int(year))
+        with open(self.index, 'w') as file:
+            json.dump(chunks, file)
+
+    def remove(self, column, chunks):
+        for year in chunks.get(column, []):
+            path = binary_path(os.path.join(self.path, column, str(year)))
+            if path is not None:
+                os.remove(path)
+        if os.path.isdir(os.path.join(self.path, column)):
+            os.rmdir(os.path.join(self.path, column))
+
+    def clear(self):
+        chunks = self.chunks()
+        for column in chunks:
+            self.remove(column, chunks)
+        if os.path.exists(self.index):
+            os.remove(self.index)
+
+    def read(self, columns=None, start=None, end=None):
+        """
+        Put together the wide dataframe from the stored columns, sorted by
+        date. Only chunks overlapping start - end are read. The end is
+        inclusive like df.loc, so end='1999' includes all of 1999.
+        """
+        chunks = self.chunks()
+        if columns is None:
+            columns = list(chunks)
+        # Years of start and end, which may be partial dates like '1999'
+        first = pd.Timestamp(start).year if start is not None else None
+        last = pd.Timestamp(end).year if end is not None else None
+        frames = []
+        for column in columns:
+            parts = []
+            for year in chunks[column]:
+                if first is not None and year + self.years <= first:
+                    continue
+                if last is not None and year > last:
+                    continue
+                parts.append(read_binary(os.path.join(self.path, column, str(year))))
+            if parts:
+                frames.append(pd.concat(parts))
+            else:
+                frames.append(pd.DataFrame(columns=[column], dtype=float,
+                                           index=pd.DatetimeIndex([], name='date')))
+        if not frames:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+        df = pd.concat(frames, axis=1).sort_index()
+        return df.loc[start:end]
@@ -0,0 +1,189 @@
+import calendar
+import os
+import numpy as np
+
+# Synthetic station data in the DHM file layouts read by hyd and met, for
+# tests and benchmarks. The real datasets can not be redistributed.
+
+months = ['Jan.', 'Feb.','Mar.','Apr.','May','Jun.','Jul.','Aug.','Sep.','Oct.','Nov.', 'Dec.']
+
+# plot.monthly_temperature and the lapse rate figures use these names
+met_names = ['Lete', 'Pohara', 'Dhunche', 'Lumle', 'Rampur']
+
+
+def seasonal(year, rng, low, high, noise):
+    """
+    Daily values for one year following the monsoon, highest in July.
+    """
+    days = np.arange(366 if calendar.isleap(year) else 365)
+    cycle = 0.5 - 0.5*np.cos(2*np.pi*(days - 15)/len(days))
+    return low + (high - low)*cycle**2 + noise*rng.randn(len(days))
+
+
+def sexagesimal(value):
+    degrees, seconds = divmod(int(round(value*3600)), 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return '{} {:02} {:02}'.format(degrees, minutes, seconds)
+
+
+def write_discharge(filepath, station, year, name=None, lat=27.75, lon=84.42, seed=0):
+    """
+    Write one year of daily discharge with monthly statistics, in the
+    layout read by hyd.load_df_manual and validate.parse_stats.
+    """
+    rng = np.random.RandomState(seed)
+    values = np.abs(seasonal(year, rng, 100, 1500, 50)).round(1)
+    values[rng.rand(len(values)) < 0.02] = np.nan
+    lines = ['Station No. : {}'.format(station),
+             'Location: {}  Latitude : {}'.format(name or 'Station{}'.format(station), sexagesimal(lat)),
+             'River: Narayani  Longitude : {}'.format(sexagesimal(lon)),
+             'Drainage area : 31100 sq. km',
+             'Year : {}'.format(year),
+             '', 'Daily discharge in m3/s', '', '',
+             'Day  ' + '  '.join(months)]
+    grid = np.full((31, 12), np.nan)
+    start = 0
+    for month in range(12):
+        length = calendar.monthrange(year, month + 1)[1]
+        grid[:length, month] = values[start:start + length]
+        start += length
+    for day in range(31):
+        entries = []
+        for month in range(12):
+            if day < calendar.monthrange(year, month + 1)[1]:
+                value = grid[day, month]
+                entries.append('NA' if np.isnan(value) else '{:.1f}'.format(value))
+        lines.append('{}  {}'.format(day + 1, '  '.join(entries)))
+    lines.append('')
+    with np.errstate(invalid='ignore'):
+        for label, stat in (('Min.', np.nanmin), ('Mean', np.nanmean), ('Max.', np.nanmax)):
+            stats = ['{:.1f}'.format(x) for x in stat(grid, axis=0)] + ['{:.1f}'.format(stat(values))]
+            lines.append('{}  {}'.format(label, '  '.join(stats)))
+    with open(filepath, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def met_entry(value, rng, trace=False):
+    """
+    Text entry of a met file value, with some DNA, -99.9 and T entries.
+    """
+    r = rng.rand()
+    if r < 0.02:
+        return 'DNA'
+    if r < 0.03:
+        return '-99.9'
+    if trace and 0 < value < 0.2:
+        return 'T'
+    return '{:.1f}'.format(value)
+
+
+def write_precipitation(filepath, year, altitude=1000, seed=0):
+    """
+    Write one year of daily precipitation, in the layout read by
+    met.load_precipitation.
+    """
+    rng = np.random.RandomState(seed)
+    chance = seasonal(year, rng, 0.1, 0.9, 0)
+    wet = rng.rand(len(chance)) < chance
+    amount = rng.gamma(0.8, 12 + altitude/200., len(wet))*wet
+    amount[wet & (rng.rand(len(wet)) < 0.1)] = 0.1
+    lines = ['{:>3} {:>8}'.format(day + 1, met_entry(value, rng, trace=True))
+             for day, value in enumerate(amount)]
+    lines.append('Total  {:.1f}'.format(amount.sum()))
+    with open(filepath, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def write_temperature(filepath, year, altitude=1000, seed=0):
+    """
+    Write one year of daily maximum and minimum temperature, in the layout
+    read by met.load_temperature.
+    """
+    rng = np.random.RandomState(seed)
+    offset = -6.0*altitude/1000.
+    tmax = seasonal(year, rng, 20, 33, 2) + offset
+    tmin = seasonal(year, rng, 5, 24, 2) + offset
+    lines = ['Daily temperature {}'.format(year), 'Day   Max   Min']
+    lines += ['{:>3} {:>8} {:>8}'.format(day + 1, met_entry(high, rng), met_entry(low, rng))
+              for day, (high, low) in enumerate(zip(tmax, tmin))]
+    lines.append('Mean  {:.1f}  {:.1f}'.format(tmax.mean(), tmin.mean()))
+    with open(filepath, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def write_watershed(filepath, points=2000, seed=0):
+    """
+    Write a polygon shapefile with a rough outline of the basin in UTM
+    zone 45R, in the layout read by basin.read_points.
+    """
+    import shapefile
+    import utm
+    rng = np.random.RandomState(seed)
+    angle = np.linspace(0, 2*np.pi, points, endpoint=False)
+    radius = 1 + 0.1*np.sin(5*angle) + 0.02*rng.randn(points)
+    lat = 28.3 + 0.9*radius*np.sin(angle)
+    lon = 84.4 + 1.3*radius*np.cos(angle)
+    x, y, zone, letter = utm.from_latlon(lat, lon, 45, 'R')
+    # basin.project shifts the data east
+    ring = np.c_[x - 3650, y][::-1]
+    with shapefile.Writer(filepath, shapeType=shapefile.POLYGON) as writer:
+        writer.field('name', 'C')
+        writer.poly([ring.tolist() + [ring[0].tolist()]])
+        writer.record('Narayani')
+
+
+def write_dem(filepath, extent=(82.8, 86, 27.2, 29.5), shape=(460, 640), seed=0):
+    """
+    Write an elevation model in the layout read by basemap.read_dem, rising
+    from the plains in the south to the Himalayas in the north.
+    """
+    rng = np.random.RandomState(seed)
+    west, east, south, north = extent
+    lat = np.linspace(north, south, shape[0])[:, np.newaxis]
+    lon = np.linspace(west, east, shape[1])[np.newaxis, :]
+    ridge = 8000 / (1 + np.exp(-(lat - 28.6) * 4))
+    hills = 400*np.sin(lon*9)*np.cos(lat*11) + 30*rng.randn(*shape)
+    elevation = np.maximum(ridge + hills + 100, 60).astype(np.float32)
+    np.savez(filepath, elevation=elevation, extent=np.array(extent))
+
+
+def make_archive(root, met_stations=5, hyd_stations=3, years=range(1980, 1990)):
+    """
+    Write a synthetic archive with the same layout as project_data to
+    root: station_loc.txt, prec/, temp/, discharge/, the watershed
+    shapefile in Narayani_catchment/ and dem.npz. Years must be in
+    1930-2029 since met files only have two digit years.
+    """
+    rng = np.random.RandomState(0)
+    seed = 0
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, 'station_loc.txt'), 'w') as file:
+        file.write('Number\tIndex\tName\tLatitude\tLongitude\tElevation\n')
+        for i in range(met_stations):
+            name = met_names[i] if i < len(met_names) else 'Met{}'.format(i)
+            altitude = int(rng.uniform(150, 3000))
+            file.write('{}\t{}\t{}\t{:.2f}\t{:.2f}\t{}\n'.format(
+                i + 1, 601 + i, name, rng.uniform(27.3, 29.3), rng.uniform(83, 85.8), altitude))
+            for variable, write in (('prec', write_precipitation), ('temp', write_temperature)):
+                path = os.path.join(root, variable, '{:04}'.format(601 + i))
+                os.makedirs(path, exist_ok=True)
+                for year in years:
+                    seed += 1
+                    write(os.path.join(path, '{:04}.{:02}'.format(601 + i, year % 100)),
+                          year, altitude, seed)
+        file.write('\n')
+
+    os.makedirs(os.path.join(root, 'Narayani_catchment'), exist_ok=True)
+    write_watershed(os.path.join(root, 'Narayani_catchment', 'watershed.shp'))
+    write_dem(os.path.join(root, 'dem.npz'))
+
+    for i in range(hyd_stations):
+        # Station 450 is patched by hyd.parse_days, so it is not used
+        station = 420 + 100*i
+        path = os.path.join(root, 'discharge', str(station), 'Daily Discharge')
+        os.makedirs(path, exist_ok=True)
+        lat, lon = rng.uniform(27.3, 28.5), rng.uniform(83.5, 85.5)
+        for year in years:
+            seed += 1
+            write_discharge(os.path.join(path, 'Q{}.txt'.format(year)), station, year,
+                            'Hyd{}'.format(i), lat, lon, seed)
@@ -0,0 +1,58 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import utm
+import basemap
+import basin
+import synthetic
+
+
+def test_outline(tmp_path, monkeypatch):
+    """
+    The projected outline is the same as projecting each point, and is
+    read from the cache the second time.
+    """
+    filepath = str(tmp_path / 'watershed.shp')
+    synthetic.write_watershed(filepath)
+    monkeypatch.setattr(basin, 'OUTDIR', str(tmp_path) + '/')
+    lon, lat = basin.outline(filepath)
+    x, y, starts = basin.read_points(filepath)
+    expected = np.array([utm.to_latlon(a + 3650, b, 45, 'R') for a, b in zip(x, y)])
+    np.testing.assert_allclose(lat, expected[:, 0])
+    np.testing.assert_allclose(lon, expected[:, 1])
+
+    cached = basin.cache_path(basin.file_hash(filepath))
+    np.savez(cached, lon=lon[:3], lat=lat[:3])
+    assert len(basin.outline(filepath)[0]) == 3
+
+    # All points are within tolerance of the simplified outline
+    keep = basin.simplify(lon, lat, 0.01)
+    assert 10 < keep.sum() < len(lon)
+    simple = np.c_[lon[keep], lat[keep]]
+    a, b = simple[:-1, np.newaxis], simple[1:, np.newaxis]
+    p = np.c_[lon, lat][np.newaxis]
+    t = np.clip(((p - a)*(b - a)).sum(-1) / ((b - a)**2).sum(-1), 0, 1)
+    distance = np.hypot(*np.moveaxis(p - a - t[..., np.newaxis]*(b - a), -1, 0)).min(0)
+    assert distance.max() <= 0.01
+
+
+def test_relief(tmp_path):
+    """
+    Offline map background from the elevation model, and the tiles that
+    would be needed from the cache.
+    """
+    filepath = str(tmp_path / 'dem.npz')
+    synthetic.write_dem(filepath, shape=(2300, 3200))
+    elevation, extent = basemap.read_dem(filepath)
+    image = basemap.hillshade(elevation, extent)
+    assert image.shape[:2] == (575, 800)
+    fig, ax = plt.subplots()
+    assert basemap.plot_relief(ax, filepath)
+    assert not basemap.plot_relief(ax, str(tmp_path / 'missing.npz'))
+    plt.close(fig)
+
+    # Zoom 8 tiles of the station map
+    tiles = basemap.tile_range([82.8, 86, 27.2, 29.5], 8)
+    assert tiles[0] == (186, 106) and tiles[-1] == (189, 107)
+    assert len(basemap.missing_tiles([82.8, 86, 27.2, 29.5], 8, str(tmp_path))) == len(tiles)
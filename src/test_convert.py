@@ -0,0 +1,36 @@
+import os
+import convert
+import query
+
+
+def convert_to(folder, monkeypatch, **kwargs):
+    """
+    Run the conversion with the outputs in folder. Returns dict mapping
+    the name of each output file to its content.
+    """
+    os.makedirs(folder)
+    root = folder + '/'
+    monkeypatch.setattr(convert, 'OUTDIR', root)
+    monkeypatch.setattr(query, 'files', {variable: root + variable + '.csv'
+                                         for variable in ('prec', 'temp', 'discharge')})
+    convert.run(**kwargs)
+    outputs = {}
+    for name in os.listdir(folder):
+        with open(os.path.join(folder, name), 'rb') as file:
+            outputs[name] = file.read()
+    return outputs
+
+
+def test_workers(archive, monkeypatch):
+    """
+    Loading the files in two processes gives the same output files, byte
+    for byte, as loading them in this process.
+    """
+    root = archive(3, 3, range(1978, 1982))
+    serial = convert_to(str(root / 'serial'), monkeypatch, workers=1)
+    parallel = convert_to(str(root / 'parallel'), monkeypatch, workers=2)
+    assert {'met_stations.csv', 'hyd_stations.csv', 'prec.csv', 'temp.csv',
+            'discharge.csv'} < set(serial)
+    assert sorted(parallel) == sorted(serial)
+    for name in serial:
+        assert parallel[name] == serial[name], name
@@ -0,0 +1,39 @@
+import pandas as pd
+import cube
+import hyd as hyd
+import query
+
+
+def assert_same(result, expected):
+    pd.testing.assert_frame_equal(result, expected, check_names=False, check_index_type=False)
+
+
+def test_cube_equals_daily(archive):
+    """
+    Monthly and yearly tables from the cube are the same as from the daily
+    data, also when the cube is made from a ColumnStore or updated for
+    some years only.
+    """
+    root = archive()
+    # Station 520 has no file for 1980
+    (root / 'discharge' / '520' / 'Daily Discharge' / 'Q1980.txt').unlink()
+    outfile = query.files['discharge']
+    df = hyd.convert_data(outfile, formats=['binary'])
+    full = cube.build('discharge', [df], df.columns)
+
+    # The daily path of each function is the original groupby
+    for stat in ['mean', 'posmean']:
+        assert_same(cube.climatology(full, stat), cube.climatology(df, stat))
+    for stat in ['sum', 'coverage']:
+        assert_same(cube.yearly_table(full, stat), cube.yearly_table(df, stat))
+
+    store = hyd.stream_data(outfile)
+    frames = (store.read([column]) for column in store.columns())
+    pd.testing.assert_frame_equal(cube.build('discharge', frames, store.columns()), full)
+
+    # Update 1981 only, the other years are kept from the stored cube
+    changed = df.copy()
+    changed.loc['1981-05-01'] = 5000
+    update = cube.build('discharge', [changed], changed.columns, {1981})
+    pd.testing.assert_frame_equal(update, cube.build('discharge', [changed], changed.columns))
+    assert (update['max'] == 5000).sum() == 3
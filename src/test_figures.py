@@ -0,0 +1,72 @@
+import importlib
+import os
+import sys
+import numpy as np
+import pandas as pd
+import figures
+import plot
+from figures import Job
+
+source = '''import matplotlib.pyplot as plt
+import figures
+
+
+def draw(df, scale):
+    plt.plot(df.index, df['a'] * scale)
+    plt.savefig(figures.FIGDIR + 'line.png')
+'''
+
+
+def write_module(folder, text):
+    """
+    Write figjob.py with a later mtime than the last version.
+    """
+    path = os.path.join(folder, 'figjob.py')
+    mtime = os.stat(path).st_mtime + 10 if os.path.exists(path) else None
+    with open(path, 'w') as file:
+        file.write(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_run(outdir, monkeypatch):
+    """
+    A figure is only rendered again after its data, its arguments or the
+    code it uses changed, or when the png is missing.
+    """
+    write_module(str(outdir), source)
+    monkeypatch.syspath_prepend(str(outdir))
+    monkeypatch.setitem(sys.modules, 'figjob', importlib.import_module('figjob'))
+    index = pd.date_range('1990-01-01', periods=50, freq='D', name='date')
+    data = {'a': pd.DataFrame({'a': np.arange(50.0)}, index=index)}
+
+    def run(scale=1):
+        jobs = [Job('line', ['a'], sys.modules['figjob'].draw, (scale,))]
+        return sorted(figures.run(jobs, data, workers=1))
+
+    assert run() == ['line']
+    assert os.path.exists(str(outdir / 'line.png'))
+    assert run() == []
+
+    data['a'] = data['a'] * 2
+    assert run() == ['line']
+    assert run(2) == ['line']
+    assert run(2) == []
+
+    # Changed code of the module of the function
+    write_module(str(outdir), source + '\n\n# Changed\n')
+    assert run(2) == ['line']
+    assert run(2) == []
+
+    os.remove(str(outdir / 'line.png'))
+    assert run(2) == ['line']
+
+
+def test_modules():
+    """
+    The hash of the plot jobs includes the helpers they use from other
+    modules.
+    """
+    names = [module.__name__ for module in figures.project_modules(plot)]
+    assert {'plot', 'cube', 'regression', 'timeseries'} <= set(names)
+    assert 'pandas' not in names and 'common' not in names
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+import flow
+
+
+def test_baseflow():
+    """
+    Lyne-Hollick filter: constant flow is all baseflow, baseflow is not
+    larger than the flow, and a short series computed by hand.
+    """
+    index = pd.date_range('1990-01-01', periods=5, freq='D', name='date')
+    df = pd.DataFrame({'constant': 4.0, 'peak': [1.0, 3.0, 1.0, np.nan, 2.0]}, index=index)
+    base = flow.baseflow(df, passes=1)
+    np.testing.assert_allclose(flow.baseflow(df)['constant'], 4)
+    # quick = 0.925*quick + (1 + 0.925)/2*(flow - previous flow), kept
+    # between 0 and the flow, and 0 again after the missing day
+    np.testing.assert_allclose(base['peak'], [1, 3 - 0.9625*2, 1, np.nan, 2])
+    indices = flow.indices(df, base)
+    np.testing.assert_allclose(indices.loc['peak', 'Baseflow index'], (4 + 3 - 1.925) / 7)
+    # Backward and forward again, the peak is 1.075 - 0.9625*0.075 after
+    # the second pass
+    second = 1.075 - 0.9625*0.075
+    third = second - 0.9625*(second - 1)
+    np.testing.assert_allclose(flow.baseflow(df)['peak'], [1, third, 1, np.nan, 2])
+
+
+def test_missing_rows():
+    """
+    Days without a row are missing days, for the baseflow filter and the
+    coverage of each year.
+    """
+    rng = np.random.RandomState(1)
+    index = pd.date_range('1990-01-01', '1992-12-31', freq='D', name='date')
+    df = pd.DataFrame({'Hyd1': rng.lognormal(3, 0.5, len(index))}, index=index)
+    gap = df.index[400:500]
+    dropped = flow.compute(df.drop(gap))
+    missing = df.copy()
+    missing.loc[gap] = np.nan
+    expected = flow.compute(missing)
+    assert dropped['baseflow'].index.equals(expected['baseflow'].index)
+    np.testing.assert_array_equal(dropped['baseflow'].values, expected['baseflow'].values)
+    assert dropped['maxima'].loc[1991].isna().all()
+    pd.testing.assert_frame_equal(dropped['indices'], expected['indices'])
+
+
+def test_flow(outdir, monkeypatch):
+    rng = np.random.RandomState(0)
+    index = pd.date_range('1970-01-01', '1999-12-31', freq='D', name='date')
+    season = 100 + 80*np.sin(2*np.pi*index.dayofyear.values/365)[:, np.newaxis]
+    df = pd.DataFrame(season*rng.lognormal(0, 0.4, (len(index), 3)),
+                      index=index, columns=['Hyd1', 'Hyd2', 'Hyd3'])
+    df.iloc[1000:1100, 1] = np.nan
+    df.iloc[:800, 2] = np.nan
+
+    base = flow.baseflow(df)
+    assert (base.fillna(0) <= df.fillna(0)).all().all()
+
+    curves = flow.duration_curves(df)
+    assert (curves.diff().dropna() <= 0).all().all()
+    np.testing.assert_allclose(curves.loc[95], df.quantile(0.05))
+
+    # Gumbel fitted by moments, the years with too few days are left out
+    maxima = flow.annual_maxima(df)
+    assert maxima['Hyd3'].isna().sum() == 2
+    levels = flow.return_levels(maxima)
+    sample = maxima['Hyd1']
+    scale = sample.std()*np.sqrt(6)/np.pi
+    expected = stats.gumbel_r.ppf(1 - 1/100, sample.mean() - np.euler_gamma*scale, scale)
+    np.testing.assert_allclose(levels.loc[100, 'Hyd1'], expected, rtol=1e-9)
+
+    # Cached on disk by the hash of the data, the parameters and the code
+    result = flow.statistics(df)
+    assert len(list((outdir / 'flow').iterdir())) == 1
+    pd.testing.assert_frame_equal(flow.statistics(df)['indices'], result['indices'])
+    flow.statistics(df * 2)
+    assert len(list((outdir / 'flow').iterdir())) == 2
+
+    # Changed code
+    flow.statistics(df)
+    assert len(list((outdir / 'flow').iterdir())) == 2
+    monkeypatch.setattr(flow, 'code_hash', lambda func: 'changed')
+    flow.statistics(df)
+    assert len(list((outdir / 'flow').iterdir())) == 3
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import gapfill
+import stations
+
+
+def stations_frame(seed=0):
+    """
+    Daily temperature of five stations at different heights with a shared
+    seasonal cycle and weather, and a lapse rate of -6 C/km.
+    """
+    rng = np.random.RandomState(seed)
+    index = pd.date_range('1990-01-01', '1999-12-31', freq='D', name='date')
+    heights = np.array([500., 1000., 1500., 2000., 2500.])
+    season = 10*np.sin(2*np.pi*index.dayofyear.values/365)
+    weather = rng.normal(0, 3, len(index))
+    values = (25 + season + weather)[:, np.newaxis] - 6*heights/1000
+    values = values + rng.normal(0, 0.5, values.shape)
+    columns = ['S{}_max'.format(i) for i in range(len(heights))]
+    return pd.DataFrame(values, index=index, columns=columns), heights
+
+
+def test_fill():
+    truth, heights = stations_frame()
+    df = truth.copy()
+    # Short gap, a long gap with correlated neighbours, and a station
+    # without any days in common with the others
+    df.iloc[100:103, 0] = np.nan
+    df.iloc[1000:1400, 1] = np.nan
+    df.iloc[:2000, 4] = np.nan
+    df.iloc[2000:, [0, 1, 2, 3]] = np.nan
+    df.iloc[2000:2400, 4] = np.nan
+
+    filled = gapfill.fill(df, min_overlap=100, heights=heights)
+    flags = filled.flags
+    assert ((flags == gapfill.flags['observed']) == df.notna()).all().all()
+    pd.testing.assert_frame_equal(filled.data[df.notna()], df[df.notna()])
+
+    # Same as pandas for short gaps
+    expected = df.iloc[95:110, 0].interpolate()
+    pd.testing.assert_series_equal(filled.data.iloc[95:110, 0], expected)
+    assert (flags.iloc[100:103, 0] == gapfill.flags['interpolated']).all()
+
+    # Regression on the other stations
+    assert (flags.iloc[1000:1400, 1] == gapfill.flags['regression']).all()
+    error = (filled.data.iloc[1000:1400, 1] - truth.iloc[1000:1400, 1]).abs().mean()
+    assert error < 1
+
+    # No common days, shifted from the closest station by the lapse rate
+    assert (flags.iloc[2000:2400, 3] == gapfill.flags['missing']).all()
+    assert (flags.iloc[:2000, 4] == gapfill.flags['lapserate']).all()
+    error = (filled.data.iloc[:2000, 4] - truth.iloc[:2000, 4]).abs().mean()
+    assert error < 1.5
+
+    summary = gapfill.summary(flags)
+    np.testing.assert_allclose(summary.sum(), 1)
+
+
+def test_regression():
+    """
+    A station that is a linear function of another is recovered exactly by
+    regression.
+    """
+    rng = np.random.RandomState(1)
+    index = pd.date_range('1990-01-01', periods=1000, freq='D', name='date')
+    a = 300 + 50*rng.normal(size=len(index))
+    df = pd.DataFrame({'A': a, 'B': 2*a - 400, 'C': rng.normal(size=len(index))}, index=index)
+    df.iloc[400:500, 1] = np.nan
+    df.iloc[700:800, 0] = np.nan
+
+    filled = gapfill.fill(df, min_overlap=100, heights=[1000, 1500, 2000])
+    assert (filled.flags.iloc[400:500, 1] == gapfill.flags['regression']).all()
+    np.testing.assert_allclose(filled.data.iloc[400:500, 1], 2*a[400:500] - 400)
+    assert (filled.flags.iloc[700:800, 0] == gapfill.flags['regression']).all()
+    np.testing.assert_allclose(filled.data.iloc[700:800, 0], a[700:800])
+
+
+def test_lapserate_shift():
+    """
+    Values from the closest station with data are shifted by the lapse
+    rate of each month for the height difference.
+    """
+    index = pd.date_range('1990-01-01', periods=400, freq='D', name='date')
+    values = 100 + np.arange(400.0)
+    df = pd.DataFrame({'A': values, 'B': np.nan, 'C': values + 50}, index=index)
+    df.iloc[:200, 2] = np.nan
+    df.iloc[200:, 0] = np.nan
+    rates = np.zeros((12, 3))
+    rates[:, 1] = np.arange(12) - 6
+    filled = gapfill.fill(df, heights=[1000, 1800, 3000], rates=rates)
+    rate = rates[index.month - 1, 1]
+    expected = np.where(np.arange(400) < 200, values + rate*0.8, values + 50 - rate*1.2)
+    np.testing.assert_allclose(filled.data['B'], expected)
+    assert (filled.flags['B'] == gapfill.flags['lapserate']).all()
+
+
+def test_seasonal():
+    """
+    Seasonal interpolation of short gaps interpolates the anomalies from
+    the monthly means.
+    """
+    truth, heights = stations_frame()
+    df = truth.copy()
+    df.iloc[58:62, 0] = np.nan
+    filled = gapfill.fill(df, method='seasonal', heights=heights)
+    column = df.iloc[:, 0]
+    climate = column.groupby(column.index.month).transform('mean')
+    expected = (column - climate).interpolate() + climate
+    np.testing.assert_allclose(filled.data.iloc[50:70, 0], expected.iloc[50:70])
+    assert (filled.flags.iloc[58:62, 0] == gapfill.flags['interpolated']).all()
+
+
+def test_heights_by_kind(registry):
+    """
+    Met and hyd stations with the same name are told apart.
+    """
+    registry(stations.Station(601, 'Lete', 28.6, 83.6, 2384.0, 'met'),
+             stations.Station(420, 'Lete', 28.6, 83.6, 198.0, 'hyd'))
+    np.testing.assert_array_equal(gapfill.station_heights(['Lete_max', 'X'], 'met'), [2384, np.nan])
+    np.testing.assert_array_equal(gapfill.station_heights(['Lete'], 'hyd'), [198])
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import gapfill
+import gridding
+import stations
+import synthetic
+
+
+def test_basin_means(outdir, registry):
+    shapefile = str(outdir / 'watershed.shp')
+    dem = str(outdir / 'dem.npz')
+    synthetic.write_watershed(shapefile)
+    synthetic.write_dem(dem)
+    grid = gridding.rasterize(0.05, shapefile, dem)
+    # About the area of the outline, an ellipse of 2.6 x 1.8 degrees
+    assert abs(len(grid.lon)*0.05**2 / (np.pi*1.3*0.9) - 1) < 0.05
+    assert grid.mask.sum() == len(grid.lon) and not np.isnan(grid.elevation).any()
+
+    names = ['A', 'B', 'C', 'D', 'E']
+    lon = np.array([83.6, 84.0, 84.4, 84.9, 85.2])
+    lat = np.array([27.8, 28.6, 28.2, 28.9, 28.0])
+    heights = np.array([300., 2500., 1200., 3500., 800.])
+    registry(*[stations.Station(i, name, lat[i], lon[i], heights[i], 'met')
+               for i, name in enumerate(names)])
+
+    rng = np.random.RandomState(0)
+    index = pd.date_range('1990-01-01', '1994-12-31', freq='D', name='date')
+    weather = rng.normal(0, 1, len(index))
+    values = 20 - 6*heights/1000 + weather[:, np.newaxis]
+    values[rng.random_sample(values.shape) < 0.2] = np.nan
+    values[:3] = np.nan
+    df = pd.DataFrame(values, index=index, columns=[name + '_max' for name in names])
+
+    interpolator = gridding.Interpolator(grid, lon, lat, heights)
+    month = index.month.values
+    rates = np.full(12, -6.)
+    fields = interpolator.fields(values, rates, month)
+    means = interpolator.means(values, rates, month)
+    assert np.isnan(fields[:3]).all() and np.isnan(means[:3]).all()
+    # With the lapse rate of the data, the cells follow their elevation
+    expected = 20 - 6*grid.elevation/1000 + weather[:, np.newaxis]
+    np.testing.assert_allclose(fields[3:], expected[3:])
+    np.testing.assert_allclose(means[3:], fields[3:].mean(axis=1))
+
+    # Lapse rates from the monthly means of the stations
+    rates = gapfill.lapse_rates(df, heights)[:, 0]
+    np.testing.assert_allclose(rates, -6, atol=0.1)
+    result = gridding.basin_means(df, grid)
+    assert list(result.columns) == ['basin_max']
+    np.testing.assert_allclose(result['basin_max'].values,
+                               interpolator.means(values, rates, month))
+
+    # Days without any station with data only
+    assert np.isnan(interpolator.means(np.full((10, 5), np.nan))).all()
+    assert np.isnan(gridding.basin_means(df.iloc[:3], grid)['basin_max']).all()
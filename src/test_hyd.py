@@ -1,76 +1,89 @@
 import hyd as hyd
+import validate
 import pandas as pd
 import numpy as np
 import os
+import pytest
+import synthetic
 from common import *
 
 rtol = 0.01
 
 def test_discharge():
     """
-    Run through all discharge data files
-    and run check_discharge.
+    Run through all discharge data files and check that monthly minimum,
+    maximum and mean values match the values in the files. All mismatches
+    are listed if the test fails.
     """
-    stations = []
-    for root, dirs, files in os.walk(DISDIR):
-        stations = dirs
-        break
-    print(stations)
-    for station in stations:
-        path = DISDIR + station + '/Daily Discharge/'
-        files = os.listdir(path)
-        for filename in files:
-                filepath = path+filename
-                check_discharge(filepath, rtol)
+    files = validate.archive_files() if os.path.isdir(DISDIR) else []
+    if not files:
+        pytest.skip('no discharge files in {}'.format(DISDIR))
+    mismatches = validate.validate(files, rtol)
+    assert not mismatches, '\n'.join(
+        '{station} {year}-{month:02} {statistic}: expected {expected}, got {got}'.format(**m)
+        for m in mismatches)
 
 
-
-def check_discharge(filepath, rtol):
+def load_df_reference(filepath):
     """
-    Compute min, max and mean value and compare with values from file
-    to check that data is loaded correctly.
+    The row by row parser hyd.load_df_manual was first written as, kept
+    to check the vectorized parser against.
     """
-    df = hyd.load_df_manual(filepath)
-    monthly = df.groupby(df.index.month)
-    test_df = load_stats(filepath)
-    test_df['mintest'] = monthly.min()
-    test_df['maxtest'] = monthly.max()
-    test_df['meantest'] = monthly.mean()
-    x = test_df['min'].values[0]
-    for i in test_df.index:
-        min = test_df.loc[i,'min']
-        max = test_df.loc[i,'max']
-        mean = test_df.loc[i,'mean']
-        mintest = test_df.loc[i,'mintest']
-        maxtest = test_df.loc[i,'maxtest']
-        meantest = test_df.loc[i,'meantest']
-        test_data = [mintest, maxtest, meantest, min, max, mean]
-        hasnan = False
-        for data in test_data:
-            if np.isnan(data):
-                hasnan = True
-        if not hasnan:
-            assert np.isclose(mintest, min, rtol=rtol)
-            assert np.isclose(maxtest, max, rtol=rtol)
-            assert np.isclose(meantest, mean, rtol=rtol)
-        else:
-            print('Cannot test, sinces test data contain nan')
+    year = hyd.get_year(filepath)
+    station = hyd.get_station(filepath)
+    df = pd.DataFrame(columns=[station])
+    df.index.name = 'date'
+    with open(filepath) as file:
+        lines = file.readlines()[10:41]
+        for line in lines:
+            line = line.split()
+            day = int(line[0])
+            if day == 29:
+                if (year % 4 != 0):
+                    line.insert(2,np.nan)
+            elif day == 30:
+                line.insert(2,np.nan)
+            elif day == 31:
+                for i in (2,4,6,9,11):
+                    line.insert(i,np.nan)
+            if (station == '450' and year == 1977 and day == 17):
+                line.insert(6,946)
+            for month_num in range(1, 13):
+                date = '{}-{:02}-{}'.format(year, month_num, day)
+                precip = line[month_num]
+                if precip == 'NA':
+                    precip = np.nan
+                else:
+                    precip = float(precip)
+                try:
+                    date_time = pd.to_datetime(date)
+                    df.loc[date_time] = precip
+                except ValueError:
+                    continue
+    return df
+
 
-def load_stats(filepath):
+def test_parse_equals_reference(archive):
     """
-    Get min, max and mean discharge values from discharge file
+    The vectorized parser gives the same table as the row by row parser,
+    for leap and other years and for the patched value of station 450.
     """
-
+    root = archive(0, 2, range(1978, 1981))
+    # Station 450 has no value for June 17 1977
+    filepath = str(root / 'Q450_1977.txt')
+    synthetic.write_discharge(filepath, 450, 1977)
     with open(filepath) as file:
-        min = []
-        lines = file.readlines()[42:]
-        # Split and drop first column containing text and last column containing yearly values
-        min = lines[0].split()[1:-1]
-        mean = lines[1].split()[1:-1]
-        max = lines[2].split()[1:-1]
-        df = pd.DataFrame({'min': min,'max': max, 'mean':mean},dtype=np.float64)
-        df = df.replace('NA',np.nan)
-        for col in ['min', 'mean','max']:
-            df[col] = pd.to_numeric(df[col])
-        df.index += 1
-    return df
+        lines = file.readlines()
+    day = lines[26].split()
+    assert day[0] == '17'
+    lines[26] = '  '.join(day[:6] + day[7:]) + '\n'
+    with open(filepath, 'w') as file:
+        file.writelines(lines)
+
+    for filepath in validate.archive_files() + [filepath]:
+        df = hyd.load_df_manual(filepath)
+        expected = load_df_reference(filepath)
+        assert list(df.columns) == list(expected.columns)
+        assert df.index.equals(pd.DatetimeIndex(expected.index))
+        np.testing.assert_array_equal(df.values, expected.values.astype(float))
+    assert df.loc['1977-06-17', '450'] == 946
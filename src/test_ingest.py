@@ -0,0 +1,77 @@
+import os
+from collections import Counter
+import pandas as pd
+import hyd as hyd
+import ingest
+import manifest
+from manifest import Manifest
+import validate
+
+
+def test_read_once(archive, monkeypatch):
+    """
+    Converting and validating the discharge files reads each file once,
+    and gives the same table as reading them one by one.
+    """
+    tmp_path = archive()
+    files = validate.archive_files()
+    outfile = str(tmp_path / 'discharge.csv')
+    expected = hyd.convert_data(outfile, formats=['csv'])
+
+    opened = Counter()
+    def counting_open(filepath, *args, **kwargs):
+        opened[filepath] += 1
+        return open(filepath, *args, **kwargs)
+    monkeypatch.setattr(ingest, 'open', counting_open, raising=False)
+    ingest.cache.clear()
+
+    # Small batches, so files are passed on in several calls
+    calls = []
+    def mapper(func, *iterables):
+        calls.append(len(iterables[0]))
+        return list(map(func, *iterables))
+    mismatches = []
+    checked = validate.wrap(ingest.wrap(mapper, max_bytes=10000, threads=4), mismatches)
+    df = hyd.convert_data(outfile, checked, formats=['csv'])
+    assert len(calls) > 1 and sum(calls) == len(files)
+    assert set(opened) == set(files) and set(opened.values()) == {1}
+    # Header lookups are served from the buffer
+    hyd.get_year(files[0])
+    hyd.get_station(files[0])
+    assert opened[files[0]] == 1
+    pd.testing.assert_frame_equal(df, expected)
+    assert mismatches == validate.validate(files, workers=1)
+
+
+def test_incremental_read_once(archive, monkeypatch):
+    """
+    Incremental conversions read each file once, also the files whose
+    content hash is checked by the manifest.
+    """
+    tmp_path = archive(0, 2, range(1978, 1981))
+    files = validate.archive_files()
+    opened = Counter()
+    def counting_open(filepath, *args, **kwargs):
+        if filepath in files:
+            opened[filepath] += 1
+        return open(filepath, *args, **kwargs)
+    monkeypatch.setattr(ingest, 'open', counting_open, raising=False)
+    monkeypatch.setattr(manifest, 'open', counting_open, raising=False)
+
+    def convert():
+        ingest.cache.clear()
+        m = Manifest(str(tmp_path / 'manifest.json'), str(tmp_path / 'cache') + '/')
+        df = hyd.convert_data(str(tmp_path / 'discharge.csv'), m.wrap(ingest.wrap()), ['csv'])
+        m.save()
+        return m, df
+    m, expected = convert()
+    assert m.parsed == len(files) and set(opened.values()) == {1}
+
+    # New mtime only, the content hash is checked
+    opened.clear()
+    stat = os.stat(files[0])
+    os.utime(files[0], (stat.st_atime, stat.st_mtime + 10))
+    m, df = convert()
+    assert (m.parsed, m.reused) == (0, len(files))
+    assert opened == {files[0]: 1}
+    pd.testing.assert_frame_equal(df, expected)
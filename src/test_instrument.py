@@ -0,0 +1,76 @@
+import csv
+import json
+from collections import Counter
+import convert
+import instrument
+import validate
+
+
+def entries(filepath, skip, footer=1):
+    """
+    Count the entries of the data rows of a met file.
+    """
+    with open(filepath) as file:
+        lines = [line for line in file.read().splitlines() if line.strip()][skip:-footer]
+    return len(lines), Counter(token for line in lines for token in line.split()[1:])
+
+
+def test_records(archive):
+    """
+    Each parsed file gets a record with its rows and the number of each
+    replaced entry, counted from the files.
+    """
+    root = archive(2, 2, range(1979, 1981))
+    records = []
+    convert.run(records=records)
+    by_file = {record['file']: record for record in records}
+    discharge = validate.archive_files()
+    met = [str(path) for variable in ('prec', 'temp') for path in (root / variable).glob('*/*')]
+    assert sorted(by_file) == sorted(discharge + met)
+
+    for filepath in met:
+        record = by_file[filepath]
+        temp = record['loader'] == 'load_temperature'
+        rows, found = entries(filepath, 2 if temp else 0)
+        assert record['rows'] == rows
+        for text in ('DNA', 'T', '-99.9'):
+            assert record.get(text, 0) == found[text], (filepath, text)
+        assert 'padding' not in record
+    for filepath in discharge:
+        record = by_file[filepath]
+        year = int(filepath[-8:-4])
+        with open(filepath) as file:
+            days = file.read().splitlines()[10:41]
+        assert record['loader'] == 'load_df_manual'
+        assert record['rows'] == (366 if year % 4 == 0 else 365)
+        assert record.get('NA', 0) == sum(line.split().count('NA') for line in days)
+        # Days 29 (except leap years), 30 and 31 of February and 31 of the
+        # months with 30 days
+        assert record['padding'] == (6 if year % 4 == 0 else 7)
+
+    totals = instrument.summary(records)
+    assert totals['load_df_manual']['files'] == len(discharge)
+    assert totals['load_df_manual']['rows'] == 2 * (365 + 366)
+
+
+def test_write_report(tmp_path):
+    """
+    Counters missing for a file are 0 in the csv file, and the json file
+    keeps the records as they are.
+    """
+    records = [{'file': 'a', 'loader': 'load_precipitation', 'seconds': 0.5, 'bytes': 100,
+                'rows': 365, 'DNA': 2, 'T': 1},
+               {'file': 'b', 'loader': 'load_df_manual', 'seconds': 0.25, 'bytes': 200,
+                'rows': 366, 'NA': 3, 'padding': 6}]
+    instrument.write_report(records, str(tmp_path / 'report.json'))
+    with open(str(tmp_path / 'report.json')) as file:
+        assert json.load(file) == records
+
+    instrument.write_report(records, str(tmp_path / 'report.csv'))
+    with open(str(tmp_path / 'report.csv')) as file:
+        reader = csv.DictReader(file)
+        rows = list(reader)
+    assert reader.fieldnames == ['file', 'loader', 'seconds', 'bytes', 'rows',
+                                 'DNA', 'NA', 'T', 'padding']
+    assert rows[0]['NA'] == '0' and rows[0]['DNA'] == '2' and rows[0]['padding'] == '0'
+    assert rows[1]['T'] == '0' and rows[1]['padding'] == '6' and rows[1]['seconds'] == '0.25'
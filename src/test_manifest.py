@@ -0,0 +1,56 @@
+import os
+import pandas as pd
+import manifest
+from manifest import Manifest
+
+
+def load(filepath):
+    return pd.read_csv(filepath, index_col=0, parse_dates=True)
+
+
+def write(filepath, year, value):
+    index = pd.date_range('{}-01-01'.format(year), periods=3, freq='D', name='date')
+    pd.DataFrame({'value': [value] * 3}, index=index).to_csv(filepath)
+
+
+def convert(tmp_path, files):
+    m = Manifest(str(tmp_path / 'manifest.json'), str(tmp_path / 'cache') + '/')
+    results = m.wrap()(load, files)
+    m.prune()
+    m.save()
+    return m, results
+
+
+def test_manifest(tmp_path, monkeypatch):
+    """
+    Only new, changed and deleted files are parsed again, and their years
+    are touched. Files with a new mtime but the same content are reused.
+    """
+    files = [str(tmp_path / '{}.csv'.format(year)) for year in (1990, 1991, 1992)]
+    for year, filepath in zip((1990, 1991, 1992), files):
+        write(filepath, year, 1)
+    m, _ = convert(tmp_path, files)
+    assert (m.parsed, m.reused) == (3, 0)
+
+    m, results = convert(tmp_path, files)
+    assert (m.parsed, m.reused) == (0, 3) and not m.touched
+    pd.testing.assert_frame_equal(results[1], load(files[1]))
+
+    # Changed content, and only a new mtime
+    write(files[1], 1991, 2)
+    stat = os.stat(files[2])
+    os.utime(files[2], (stat.st_atime, stat.st_mtime + 10))
+    m, results = convert(tmp_path, files)
+    assert (m.parsed, m.reused) == (1, 2)
+    assert m.touched == {'load': {1991}}
+    assert (results[1]['value'] == 2).all()
+
+    # Deleted file
+    m, _ = convert(tmp_path, files[1:])
+    assert (m.parsed, m.reused) == (0, 2)
+    assert m.touched == {'load': {1990}}
+
+    # Changed loader
+    monkeypatch.setattr(manifest, 'code_hash', lambda func: 'changed')
+    m, _ = convert(tmp_path, files[1:])
+    assert (m.parsed, m.reused) == (2, 0)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+import met as met
+import synthetic
+
+
+def load_temperature_reference(filepath, station):
+    """
+    met.load_temperature as it was first written with read_csv, kept to
+    check the faster loader against.
+    """
+    names = ['{}_max'.format(station.lstrip('0')), '{}_min'.format(station.lstrip('0'))]
+    df = pd.read_csv(filepath, skiprows=2, skipfooter=1, engine='python', delim_whitespace=True,
+                     index_col=0, header=None, names=names)
+    df.index.name = 'date'
+    df = df.replace("T", np.nan)
+    df = df.replace("DNA", np.nan)
+    for name in names:
+        df[name] = pd.to_numeric(df[name])
+    df = df.replace(-99.9, np.nan)
+    df.index = pd.to_datetime(met.get_year(filepath)*1000 + df.index, format='%Y%j')
+    return df
+
+
+def load_precipitation_reference(filepath, station):
+    """
+    met.load_precipitation as it was first written with read_csv.
+    """
+    name = station.lstrip('0')
+    df = pd.read_csv(filepath, skipfooter=1, engine='python', delim_whitespace=True,
+                     index_col=0, header=None, names=[name])
+    df.index.name = 'date'
+    df = df.replace("DNA", np.nan)
+    df = df.replace("T", 0.2)
+    df[name] = pd.to_numeric(df[name])
+    df = df.replace(-99.9, np.nan)
+    df.index = pd.to_datetime(met.get_year(filepath)*1000 + df.index, format='%Y%j')
+    return df
+
+
+def edit(filepath, rows):
+    """
+    Replace rows of a file, given as dict of line number to text.
+    """
+    with open(filepath) as file:
+        lines = file.read().splitlines()
+    for number, text in rows.items():
+        lines[number] = text
+    with open(filepath, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+@pytest.mark.parametrize('year', [1980, 1983, 2005])
+def test_loaders_equal_reference(tmp_path, year):
+    """
+    The loaders give the same tables as the read_csv loaders, also for
+    DNA, T, -99.9, NA entries and short rows.
+    """
+    prec = str(tmp_path / '0601.{:02}'.format(year % 100))
+    synthetic.write_precipitation(prec, year, seed=year)
+    edit(prec, {0: '  1      DNA', 1: '  2        T', 2: '  3    -99.9', 3: '  4', 4: '  5       NA'})
+    temp = str(tmp_path / 'temp' / '0601.{:02}'.format(year % 100))
+    (tmp_path / 'temp').mkdir()
+    synthetic.write_temperature(temp, year, seed=year)
+    edit(temp, {2: '  1      DNA     12.0', 3: '  2     25.0        T', 4: '  3    -99.9    -99.9',
+                5: '  4     24.5', 6: '  5', 7: '  6       NA      3.5'})
+
+    for loader, reference, filepath in ((met.load_precipitation, load_precipitation_reference, prec),
+                                        (met.load_temperature, load_temperature_reference, temp)):
+        df = loader(filepath, '0601')
+        expected = reference(filepath, '0601')
+        assert list(df.columns) == list(expected.columns)
+        assert df.index.equals(expected.index)
+        np.testing.assert_array_equal(df.values, expected.values)
+        assert df.dtypes.eq(float).all()
+    assert np.isnan(df.iloc[:5].values).sum() == 7
@@ -0,0 +1,72 @@
+import pytest
+import cube
+import figures
+import hyd as hyd
+import met as met
+import pipeline
+import plot
+import query
+from pipeline import Stage
+
+
+def test_run(tmp_path, monkeypatch):
+    """
+    Stages get the results of their inputs in memory, and only stages
+    below a changed source run again.
+    """
+    monkeypatch.setattr(pipeline, 'OUTDIR', str(tmp_path) + '/')
+    monkeypatch.setattr(pipeline, 'recordfile', str(tmp_path / 'pipeline.json'))
+    source = tmp_path / 'source.txt'
+    source.write_text('1')
+    calls = []
+
+    def stage(name, inputs, func, sources=()):
+        output = tmp_path / (name + '.txt')
+
+        def run(*args):
+            calls.append(name)
+            value = func(*args)
+            output.write_text(str(value))
+            return value
+        return Stage(name, inputs, run, list(map(str, sources)), [str(output)],
+                     lambda: int(output.read_text()))
+
+    stages = [stage('sum', ['a', 'b'], lambda a, b: a + b),
+              stage('a', [], lambda: int(source.read_text()), [source]),
+              stage('b', [], lambda: 10)]
+    records = pipeline.run(stages, workers=2)
+    assert sorted(calls[:2]) == ['a', 'b'] and calls[2] == 'sum'
+    assert (tmp_path / 'sum.txt').read_text() == '11'
+    assert set(record['status'] for record in records.values()) == {'ran'}
+
+    calls.clear()
+    pipeline.run(stages)
+    assert calls == []
+
+    # b is skipped and loaded from its output
+    source.write_text('22')
+    records = pipeline.run(stages)
+    assert calls == ['a', 'sum']
+    assert records['b']['status'] == 'skipped'
+    assert (tmp_path / 'sum.txt').read_text() == '32'
+
+    with pytest.raises(ValueError):
+        pipeline.order(stages + [stage('c', ['d'], lambda d: d), stage('d', ['c'], lambda c: c)])
+
+
+def test_figure_data(archive):
+    """
+    The figure inputs are the same frames as plot.py loads, so figures
+    rendered by one are not rendered again by the other.
+    """
+    archive(2, 2, range(1979, 1981))
+    frames = [met.convert_data(query.files['prec'], 'prec'),
+              met.convert_data(query.files['temp'], 'temp'),
+              hyd.convert_data(query.files['discharge'])]
+    cubes = {variable: cube.build(variable, [df], df.columns)
+             for variable, df in zip(['prec', 'temp', 'discharge'], frames)}
+    data = pipeline.figure_data(*frames, cubes)
+    loaded = dict(zip(['p', 't', 'q', 'pc', 'tc', 'qc'], plot.load_data() + plot.load_cubes()))
+    assert sorted(data) == sorted(loaded)
+    for name in data:
+        assert figures.frame_hash(data[name]) == figures.frame_hash(loaded[name]), name
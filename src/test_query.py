@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import hyd as hyd
+import query
+import store
+
+
+@pytest.fixture
+def converted(archive):
+    """
+    Converted discharge of stations 420, 520 and 620 for 1978-1982.
+    """
+    archive()
+    return hyd.convert_data(query.files['discharge'], formats=['csv', 'binary']).sort_index()
+
+
+def test_time_range(converted):
+    """
+    The end of the time range is inclusive, also for partial dates.
+    """
+    df = query.load('discharge', start='1979', end='1980')
+    assert df.index[0] == pd.Timestamp('1979-01-01')
+    assert df.index[-1] == pd.Timestamp('1980-12-31')
+    df = query.load('discharge', start='1979-03-05', end='1980-06')
+    assert df.index[0] == pd.Timestamp('1979-03-05')
+    assert df.index[-1] == pd.Timestamp('1980-06-30')
+
+
+def test_stations(converted):
+    """
+    Stations are selected by name or id, and columns are named.
+    """
+    df = query.load('discharge', ['Hyd0', 520])
+    assert sorted(df.columns) == ['Hyd0', 'Hyd1']
+    np.testing.assert_array_equal(df['Hyd1'].values, converted['520'].values)
+    assert df.index.equals(converted.index)
+    assert list(query.load('discharge', ['620']).columns) == ['Hyd2']
+
+
+def test_store_and_full_table(converted, monkeypatch):
+    """
+    The column store gives the same result as the full table once it is
+    the newest output, and the cached frames of the full table are not
+    used after that.
+    """
+    expected = query.load('discharge', ['Hyd0', 'Hyd2'], '1979', '1981-02-15')
+    assert expected.index[-1] == pd.Timestamp('1981-02-15')
+    outfile = query.files['discharge']
+    hyd.stream_data(outfile)
+    base = os.path.splitext(outfile)[0]
+    assert store.newest_format(base) == 'store'
+    monkeypatch.setattr(query, 'read_frame', None)
+    df = query.load('discharge', ['Hyd0', 'Hyd2'], '1979', '1981-02-15')
+    assert list(df.columns) == list(expected.columns) and df.index.equals(expected.index)
+    np.testing.assert_array_equal(df.values, expected.values)
+
+
+def test_compact(converted):
+    """
+    The values of the compact data take half the memory, also in the
+    cache.
+    """
+    expected = query.load('discharge')
+    full = query.cache.nbytes
+    query.cache.clear()
+    df = query.load('discharge', compact=True)
+    assert (df.dtypes == 'float32').all()
+    assert 2*df.memory_usage(index=False).sum() == expected.memory_usage(index=False).sum()
+    assert query.cache.nbytes < 0.7*full
+    assert list(df.columns) == list(expected.columns) and df.index.equals(expected.index)
+    np.testing.assert_array_equal(df.values, expected.values.astype('float32'))
+
+
+def test_read_view(converted):
+    """
+    The time range of all columns is a view of the cached table, a subset
+    of the columns is a copy.
+    """
+    query.read('discharge', None, None, None)
+    cached = query.cache.get(('full', 'discharge', query.version('discharge'), False))
+    df = query.read('discharge', None, '1979', '1980')
+    assert np.shares_memory(df['520'].values, cached['520'].values)
+    df = query.read('discharge', ['520'], '1979', '1980')
+    assert not np.shares_memory(df['520'].values, cached['520'].values)
+    assert len(df) == 731 and list(df.columns) == ['520']
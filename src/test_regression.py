@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+import regression
+
+
+def monthly_frame(stations=8, seed=0):
+    """
+    Random monthly values with a linear height dependence and some
+    missing values.
+    """
+    rng = np.random.RandomState(seed)
+    height = rng.uniform(100, 3000, stations)
+    df = pd.DataFrame(index=['s{}'.format(i) for i in range(stations)])
+    for month in regression.months:
+        df[month] = 25 - 0.006*height + rng.randn(stations)
+    df.iloc[0, 3] = np.nan
+    df['height'] = height
+    return df
+
+
+def statsmodels_lapserate(df):
+    rate = []
+    error = []
+    for i in range(1,13):
+        fit = smf.ols('Q("{}") ~ height'.format(i), df).fit()
+        coeff = fit.params.iloc[-1]*1000
+        rate.append(coeff)
+        error.append(np.abs(fit.conf_int().iloc[1,1]*1000 - coeff))
+    return np.array(rate), np.array(error)
+
+
+def test_lapserate():
+    df = monthly_frame()
+    result = regression.lapserate(df)
+    rate, error = statsmodels_lapserate(df)
+    assert np.allclose(result['Lapse rate'], rate)
+    assert np.allclose(result['error'], error)
+
+
+def test_lapserate_loo():
+    df = monthly_frame()
+    rate, error = regression.lapserate_loo(df)
+    for station in df.index:
+        expected_rate, expected_error = statsmodels_lapserate(df.drop(station))
+        assert np.allclose(rate.loc[station], expected_rate)
+        assert np.allclose(error.loc[station], expected_error)
+
+
+def test_lapserate_bootstrap():
+    df = monthly_frame()
+    result = regression.lapserate_bootstrap(df, samples=200, seed=1)
+    assert (result['lower'] <= result['Lapse rate']).all()
+    assert (result['Lapse rate'] <= result['upper']).all()
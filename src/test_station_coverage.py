@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+import station_coverage
+
+
+def test_fractions():
+    """
+    Coverage from bit-packed masks is the same as grouping the daily data,
+    also for an unsorted index and more stations than one block.
+    """
+    rng = np.random.RandomState(0)
+    index = pd.date_range('1975-03-05', '1983-07-01', name='date')
+    df = pd.DataFrame(rng.rand(len(index), station_coverage.block + 7), index=index)
+    df[df < 0.3] = np.nan
+    df.iloc[:400, :5] = np.nan
+    df = df.sample(frac=1, random_state=0)
+    expected = df.notna().groupby(df.index.year).mean()
+    pd.testing.assert_frame_equal(station_coverage.fractions(df), expected,
+                                  check_names=False, check_index_type=False)
+    monthly = station_coverage.fractions(df, 'month')
+    expected = df.notna().groupby([df.index.year, df.index.month]).mean()
+    np.testing.assert_array_equal(monthly.values, expected.values)
@@ -0,0 +1,68 @@
+import os
+import stations
+import synthetic
+
+
+def clear():
+    stations.registry.cache_clear()
+    stations.names.cache_clear()
+
+
+def test_lookup(archive):
+    archive(2, 2, range(1980, 1982))
+    assert len(stations.registry()) == 4
+    met = stations.get('met', '601.0')
+    assert met.name == synthetic.met_names[0] and met.kind == 'met'
+    assert stations.get('hyd', 420) == stations.by_name('Hyd0')
+    assert stations.by_name('Hyd0').altitude == 198
+    assert stations.frame('hyd').loc[520, 'Name'] == 'Hyd1'
+
+
+def test_rebuild(archive, monkeypatch):
+    """
+    The registry is read from stations.json while station_loc.txt is
+    unchanged, and read again from the sources when it changes.
+    """
+    archive(2, 2, range(1980, 1982))
+    registry = stations.registry()
+    assert os.path.exists(stations.cachefile)
+    clear()
+    with monkeypatch.context() as m:
+        m.setattr(stations, 'read_met', None)
+        # repr, since the altitude of some stations is NaN
+        assert repr(stations.registry()) == repr(registry)
+
+    station_loc = stations.station_loc
+    with open(station_loc, 'a') as file:
+        file.write('3\t701\tNew\t28.00\t84.00\t1500\n')
+    stat = os.stat(station_loc)
+    os.utime(station_loc, (stat.st_atime, stat.st_mtime + 10))
+    clear()
+    assert stations.by_name('New') == stations.Station(701, 'New', 28.0, 84.0, 1500.0, 'met')
+    assert len(stations.registry()) == 5
+
+    # A header file is edited, the mtime of DISDIR does not change
+    header = stations.header_files()[0]
+    with open(header) as file:
+        lines = file.readlines()
+    lines[1] = lines[1].replace('Hyd', 'Renamed')
+    with open(header, 'w') as file:
+        file.writelines(lines)
+    stat = os.stat(header)
+    os.utime(header, (stat.st_atime, stat.st_mtime + 10))
+    clear()
+    assert {s.name for s in stations.registry().values() if s.kind == 'hyd'} & {'Renamed0', 'Renamed1'}
+
+
+def test_met_names(archive):
+    """
+    The met stations are the same as from the whitespace split lines of
+    station_loc.txt, like plot.map_name_height read them.
+    """
+    root = archive(5, 0, range(1980, 1981))
+    expected = {}
+    with open(str(root / 'station_loc.txt')) as file:
+        for line in file.readlines()[1:-1]:
+            line = line.split()
+            expected[line[2]] = float(line[-1])
+    assert {s.name: s.altitude for s in stations.read_met()} == expected
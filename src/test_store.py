@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import hyd as hyd
+import synthetic
+from store import binary_path, read_frame, read_only, write_frame
+
+
+def test_stream_equals_convert(archive):
+    """
+    Reading the column store gives the same table as convert_data.
+    """
+    tmp_path = archive()
+    outfile = str(tmp_path / 'discharge.csv')
+    hyd.convert_data(outfile, formats=['binary'])
+    expected = read_frame(outfile)
+    store = hyd.stream_data(outfile)
+    assert store.columns() == list(expected.columns)
+    expected = expected.sort_index()
+    pd.testing.assert_frame_equal(store.read(), expected)
+    # The newer store is used by read_frame
+    pd.testing.assert_frame_equal(read_frame(outfile), expected)
+    # Reading a time range and a subset of the columns
+    pd.testing.assert_frame_equal(store.read(['520'], '1979-03-05', '1980-06-01'),
+                                  expected.loc['1979-03-05':'1980-06-01', ['520']])
+
+
+def peak_rss(root, stations):
+    """
+    Peak RSS in kB of streaming conversion of stations in a new process.
+    """
+    synthetic.make_archive(root, 0, stations, range(1950, 1990))
+    script = ('import resource, hyd;'
+              'hyd.DISDIR = {!r};'
+              'hyd.stream_data({!r});'
+              'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)').format(
+                  os.path.join(root, 'discharge') + '/',
+                  os.path.join(root, 'discharge.csv'))
+    out = subprocess.check_output([sys.executable, '-c', script],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+    return int(out.split()[-1])
+
+
+def test_stream_memory_flat(tmp_path):
+    """
+    Peak memory of a streaming conversion does not grow with the number
+    of stations.
+    """
+    small = peak_rss(str(tmp_path / 'small'), 2)
+    large = peak_rss(str(tmp_path / 'large'), 24)
+    assert large < small * 1.1
+
+
+def test_mmap_zero_copy(archive):
+    """
+    The memory-mapped output is read without copying the values.
+    """
+    tmp_path = archive()
+    outfile = str(tmp_path / 'discharge.csv')
+    expected = hyd.convert_data(outfile, formats=['binary', 'mmap']).sort_index()
+    df = read_frame(outfile)
+    pd.testing.assert_frame_equal(df, expected.astype('float32'))
+    assert read_only(df)
+    mapped = df.values
+    while not isinstance(mapped, np.memmap):
+        mapped = mapped.base
+    assert np.shares_memory(df['520'].values, mapped)
+    assert np.shares_memory(df.loc['1979':'1980'].values, mapped)
+
+
+def age(path, seconds=60):
+    """
+    Set the mtime of path back by seconds, like an output of an earlier run.
+    """
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime - seconds))
+
+
+def test_csv_newer_than_binary(tmp_path):
+    """
+    A csv written after the binary file is read instead of the old binary.
+    """
+    index = pd.date_range('1990-01-01', periods=10, freq='D', name='date')
+    df = pd.DataFrame({'520': np.arange(10.0)}, index=index)
+    filepath = str(tmp_path / 'discharge.csv')
+    write_frame(df, filepath, ['csv', 'binary'])
+    pd.testing.assert_frame_equal(read_frame(filepath), df)
+    age(binary_path(str(tmp_path / 'discharge')))
+    write_frame(df + 1, filepath, ['csv'])
+    result = read_frame(filepath)
+    assert result.index.equals(df.index) and list(result.columns) == list(df.columns)
+    np.testing.assert_array_equal(result.values, df.values + 1)
+
+    # Same for the memory-mapped array
+    write_frame(df, filepath, ['csv', 'mmap'])
+    assert read_only(read_frame(filepath))
+    age(str(tmp_path / 'discharge.npy'))
+    write_frame(df + 2, filepath, ['csv'])
+    result = read_frame(filepath)
+    assert result.index.equals(df.index) and list(result.columns) == list(df.columns)
+    np.testing.assert_array_equal(result.values, df.values + 2)
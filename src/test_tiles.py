@@ -0,0 +1,81 @@
+import io
+import os
+import cartopy.crs as ccrs
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from PIL import Image
+import basemap
+import tiles
+
+
+def test_download(tmp_path, monkeypatch):
+    """
+    Missing tiles are downloaded once with the api key and a user agent,
+    and failed or offline downloads give blank tiles.
+    """
+    png = io.BytesIO()
+    Image.fromarray(np.zeros((256, 256, 3), dtype=np.uint8)).save(png, format='PNG')
+    requests = []
+    def urlopen(request, timeout):
+        requests.append(request)
+        if len(requests) > 1:
+            raise OSError('offline')
+        return io.BytesIO(png.getvalue())
+    monkeypatch.setattr(tiles, 'urlopen', urlopen)
+
+    source = tiles.LocalTiles(str(tmp_path), 'https://tiles.test/{z}/{x}/{y}.png', key='abc')
+    img, extent, origin = source.get_image((186, 106, 8))
+    assert len(requests) == 1
+    assert requests[0].full_url == 'https://tiles.test/8/186/106.png?api_key=abc'
+    assert requests[0].get_header('User-agent') == tiles.USER_AGENT
+    assert os.path.exists(basemap.tile_path(186, 106, 8, str(tmp_path)))
+    assert np.asarray(img).max() == 0
+
+    # Cached tile
+    source.get_image((186, 106, 8))
+    assert len(requests) == 1
+
+    # Failed download and offline
+    img, _, _ = source.get_image((187, 106, 8))
+    assert len(requests) == 2 and np.asarray(img).min() == 250
+    offline = tiles.LocalTiles(str(tmp_path), offline=True)
+    img, _, _ = offline.get_image((188, 106, 8))
+    assert len(requests) == 2 and np.asarray(img).min() == 250
+
+
+def test_key(tmp_path):
+    """
+    Downloads from other hosts than localhost need an api key.
+    """
+    with pytest.raises(ValueError, match='TILE_KEY'):
+        tiles.LocalTiles(str(tmp_path), 'https://tiles.test/{z}/{x}/{y}.png', key='')
+    tiles.LocalTiles(str(tmp_path), 'https://tiles.test/{z}/{x}/{y}.png', offline=True, key='')
+    tiles.LocalTiles(str(tmp_path), 'http://localhost:8080/{z}/{x}/{y}.png', key='')
+
+
+def test_map(tmp_path, monkeypatch):
+    """
+    A map drawn by cartopy downloads the tiles of its extent once.
+    """
+    png = io.BytesIO()
+    Image.fromarray(np.zeros((256, 256, 3), dtype=np.uint8)).save(png, format='PNG')
+    urls = []
+    def urlopen(request, timeout):
+        urls.append(request.full_url)
+        return io.BytesIO(png.getvalue())
+    monkeypatch.setattr(tiles, 'urlopen', urlopen)
+
+    extent = [83.5, 84.5, 27.5, 28.5]
+    for _ in range(2):
+        plt.figure()
+        ax = plt.axes(projection=ccrs.PlateCarree())
+        ax.set_extent(extent)
+        ax.add_image(tiles.LocalTiles(str(tmp_path), 'https://tiles.test/{z}/{x}/{y}.png',
+                                      key='abc'), 8)
+        plt.savefig(io.BytesIO(), format='png')
+        plt.close()
+    expected = basemap.tile_range(extent, 8)
+    assert len(urls) == len(expected) > 0
+    assert all(url.endswith('?api_key=abc') for url in urls)
+    assert not basemap.missing_tiles(extent, 8, str(tmp_path))
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+import timeseries
+
+
+@pytest.fixture
+def df():
+    rng = np.random.RandomState(0)
+    index = pd.date_range('1980-01-01', periods=3000, freq='D', name='date')
+    df = pd.DataFrame(rng.normal(size=(3000, 4)), index=index, columns=list('abcd'))
+    df[rng.random_sample(df.shape) < 0.2] = np.nan
+    df.iloc[500:700, 1] = np.nan
+    return df
+
+
+def assert_same(result, expected):
+    """
+    Same labels and values as expected, to a relative tolerance of 1e-9.
+    """
+    assert list(result.columns) == list(expected.columns)
+    assert result.index.equals(expected.index)
+    np.testing.assert_allclose(result.values, expected.values, rtol=1e-9)
+
+
+@pytest.mark.parametrize('stat', ['mean', 'sum', 'min', 'max', 'count'])
+@pytest.mark.parametrize('window, min_periods', [(30, None), (30, 5), (1, None), (7, 1)])
+def test_rolling(df, stat, window, min_periods):
+    """
+    Same result as pandas rolling windows. Count is compared with pandas
+    0.25, which ignores min_periods, newer versions do not.
+    """
+    if stat == 'count':
+        expected = df.notna().astype(float).rolling(window, min_periods=0).sum()
+    else:
+        expected = getattr(df.rolling(window, min_periods), stat)()
+    assert_same(timeseries.rolling(df, window, stat, min_periods), expected)
+
+
+def test_percentile(df):
+    expected = df.rolling(30, 5).quantile(0.9)
+    assert_same(timeseries.rolling(df, 30, 'percentile', 5, q=90), expected)
+
+
+def test_downsample(df):
+    """
+    Downsampled series keep the extremes and the gaps.
+    """
+    small = timeseries.minmax(df, 200)
+    assert len(small) <= 200
+    pd.testing.assert_series_equal(small.max(), df.max())
+    pd.testing.assert_series_equal(small.min(), df.min())
+    assert small['b'].isna().any()
+
+    keep = timeseries.lttb(np.arange(len(df)), df['a'].values, 100)
+    assert len(keep) == 100 and keep[0] == np.flatnonzero(df['a'].notna())[0]
+    assert (np.diff(keep) > 0).all() and not df['a'].iloc[keep].isna().any()
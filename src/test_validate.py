@@ -0,0 +1,43 @@
+import csv
+import json
+import synthetic
+import validate
+
+
+def test_wrong_statistics(tmp_path):
+    """
+    A stored statistic that does not match the daily values is reported,
+    and files with matching statistics give no mismatches.
+    """
+    good = str(tmp_path / 'Q1980.txt')
+    bad = str(tmp_path / 'Q1981.txt')
+    synthetic.write_discharge(good, 420, 1980, seed=1)
+    synthetic.write_discharge(bad, 420, 1981, seed=2)
+    with open(bad) as file:
+        lines = file.read().splitlines()
+    # Mean of March, after the label and January and February
+    mean = lines[43].split()
+    assert mean[0] == 'Mean'
+    mean[3] = '{:.1f}'.format(float(mean[3]) * 1.5)
+    expected = float(mean[3])
+    lines[43] = '  '.join(mean)
+    with open(bad, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+    assert validate.check_file(good) == []
+    mismatches = validate.validate([good, bad], workers=1)
+    assert len(mismatches) == 1
+    m = mismatches[0]
+    assert (m['file'], m['station'], m['year'], m['month'], m['statistic']) == \
+        (bad, '420', 1981, 3, 'mean')
+    assert m['expected'] == expected
+    assert abs(m['relative_error'] - 1/3) < 0.01
+    assert validate.validate([good, bad], workers=2) == mismatches
+
+    validate.write_report(mismatches, str(tmp_path / 'report.json'))
+    with open(str(tmp_path / 'report.json')) as file:
+        assert json.load(file) == mismatches
+    validate.write_report(mismatches, str(tmp_path / 'report.csv'))
+    with open(str(tmp_path / 'report.csv')) as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 1 and rows[0]['statistic'] == 'mean' and rows[0]['month'] == '3'
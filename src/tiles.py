@@ -0,0 +1,70 @@
+import io
+import os
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+import numpy as np
+from PIL import Image
+from cartopy.io.img_tiles import GoogleWTS
+from common import *
+import basemap
+
+# Sent with tile requests, tile servers refuse requests without one
+USER_AGENT = 'geo4300-narayani station map'
+
+
+class LocalTiles(GoogleWTS):
+    """
+    Map tiles read from a local z/x/y.png cache (see basemap.tile_path).
+    Tiles missing from the cache are downloaded from url and stored, unless
+    offline is set, in which case they are left blank without touching the
+    network. key is passed to the tile server as api_key. Without a key,
+    tiles can only be downloaded from localhost, and a ValueError is raised
+    for other hosts unless offline is set.
+    """
+
+    def __init__(self, folder=TILEDIR, url=TILE_URL, offline=False,
+                 desired_tile_form='RGB', timeout=10, key=TILE_KEY):
+        host = urlparse(url).hostname
+        if not offline and not key and host not in ('localhost', '127.0.0.1'):
+            raise ValueError('Downloading map tiles from {} needs an api key, set TILE_KEY '
+                             'in common.py or use the tiles offline'.format(host))
+        super().__init__(desired_tile_form=desired_tile_form)
+        self.folder = folder
+        self.url = url
+        self.offline = offline
+        self.timeout = timeout
+        self.key = key
+
+    def _image_url(self, tile):
+        x, y, z = tile
+        url = self.url.format(x=x, y=y, z=z)
+        if self.key:
+            url += ('&' if '?' in url else '?') + 'api_key=' + self.key
+        return url
+
+    def get_image(self, tile):
+        x, y, z = tile
+        path = basemap.tile_path(x, y, z, self.folder)
+        if not os.path.exists(path) and not self.offline:
+            self.download(tile, path)
+        if os.path.exists(path):
+            img = Image.open(path)
+        else:
+            img = Image.fromarray(np.full((256, 256, 3), 250, dtype=np.uint8))
+        img = img.convert(self.desired_tile_form)
+        return img, self.tileextent(tile), 'lower'
+
+    def download(self, tile, path):
+        """
+        Fetch one tile to path. Failed downloads are reported and leave the
+        tile blank.
+        """
+        request = Request(self._image_url(tile), headers={'User-Agent': USER_AGENT})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+        except OSError as err:
+            print('Could not download tile {}: {}'.format(tile, err))
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.open(io.BytesIO(data)).save(path)
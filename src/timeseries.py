@@ -0,0 +1,186 @@
+import warnings
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import as_strided
+
+# Rolling window statistics and downsampling of daily series for plotting.
+# Windows are trailing like df.rolling(window): the value at a row is
+# computed from that row and the window - 1 rows before it. NaN values are
+# left out, and windows with fewer than min_periods values give NaN. All
+# columns are computed at once, in time linear in the number of rows.
+
+# Bytes of the windows passed to nanpercentile at a time
+chunk_bytes = 2**26
+
+
+def window_count(valid, window):
+    """
+    Number of True values of valid in each window.
+    """
+    total = np.cumsum(valid, axis=0, dtype=np.int64)
+    total[window:] = total[window:] - total[:-window]
+    return total
+
+
+def window_sum(values, window):
+    """
+    Sum of the non-NaN values in each window, from cumulative sums.
+    """
+    total = np.cumsum(np.nan_to_num(values), axis=0)
+    total[window:] = total[window:] - total[:-window]
+    return total
+
+
+def window_max(values, window):
+    """
+    Maximum of the non-NaN values in each window (-inf for windows without
+    values), by the van Herk/Gil-Werman algorithm: with the rows split in
+    blocks of window rows, every window is the end of one block and the
+    start of the next, so its maximum is the larger of a running maximum
+    from the right in one block and from the left in the next.
+    """
+    n = len(values)
+    blocks = -(-(n + window - 1) // window)
+    padded = np.full((blocks*window,) + values.shape[1:], -np.inf)
+    padded[window - 1:window - 1 + n] = np.where(np.isnan(values), -np.inf, values)
+    padded = padded.reshape((blocks, window) + values.shape[1:])
+    left = np.maximum.accumulate(padded, axis=1).reshape((-1,) + values.shape[1:])
+    right = np.maximum.accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape((-1,) + values.shape[1:])
+    # Window of row i covers padded rows i to i + window - 1
+    return np.maximum(right[:n], left[window - 1:window - 1 + n])
+
+
+def window_min(values, window):
+    """
+    Minimum of the non-NaN values in each window (inf for windows without
+    values), see window_max.
+    """
+    return -window_max(-values, window)
+
+
+def window_percentile(values, window, q):
+    """
+    Percentile q of the non-NaN values in each window. Windows are sorted
+    in chunks of rows to keep memory bounded.
+    """
+    padded = np.concatenate([np.full((window - 1,) + values.shape[1:], np.nan), values])
+    # View of the windows (rows x columns x window) without copying
+    windows = as_strided(padded, shape=values.shape + (window,),
+                         strides=padded.strides + padded.strides[:1], writeable=False)
+    result = np.empty(values.shape)
+    columns = int(np.prod(values.shape[1:]))
+    rows = max(1, chunk_bytes // (8*window*max(columns, 1)))
+    with warnings.catch_warnings():
+        # Windows without values give NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for start in range(0, len(values), rows):
+            result[start:start + rows] = np.nanpercentile(windows[start:start + rows], q, axis=-1)
+    return result
+
+
+def rolling(df, window, stat='mean', min_periods=None, q=50):
+    """
+    Rolling statistic of all columns of df over window rows, like
+    getattr(df.rolling(window, min_periods), stat)().
+
+    stat - 'mean', 'sum', 'min', 'max', 'count' or 'percentile' (of q)
+    min_periods - values needed in a window, default window. Like pandas
+    0.25, count ignores it and gives the count of the partial windows at
+    the start as well.
+    """
+    if min_periods is None:
+        min_periods = window
+    values = df.to_numpy(dtype=float)
+    count = window_count(~np.isnan(values), window)
+    if stat == 'count':
+        result = count.astype(float)
+        return pd.DataFrame(result, index=df.index, columns=df.columns)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if stat == 'mean':
+            result = window_sum(values, window) / count
+        elif stat == 'sum':
+            result = window_sum(values, window)
+        elif stat == 'min':
+            result = window_min(values, window)
+        elif stat == 'max':
+            result = window_max(values, window)
+        elif stat == 'percentile':
+            result = window_percentile(values, window, q)
+        else:
+            raise ValueError('Unknown statistic: {}'.format(stat))
+    result[count < max(min_periods, 1)] = np.nan
+    return pd.DataFrame(result, index=df.index, columns=df.columns)
+
+
+def resample_mean(df, freq):
+    """
+    Mean over periods of freq, like df.resample(freq).mean(). Daily data
+    is only reindexed to all days for freq 'D'.
+    """
+    if freq == 'D' and len(df.index):
+        index = df.index.sort_values()
+        if (index == index.normalize()).all() and not index.has_duplicates:
+            return df.reindex(pd.date_range(index[0], index[-1], freq='D', name=df.index.name))
+    return df.resample(freq).mean()
+
+
+def minmax(df, points=2000):
+    """
+    Downsample df to at most points rows, keeping the minimum and maximum
+    of each column in every bucket of consecutive rows, so peaks are not
+    lost when the series is drawn. The minimum and maximum of a bucket are
+    placed at its first row and its middle row, in the order they occur.
+    Buckets without values give NaN, so gaps are still drawn as gaps.
+    """
+    buckets = points // 2
+    if len(df) <= points or buckets < 1:
+        return df
+    size = -(-len(df) // buckets)
+    buckets = -(-len(df) // size)
+    values = df.to_numpy(dtype=float)
+    padded = np.full((buckets*size,) + values.shape[1:], np.nan)
+    padded[:len(values)] = values
+    padded = padded.reshape((buckets, size) + values.shape[1:])
+    empty = np.isnan(padded).all(axis=1)
+    low = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    high = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    low_value = np.take_along_axis(padded, low[:, np.newaxis], axis=1)[:, 0]
+    high_value = np.take_along_axis(padded, high[:, np.newaxis], axis=1)[:, 0]
+    low_first = low <= high
+    first = np.where(empty, np.nan, np.where(low_first, low_value, high_value))
+    second = np.where(empty, np.nan, np.where(low_first, high_value, low_value))
+
+    starts = np.arange(buckets)*size
+    middles = np.minimum(starts + size // 2, len(df) - 1)
+    index = df.index[np.stack([starts, middles], axis=1).ravel()]
+    result = np.stack([first, second], axis=1).reshape((2*buckets,) + values.shape[1:])
+    return pd.DataFrame(result, index=index, columns=df.columns)
+
+
+def lttb(x, y, points=2000):
+    """
+    Largest-Triangle-Three-Buckets downsampling of one series to points
+    points. Keeps the shape of the line better than minmax, but not every
+    extreme. NaN values are dropped. Returns indices of the kept points.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= points or points < 3:
+        return valid
+    x = np.asarray(x, dtype=float)[valid]
+    y = np.asarray(y, dtype=float)[valid]
+    # First and last points are kept, the rest are split in buckets
+    edges = np.linspace(1, len(x) - 1, points - 1).astype(int)
+    keep = np.empty(points, dtype=int)
+    keep[0], keep[-1] = 0, len(x) - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        following = slice(end, edges[i + 2] if i + 2 < len(edges) else len(x))
+        # Point of the bucket making the largest triangle with the last
+        # kept point and the mean of the next bucket
+        cx, cy = x[following].mean(), y[following].mean()
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - cx)*(y[start:end] - ay) - (ax - x[start:end])*(cy - ay))
+        previous = start + np.argmax(area)
+        keep[i + 1] = previous
+    return valid[keep]
@@ -0,0 +1,153 @@
+import argparse
+import csv
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+import hyd as hyd
+import ingest
+from common import *
+
+# Check discharge files by comparing monthly min, mean and max computed
+# from the daily values with the statistics stored at the end of the file.
+
+statistics = ['min', 'mean', 'max']
+
+
+def parse_stats(lines):
+    """
+    Returns 3x12 array of monthly min, mean and max from the rows after
+    the daily values. The first column containing text and the last
+    containing yearly values are dropped.
+    """
+    rows = []
+    for line in lines[42:45]:
+        rows.append([np.nan if value == 'NA' else value for value in line.split()[1:-1]])
+    return np.array(rows, dtype=float)
+
+
+def check_file(filepath, rtol=0.01):
+    """
+    Check one discharge file, reading it once.
+
+    Returns list of mismatches, each a dict with file, station, year,
+    month, statistic, expected, got and relative error. Months where
+    either the computed or the stored statistics contain NaN are not
+    checked.
+    """
+    return check_lines(ingest.lines(filepath), filepath, rtol)
+
+
+def check_lines(lines, filepath, rtol=0.01):
+    """
+    Check the lines of a discharge file, see check_file.
+    """
+    year = hyd.parse_year(lines)
+    station = hyd.parse_station(lines)
+    grid = hyd.parse_days(lines[10:41], station, year)
+    expected = parse_stats(lines)
+    with warnings.catch_warnings():
+        # Months without data give NaN and are not checked
+        warnings.simplefilter('ignore', RuntimeWarning)
+        # Positions of days not in a month are NaN, so they do not count
+        got = np.array([np.nanmin(grid, axis=0),
+                        np.nanmean(grid, axis=0),
+                        np.nanmax(grid, axis=0)])
+        checked = ~(np.isnan(expected) | np.isnan(got)).any(axis=0)
+        bad = ~np.isclose(got, expected, rtol=rtol) & checked
+        relative = np.abs(got - expected) / np.abs(expected)
+
+    mismatches = []
+    for i, month in zip(*np.nonzero(bad)):
+        mismatches.append({'file': filepath,
+                           'station': station,
+                           'year': year,
+                           'month': int(month) + 1,
+                           'statistic': statistics[i],
+                           'expected': float(expected[i, month]),
+                           'got': float(got[i, month]),
+                           'relative_error': float(relative[i, month])})
+    return mismatches
+
+
+def load_checked(filepath, rtol=0.01):
+    """
+    Load a discharge file like hyd.load_df_manual and check it, reading it
+    once. Returns dataframe and list of mismatches.
+    """
+    lines = ingest.lines(filepath)
+    return hyd.parse_file(lines), check_lines(lines, filepath, rtol)
+
+
+def wrap(mapper=map, mismatches=None, rtol=0.01):
+    """
+    Returns a map-like function for hyd.convert_data that checks the files
+    while loading them, and collects the mismatches in mismatches (a list).
+    """
+    if mismatches is None:
+        mismatches = []
+
+    def checked_map(func, files, *args):
+        results = []
+        for df, found in mapper(partial(load_checked, rtol=rtol), files, *args):
+            mismatches.extend(found)
+            results.append(df)
+        return results
+    checked_map.mismatches = mismatches
+    return checked_map
+
+
+def archive_files():
+    """
+    Returns all discharge files in DISDIR.
+    """
+    return [f for station in hyd.list_stations() for f in hyd.list_files(station)]
+
+
+def validate(files, rtol=0.01, workers=None):
+    """
+    Check all files, in parallel processes if workers is not 1. Returns
+    list of all mismatches.
+    """
+    check = partial(check_file, rtol=rtol)
+    if workers == 1:
+        results = ingest.wrap()(check, files)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = ingest.wrap(partial(executor.map, chunksize=16))(check, files)
+    return [mismatch for result in results for mismatch in result]
+
+
+def write_report(mismatches, filepath):
+    """
+    Write mismatches to .json or .csv file depending on extension.
+    """
+    if os.path.splitext(filepath)[1] == '.json':
+        with open(filepath, 'w') as file:
+            json.dump(mismatches, file, indent=1)
+        return
+    columns = ['file', 'station', 'year', 'month', 'statistic',
+               'expected', 'got', 'relative_error']
+    with open(filepath, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(mismatches)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate all discharge files.')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='number of processes, default one per cpu')
+    parser.add_argument('-r', '--rtol', type=float, default=0.01,
+                        help='accepted relative tolerance')
+    parser.add_argument('-o', '--output', default=OUTDIR + 'validation.csv',
+                        help='report file, .csv or .json')
+    args = parser.parse_args()
+
+    files = archive_files()
+    mismatches = validate(files, args.rtol, args.workers)
+    write_report(mismatches, args.output)
+    print('Checked {} files, found {} mismatches, report in {}'.format(
+        len(files), len(mismatches), args.output))